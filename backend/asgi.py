@@ -0,0 +1,190 @@
+"""
+ASGI entry point for serving many long-lived event streams.
+
+/stream_logs and /stream run as coroutines on the event loop, every other route is served by the
+Flask app through asgiref's WSGI adapter. An idle log viewer then costs a coroutine instead of a
+worker thread; the remote log tail of each host is still shared through the log broadcaster.
+
+Run with: uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+import json
+import queue
+import asyncio
+import logging
+
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+
+from main import app, check_signature
+from src.crypto.balance_service import close_balance_service
+from src.crypto.password_hasher import shutdown_password_hasher
+from src.vps.connect_vps import subscribe_vps_logs
+from src.vps.log_hub import LogSubscription
+from src.vps.sse import SSEBatcher, format_sse
+
+logger = logging.getLogger(__name__)
+
+flask_application = WsgiToAsgi(app)
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-headers', b'Content-Type,Authorization,X-Signature,X-Timestamp'),
+    (b'access-control-allow-methods', b'GET,POST,OPTIONS'),
+]
+
+
+class AsyncLogReader:
+    """
+    Awaitable view of a log subscription, woken by the pump thread instead of blocking a thread.
+    """
+
+    def __init__(self, subscription: LogSubscription, loop: asyncio.AbstractEventLoop):
+        self._subscription = subscription
+        self._ready = asyncio.Event()
+        subscription.waker = lambda: loop.call_soon_threadsafe(self._ready.set)
+
+    async def get(self, timeout: float) -> Optional[List[str]]:
+        """
+        :param timeout: Seconds to wait for new lines
+        :return: Next batch of lines, or None once the stream has ended
+        :raises queue.Empty: If no lines arrived within timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            self._ready.clear()
+            # Checked after clearing, a delivery in between sets the event again
+            try:
+                return self._subscription.get_nowait()
+            except queue.Empty:
+                pass
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise queue.Empty
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise queue.Empty
+
+
+def _request_url(scope: Dict) -> str:
+    # Same URL the Flask routes sign: base URL plus the raw query string
+    headers = dict(scope['headers'])
+    host = headers.get(b'host', b'').decode('latin-1')
+    url = f"{scope['scheme']}://{host}{scope.get('root_path', '')}{scope['path']}"
+    if scope['query_string']:
+        url += '?' + scope['query_string'].decode('latin-1')
+    return url
+
+
+def _header(scope: Dict, name: bytes) -> Optional[str]:
+    value = dict(scope['headers']).get(name)
+    return value.decode('latin-1') if value is not None else None
+
+
+async def _send_json(send, status: int, body: Dict) -> None:
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'access-control-allow-origin', b'*')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode('utf-8')})
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def _stream_until_disconnect(receive, stream) -> None:
+    # Stops the stream as soon as the client goes away instead of on the next failed write
+    stream_task = asyncio.ensure_future(stream)
+    disconnect_task = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({stream_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (stream_task, disconnect_task):
+            task.cancel()
+        await asyncio.gather(stream_task, disconnect_task, return_exceptions=True)
+
+
+async def stream_logs(scope: Dict, receive, send) -> None:
+    error = check_signature(_header(scope, b'x-timestamp'), _header(scope, b'x-signature'), scope['method'],
+                            _request_url(scope))
+    if error:
+        await _send_json(send, 401, {'error': error})
+        return
+
+    ip_address = parse_qs(scope['query_string'].decode('latin-1')).get('ip_address', [None])[0]
+    if not ip_address:
+        await _send_json(send, 400, {"error": "Invalid Request, missing IP"})
+        return
+
+    subscription = subscribe_vps_logs(instanceIp=ip_address, pem=True)
+    reader = AsyncLogReader(subscription, asyncio.get_running_loop())
+
+    async def stream() -> None:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+        batcher = SSEBatcher()
+        while True:
+            try:
+                batch = await reader.get(batcher.timeout())
+            except queue.Empty:
+                batch = []
+
+            frame = batcher.finish() if batch is None else batcher.add(batch)
+            if frame:
+                await send({'type': 'http.response.body', 'body': frame.encode('utf-8'), 'more_body': True})
+            if batch is None:
+                break
+
+        await send({'type': 'http.response.body', 'body': format_sse(["Stream Ended"]).encode('utf-8')})
+
+    try:
+        await _stream_until_disconnect(receive, stream())
+    finally:
+        subscription.close()
+        logger.info(f"Log stream of {ip_address} closed")
+
+
+async def stream_numbers(scope: Dict, receive, send) -> None:
+    async def stream() -> None:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+        for i in range(1, 101):
+            await send({'type': 'http.response.body', 'body': f"data: {i}\n\n".encode('utf-8'), 'more_body': True})
+            await asyncio.sleep(0.1)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    await _stream_until_disconnect(receive, stream())
+
+
+STREAM_ROUTES = {
+    '/stream_logs': stream_logs,
+    '/stream': stream_numbers,
+}
+
+
+async def application(scope: Dict, receive, send) -> None:
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        handler = STREAM_ROUTES.get(scope['path'])
+        if handler is not None:
+            await handler(scope, receive, send)
+            return
+
+    if scope['type'] == 'lifespan':
+        # Nothing to set up, the Flask app is initialised on import
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await close_balance_service()
+                await asyncio.get_running_loop().run_in_executor(None, shutdown_password_hasher)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    await flask_application(scope, receive, send)
@@ -0,0 +1,99 @@
+"""
+Load benchmark for concurrent SSE streams.
+
+Opens --streams event streams at once against --url and keeps each open until the server ends
+it or --hold seconds pass. Reports how many streams received their first event, the time to
+first event and, with --server-pid, the thread count and memory of the server process while all
+streams are open.
+
+Threaded Flask server:  python main.py
+ASGI server:            uvicorn asgi:application --host 0.0.0.0 --port 5000
+Benchmark:              python benchmarks/stream_capacity.py --url http://localhost:5000/stream --streams 500 \
+                            --server-pid <pid>
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+
+async def open_stream(url: str, hold: float, first_event_timeout: float, results: Dict[str, List]) -> None:
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    started = time.monotonic()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port or 80),
+                                                first_event_timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+
+        first_event = None
+        deadline = started + hold
+        while time.monotonic() < deadline:
+            timeout = first_event_timeout if first_event is None else deadline - time.monotonic()
+            line = await asyncio.wait_for(reader.readline(), max(timeout, 0.01))
+            if not line:
+                break
+            if first_event is None and line.startswith(b'data:'):
+                first_event = time.monotonic() - started
+                results['first_event'].append(first_event)
+
+        results['completed' if first_event is not None else 'no_event'].append(1)
+    except asyncio.TimeoutError:
+        results['timed_out'].append(1)
+    except OSError as e:
+        results['errors'].append(str(e))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def server_usage(pid: Optional[int]) -> str:
+    if not pid:
+        return ''
+    with open(f'/proc/{pid}/status') as f:
+        status = dict(line.split(':', 1) for line in f if ':' in line)
+    return f"server threads: {status['Threads'].strip()}, server RSS: {status['VmRSS'].strip()}"
+
+
+async def run(url: str, streams: int, hold: float, first_event_timeout: float, server_pid: Optional[int]) -> None:
+    results: Dict[str, List] = {'first_event': [], 'completed': [], 'no_event': [], 'timed_out': [], 'errors': []}
+    started = time.monotonic()
+    tasks = [asyncio.ensure_future(open_stream(url, hold, first_event_timeout, results)) for _ in range(streams)]
+
+    # Sample the server once every stream had the chance to connect
+    await asyncio.sleep(min(hold, first_event_timeout) / 2)
+    usage = server_usage(server_pid)
+    await asyncio.gather(*tasks)
+
+    first_event = sorted(results['first_event'])
+    print(f"streams: {streams}, with events: {len(results['completed'])}, without events: {len(results['no_event'])}, "
+          f"timed out: {len(results['timed_out'])}, errors: {len(results['errors'])}")
+    if first_event:
+        p95 = first_event[int(len(first_event) * 0.95) - 1] if len(first_event) >= 20 else first_event[-1]
+        print(f"time to first event: median {statistics.median(first_event) * 1000:.0f} ms, "
+              f"p95 {p95 * 1000:.0f} ms, max {first_event[-1] * 1000:.0f} ms")
+    if usage:
+        print(usage)
+    print(f"total: {time.monotonic() - started:.1f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000/stream')
+    parser.add_argument('--streams', type=int, default=500)
+    parser.add_argument('--hold', type=float, default=15, help='Seconds to keep each stream open')
+    parser.add_argument('--first-event-timeout', type=float, default=10,
+                        help='Seconds a stream may wait for its first event')
+    parser.add_argument('--server-pid', type=int, help='PID of the server process to sample')
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.streams, args.hold, args.first_event_timeout, args.server_pid))
+
+
+if __name__ == '__main__':
+    main()
@@ -140,6 +140,9 @@ CREATE TABLE [dbo].[User_Projects](
 	[UserProject_Version] [nvarchar](32) NULL,
 	[UserProject_CreationDate] [datetime2](7) NULL,
 	[UserProject_LastModifiedDate] [datetime2](7) NULL,
+	[UserProject_ProvisioningState] [nvarchar](16) NULL,
+	[UserProject_LeaseUntil] [datetime2](7) NULL,
+	[UserProject_ProvisioningAttempts] [int] NOT NULL,
  CONSTRAINT [PK__User_Pro__0E1D271ED5D435A0] PRIMARY KEY CLUSTERED
 (
 	[UserProject_IdKey] ASC
@@ -204,6 +207,26 @@ CREATE TABLE [dbo].[UserKeys](
 )WITH (PAD_INDEX = OFF, STATISTICS_NORECOMPUTE = OFF, IGNORE_DUP_KEY = OFF, ALLOW_ROW_LOCKS = ON, ALLOW_PAGE_LOCKS = ON, OPTIMIZE_FOR_SEQUENTIAL_KEY = OFF) ON [PRIMARY]
 ) ON [PRIMARY] TEXTIMAGE_ON [PRIMARY]
 GO
+/****** Object:  Table [dbo].[ProvisioningJobs] ******/
+SET ANSI_NULLS ON
+GO
+SET QUOTED_IDENTIFIER ON
+GO
+CREATE TABLE [dbo].[ProvisioningJobs](
+	[Job_Id] [uniqueidentifier] NOT NULL,
+	[Job_Type] [nvarchar](32) NOT NULL,
+	[Job_Status] [nvarchar](16) NOT NULL,
+	[Job_Result] [nvarchar](max) NULL,
+	[Job_Error] [nvarchar](max) NULL,
+	[Job_CreationDate] [datetime2](7) NULL,
+	[Job_StartedDate] [datetime2](7) NULL,
+	[Job_FinishedDate] [datetime2](7) NULL,
+ CONSTRAINT [PK_ProvisioningJobs] PRIMARY KEY CLUSTERED
+(
+	[Job_Id] ASC
+)WITH (PAD_INDEX = OFF, STATISTICS_NORECOMPUTE = OFF, IGNORE_DUP_KEY = OFF, ALLOW_ROW_LOCKS = ON, ALLOW_PAGE_LOCKS = ON, OPTIMIZE_FOR_SEQUENTIAL_KEY = OFF) ON [PRIMARY]
+) ON [PRIMARY] TEXTIMAGE_ON [PRIMARY]
+GO
 SET ANSI_PADDING ON
 GO
 /****** Object:  Index [IX_AuditLog_TableName_RowId]    Script Date: 15.09.2024 19:43:59 ******/
@@ -235,14 +258,41 @@ CREATE NONCLUSTERED INDEX [IX_UserProjects_UserIdKey] ON [dbo].[User_Projects]
 GO
 SET ANSI_PADDING ON
 GO
+/****** Object:  Index [IX_UserProjects_InstanceId] ******/
+CREATE NONCLUSTERED INDEX [IX_UserProjects_InstanceId] ON [dbo].[User_Projects]
+(
+	[UserProject_InstanceId] ASC
+)
+INCLUDE([UserProject_UserIdKey])
+WITH (PAD_INDEX = OFF, STATISTICS_NORECOMPUTE = OFF, SORT_IN_TEMPDB = OFF, DROP_EXISTING = OFF, ONLINE = OFF, ALLOW_ROW_LOCKS = ON, ALLOW_PAGE_LOCKS = ON, OPTIMIZE_FOR_SEQUENTIAL_KEY = OFF) ON [PRIMARY]
+GO
+/****** Object:  Index [IX_UserProjects_ProvisioningQueue] ******/
+CREATE NONCLUSTERED INDEX [IX_UserProjects_ProvisioningQueue] ON [dbo].[User_Projects]
+(
+	[UserProject_LeaseUntil] ASC
+)
+INCLUDE([UserProject_ProvisioningState],[UserProject_InstanceId])
+WHERE ([UserProject_ProvisioningState] IN (N'pending', N'running'))
+WITH (PAD_INDEX = OFF, STATISTICS_NORECOMPUTE = OFF, SORT_IN_TEMPDB = OFF, DROP_EXISTING = OFF, ONLINE = OFF, ALLOW_ROW_LOCKS = ON, ALLOW_PAGE_LOCKS = ON, OPTIMIZE_FOR_SEQUENTIAL_KEY = OFF) ON [PRIMARY]
+GO
+SET ANSI_PADDING ON
+GO
 /****** Object:  Index [IX_Userdata_Email]    Script Date: 15.09.2024 19:43:59 ******/
 CREATE NONCLUSTERED INDEX [IX_Userdata_Email] ON [dbo].[Userdata]
 (
 	[User_Mail] ASC
 )WITH (PAD_INDEX = OFF, STATISTICS_NORECOMPUTE = OFF, SORT_IN_TEMPDB = OFF, DROP_EXISTING = OFF, ONLINE = OFF, ALLOW_ROW_LOCKS = ON, ALLOW_PAGE_LOCKS = ON, OPTIMIZE_FOR_SEQUENTIAL_KEY = OFF) ON [PRIMARY]
 GO
+/****** Object:  Index [IX_ProvisioningJobs_Status] ******/
+CREATE NONCLUSTERED INDEX [IX_ProvisioningJobs_Status] ON [dbo].[ProvisioningJobs]
+(
+	[Job_Status] ASC
+)WITH (PAD_INDEX = OFF, STATISTICS_NORECOMPUTE = OFF, SORT_IN_TEMPDB = OFF, DROP_EXISTING = OFF, ONLINE = OFF, ALLOW_ROW_LOCKS = ON, ALLOW_PAGE_LOCKS = ON, OPTIMIZE_FOR_SEQUENTIAL_KEY = OFF) ON [PRIMARY]
+GO
 ALTER TABLE [dbo].[AuditLog] ADD  DEFAULT (getdate()) FOR [AuditLog_Timestamp]
 GO
+ALTER TABLE [dbo].[ProvisioningJobs] ADD  CONSTRAINT [DF_ProvisioningJobs_CreationDate]  DEFAULT (getdate()) FOR [Job_CreationDate]
+GO
 ALTER TABLE [dbo].[Projectdata] ADD  CONSTRAINT [DF__Projectda__Proje__3F466844]  DEFAULT (getdate()) FOR [Project_CreationDate]
 GO
 ALTER TABLE [dbo].[Projectdata] ADD  CONSTRAINT [DF__Projectda__Proje__403A8C7D]  DEFAULT (getdate()) FOR [Project_LastModifiedDate]
@@ -251,6 +301,10 @@ ALTER TABLE [dbo].[User_Projects] ADD  CONSTRAINT [DF__User_Proj__UserP__440B1D6
 GO
 ALTER TABLE [dbo].[User_Projects] ADD  CONSTRAINT [DF__User_Proj__UserP__44FF419A]  DEFAULT (getdate()) FOR [UserProject_LastModifiedDate]
 GO
+ALTER TABLE [dbo].[User_Projects] ADD  CONSTRAINT [DF_UserProjects_ProvisioningAttempts]  DEFAULT ((0)) FOR [UserProject_ProvisioningAttempts]
+GO
+ALTER TABLE [dbo].[User_Projects]  WITH CHECK ADD  CONSTRAINT [CK_UserProjects_ProvisioningState] CHECK  (([UserProject_ProvisioningState] IN (N'pending', N'running', N'configured', N'failed')))
+GO
 ALTER TABLE [dbo].[Userdata] ADD  DEFAULT (getdate()) FOR [User_CreationDate]
 GO
 ALTER TABLE [dbo].[Userdata] ADD  DEFAULT (getdate()) FOR [User_LastModifiedDate]
@@ -282,6 +336,51 @@ REFERENCES [dbo].[User_Projects] ([UserProject_IdKey])
 GO
 ALTER TABLE [dbo].[UserKeys] CHECK CONSTRAINT [FK_UserKeys_UserProjects]
 GO
+/****** Object:  UserDefinedTableType [dbo].[InstanceStateList] ******/
+CREATE TYPE [dbo].[InstanceStateList] AS TABLE(
+	[InstanceId] [nvarchar](50) NOT NULL,
+	[IPAddress] [nvarchar](15) NULL,
+	[ProvisioningState] [nvarchar](16) NULL,
+	PRIMARY KEY CLUSTERED
+(
+	[InstanceId] ASC
+)WITH (IGNORE_DUP_KEY = OFF)
+)
+GO
+/****** Object:  StoredProcedure [dbo].[sp_ApplyInstanceStates] ******/
+SET ANSI_NULLS ON
+GO
+SET QUOTED_IDENTIFIER ON
+GO
+
+-- Create sp_ApplyInstanceStates procedure
+CREATE PROCEDURE [dbo].[sp_ApplyInstanceStates]
+    @Rows [dbo].[InstanceStateList] READONLY
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    UPDATE UK
+    SET UserKey_IPAddress = R.IPAddress,
+        UserKey_LastModifiedDate = SYSDATETIME()
+    FROM UserKeys UK
+    INNER JOIN User_Projects UP ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
+    INNER JOIN @Rows R ON R.InstanceId = UP.UserProject_InstanceId
+    WHERE R.IPAddress IS NOT NULL;
+
+    UPDATE UP
+    SET UserProject_ProvisioningState = R.ProvisioningState,
+        UserProject_LastModifiedDate = SYSDATETIME()
+    FROM User_Projects UP
+    INNER JOIN @Rows R ON R.InstanceId = UP.UserProject_InstanceId
+    WHERE R.ProvisioningState IS NOT NULL;
+
+    -- One row per instance and user project, UserIdKey is NULL if no user project has the instance
+    SELECT R.InstanceId, UP.UserProject_UserIdKey
+    FROM @Rows R
+    LEFT JOIN User_Projects UP ON R.InstanceId = UP.UserProject_InstanceId;
+END
+GO
 /****** Object:  StoredProcedure [dbo].[sp_CompletePasswordReset]    Script Date: 15.09.2024 19:43:59 ******/
 SET ANSI_NULLS ON
 GO
@@ -4,6 +4,7 @@ import hmac
 import hashlib
 import time
 import json
+import uuid
 import traceback
 
 from functools import wraps
@@ -13,12 +14,20 @@ from http.client import HTTPException
 from werkzeug.exceptions import HTTPException
 from flask import request, jsonify, Flask, Response
 
-from src.aws.aws_instance import get_instance_status
-from src.vps.connect_vps import setup_vps, vps_logs_stream
+from src.aws.aws_instance import get_instance_statuses
+from src.jobs.job_queue import get_job_queue, get_job
+from src.vps.connect_vps import setup_vps, subscribe_vps_logs
+from src.vps.fleet import provision_fleet, FLEET_SETUP_WORKERS
+from src.vps.rolling_update import rolling_update, validate_image, ROLLING_UPDATE_BATCH_SIZE
+from src.vps.sse import sse_log_frames, format_sse
+from src.vps.templates import get_template_registry
+from src.vps.vps_exceptions import VPSTemplateError, VPSUpdateError
 from src.crypto.create_wallet import generate_wallet_keys
+from src.crypto.crypto_exceptions import PasswordHasherBusyError
 from src.contabo.create_instance import setup_instance, check_instance_status, cancel_instance
 from src.database.database import (create_user_project, register_user, login_user, send_verification_email,
-                                   verify_email_process, fetch_user_projects)
+                                   verify_email_process, fetch_user_projects, fetch_user_projects_page,
+                                   fetch_user_projects_version, USER_PROJECT_FIELDS, USER_PROJECTS_PAGE_SIZE)
 
 # from src.contabo.batch_process import initialize_scheduler
 
@@ -31,6 +40,8 @@ CONTABO_CLIENT_ID = os.getenv('CONTABO_CLIENT_ID')
 CONTABO_CLIENT_SECRET = os.getenv('CONTABO_CLIENT_SECRET')
 CONTABO_API_USER = os.getenv('CONTABO_API_USER')
 CONTABO_API_SECRET = os.getenv('CONTABO_API_SECRET')
+# Server-side credential of the operator routes, the APP_SECRET ships with the frontend and cannot guard them
+OPERATOR_TOKEN = os.getenv('OPERATOR_TOKEN')
 
 if not APP_SECRET:
     raise ValueError("APP_SECRET is not set in the .env file")
@@ -40,8 +51,8 @@ app = Flask(__name__)
 CORS(app, resources={r"/*": {
     "origins": "*",  # Be more specific in production
     "methods": ["GET", "POST", "OPTIONS"],
-    "allow_headers": ["Content-Type", "Authorization", "X-Signature", "X-Timestamp"],
-    "expose_headers": ["Content-Type", "Authorization", "X-Signature", "X-Timestamp"],
+    "allow_headers": ["Content-Type", "Authorization", "X-Signature", "X-Timestamp", "If-None-Match"],
+    "expose_headers": ["Content-Type", "Authorization", "X-Signature", "X-Timestamp", "ETag"],
     "supports_credentials": True,
     "vary_header": True
 }})
@@ -50,6 +61,12 @@ CORS(app, resources={r"/*": {
 # Initialize batch process to check on running instances
 # initialize_scheduler()
 
+# Parse and validate the setup script templates once at startup
+try:
+    get_template_registry().load_all()
+except (OSError, VPSTemplateError) as template_error:
+    logging.error(f"Could not load setup script templates: {template_error}")
+
 
 @app.errorhandler(Exception)
 def handle_error(error):
@@ -63,6 +80,12 @@ def handle_error(error):
         error_details['code'] = error.code
         response = jsonify(error_details)
         response.status_code = error.code
+    elif isinstance(error, PasswordHasherBusyError):
+        # Too many logins at once, the client should retry shortly
+        error_details['code'] = 503
+        response = jsonify(error_details)
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
     else:
         error_details['code'] = 500
         response = jsonify(error_details)
@@ -82,47 +105,87 @@ def after_request(response):
     return response
 
 
+def check_signature(timestamp: str, provided_signature: str, method: str, url: str, json_data=None):
+    """
+    Check the HMAC signature of a request.
+
+    :param timestamp: Value of the X-Timestamp header
+    :param provided_signature: Value of the X-Signature header
+    :param method: HTTP method
+    :param url: Full request URL including the query string
+    :param json_data: Parsed JSON body of POST requests
+    :return: Error message if the request must be rejected, None if the signature is valid
+    """
+    if not timestamp or not provided_signature:
+        return 'Missing headers'
+
+    if abs(int(time.time()) - int(timestamp)) > 1000:
+        return 'Request expired'
+
+    signature_data = f"{timestamp}{method}{url}"
+
+    # Only add JSON body for POST requests
+    if method == 'POST' and json_data:
+        signature_data += json.dumps(json_data, sort_keys=True)
+
+    signature_data = signature_data.replace(" ", "")
+    logging.info(f"Final SIGNATURE DATA: {signature_data}")
+
+    expected_signature = hmac.new(
+        APP_SECRET.encode('utf-8'),
+        signature_data.encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+
+    logging.info(f"Provided Signature: {provided_signature}")
+    logging.info(f"Expected Signature: {expected_signature}")
+
+    if not hmac.compare_digest(provided_signature, expected_signature):
+        return 'Invalid signature'
+
+    return None
+
+
 def verify_signature(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         if request.method == 'OPTIONS':
             return '', 200
 
-        timestamp = request.headers.get('X-Timestamp')
-        provided_signature = request.headers.get('X-Signature')
-
-        if not timestamp or not provided_signature:
-            return jsonify({'error': 'Missing headers'}), 401
-
-        if abs(int(time.time()) - int(timestamp)) > 1000:
-            return jsonify({'error': 'Request expired'}), 401
-
         url = request.base_url
         if request.query_string:
             url += '?' + request.query_string.decode()
 
-        signature_data = f"{timestamp}{request.method}{url}"
-
-        # Only add JSON body for POST requests
+        json_data = None
         if request.method == 'POST' and request.is_json:
             json_data = request.get_json(silent=True)
-            if json_data:
-                signature_data += json.dumps(json_data, sort_keys=True)
 
-        signature_data = signature_data.replace(" ", "")
-        logging.info(f"Final SIGNATURE DATA: {signature_data}")
+        error = check_signature(request.headers.get('X-Timestamp'), request.headers.get('X-Signature'),
+                                request.method, url, json_data)
+        if error:
+            return jsonify({'error': error}), 401
 
-        expected_signature = hmac.new(
-            APP_SECRET.encode('utf-8'),
-            signature_data.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        return f(*args, **kwargs)
+
+    return decorated
+
+
+def require_operator(f):
+    """
+    Only let requests carrying the OPERATOR_TOKEN as bearer token through, routes are disabled without one.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.method == 'OPTIONS':
+            return '', 200
 
-        logging.info(f"Provided Signature: {provided_signature}")
-        logging.info(f"Expected Signature: {expected_signature}")
+        if not OPERATOR_TOKEN:
+            return jsonify({'error': 'Operator routes are disabled'}), 403
 
-        if not hmac.compare_digest(provided_signature, expected_signature):
-            return jsonify({'error': 'Invalid signature'}), 401
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode('utf-8'),
+                                                                  OPERATOR_TOKEN.encode('utf-8')):
+            return jsonify({'error': 'Operator credential required'}), 403
 
         return f(*args, **kwargs)
 
@@ -134,25 +197,38 @@ def verify_signature(f):
 def instance_setup() -> json:
     try:
         data = request.json
-        response = setup_instance(data)
-
-        if "instance_id" in response and "user_project_id" in response and "public_ip" in response:
-            return jsonify({
-                'message': f"Instance created",
-                'user_project_id': response['user_project_id'],
-                'instance_id': response['instance_id']
-            }), 202  # 202 Accepted
+        job_id = get_job_queue().submit('instance_setup', setup_instance, data)
 
+        # user_project_id, instance_id and public_ip are in the job result once it has finished
         return jsonify({
-            'message': f"Unexpected problem while instance creation. Please contact support.",
-            f'Response': response
-        }), 500
+            'message': f"Instance setup started",
+            'job_id': job_id
+        }), 202  # 202 Accepted
 
     except Exception as e:
         # Log the exception or handle it appropriately
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+@verify_signature
+def job_status(job_id: str) -> json:
+    try:
+        # Job IDs are UUIDs, anything else cannot exist and would fail the conversion in the database
+        uuid.UUID(job_id)
+    except ValueError:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+
+    try:
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({'error': f'Job {job_id} not found'}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        logging.error(f"Error fetching job {job_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/user_projects', methods=['GET'])
 @verify_signature
 def get_user_projects():
@@ -170,6 +246,42 @@ def get_user_projects():
         raise
 
 
+@app.route('/user_projects/page', methods=['GET'])
+@verify_signature
+def get_user_projects_page():
+    """
+    Page of a user's projects without key material, with only the fields named in ?fields=a,b
+    (all by default). Pass the returned next ID as ?after= for the following page.
+
+    Responds 304 without reading the projects when If-None-Match still matches their version.
+    """
+    try:
+        user_id = request.args.get('user_id', type=int)
+        if not user_id:
+            return jsonify({"error": "User ID is required"}), 400
+        fields = [field for field in request.args.get('fields', ','.join(USER_PROJECT_FIELDS)).split(',') if field]
+        unknown = set(fields) - USER_PROJECT_FIELDS.keys()
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+        after_id = request.args.get('after', 0, type=int)
+        limit = request.args.get('limit', USER_PROJECTS_PAGE_SIZE, type=int)
+
+        version = fetch_user_projects_version(user_id)
+        etag = hashlib.sha256(f"{version}|{','.join(fields)}|{after_id}|{limit}".encode()).hexdigest()[:32]
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            projects, next_after_id = fetch_user_projects_page(user_id, fields, after_id, limit)
+            response = jsonify({"message": "User project data successfully fetched", "data": projects,
+                                "next": next_after_id})
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        logging.error(f"Error in get_user_projects_page: {str(e)}")
+        raise
+
+
 @app.route('/instance_status', methods=['GET'])
 @verify_signature
 def instance_status() -> json:
@@ -183,25 +295,28 @@ def instance_status() -> json:
 
     try:
         instance_ids_raw = request.args.get('params')
-        instance_ids = parse_instance_ids(instance_ids_raw)
+        instance_ids = [instance_id for instance_id in parse_instance_ids(instance_ids_raw or '') if instance_id]
         if not instance_ids:
             return jsonify({'error': 'No instance IDs provided'}), 400
 
         statuses: List[Dict] = []
         errors: List[Dict] = []
 
-        for instance_id in instance_ids:
-            try:
-                status = get_instance_status(instance_id)
+        try:
+            result = get_instance_statuses(instance_ids)
+        except Exception as e:
+            logging.error(f"Error fetching status for instances {instance_ids}: {str(e)}")
+            errors = [{'instanceId': instance_id, 'error': str(e)} for instance_id in instance_ids]
+        else:
+            for instance_id, status in result['statuses'].items():
                 statuses.append({
                     'instanceId': instance_id,
                     'status': status,
                 })
-            except Exception as e:
-                logging.error(f"Error fetching status for instance {instance_id}: {str(e)}")
+            for instance_id in result['missing']:
                 errors.append({
                     'instanceId': instance_id,
-                    'error': str(e)
+                    'error': f"Instance {instance_id} not found"
                 })
 
         response = {
@@ -237,9 +352,61 @@ def _instance_status() -> json:
 def vps_setup() -> json:
     try:
         data = request.json
-        setup_vps(data['user_project_id'])
+        job_id = get_job_queue().submit('vps_setup', setup_vps, data['user_project_id'])
         return jsonify({
             'status': f'Instance created, setup started',
+            'job_id': job_id
+        }), 202  # 202 Accepted
+    except Exception as e:
+        # Log the exception or handle it appropriately
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/fleet_setup', methods=['POST'])
+@verify_signature
+@require_operator
+def fleet_setup() -> json:
+    try:
+        data = request.json or {}
+        user_project_ids = data.get('user_project_ids')
+        if not isinstance(user_project_ids, list) or not user_project_ids:
+            return jsonify({'error': 'user_project_ids must be a non-empty list'}), 400
+
+        # Per-host progress and phase timings are in the job result while the job runs
+        job_id = get_job_queue().submit_with_progress(
+            'fleet_setup', provision_fleet, user_project_ids,
+            max_workers=int(data.get('max_workers', FLEET_SETUP_WORKERS)),
+            fail_fast=bool(data.get('fail_fast', False)))
+        return jsonify({
+            'status': f'Setup of {len(user_project_ids)} instances started',
+            'job_id': job_id
+        }), 202  # 202 Accepted
+    except Exception as e:
+        # Log the exception or handle it appropriately
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/rolling_update', methods=['POST'])
+@verify_signature
+@require_operator
+def rolling_update_project() -> json:
+    try:
+        data = request.json or {}
+        if 'project_id' not in data or not data.get('image'):
+            return jsonify({'error': 'project_id and image are required'}), 400
+        try:
+            validate_image(data['image'])
+        except VPSUpdateError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Per-host progress is in the job result while the update runs
+        job_id = get_job_queue().submit_with_progress(
+            'rolling_update', rolling_update, data['project_id'], data['image'],
+            batch_size=int(data.get('batch_size', ROLLING_UPDATE_BATCH_SIZE)),
+            max_failures=int(data.get('max_failures', 0)))
+        return jsonify({
+            'status': f"Rolling update to {data['image']} started",
+            'job_id': job_id
         }), 202  # 202 Accepted
     except Exception as e:
         # Log the exception or handle it appropriately
@@ -366,15 +533,15 @@ def stream_logs():
         return jsonify({"error": "Invalid Request, missing IP"}), 400
 
     def generate():
+        subscription = subscribe_vps_logs(instanceIp=ip_address, pem=True)
         try:
-            for line in vps_logs_stream(instanceIp=ip_address, pem=True):
-                print(f"Sending line: {line}")
-                yield f"data: {line}\n\n"
-        except GeneratorExit:
-            logging.info(f"Stream Ended\n\n")
-            yield f"data: Stream Ended\n\n"
-
-    return Response(generate(), content_type='text/event-stream')
+            yield from sse_log_frames(subscription)
+            yield format_sse(["Stream Ended"])
+        finally:
+            subscription.close()
+            logging.info(f"Log stream of {ip_address} closed")
+
+    return Response(generate(), content_type='text/event-stream', headers={'X-Accel-Buffering': 'no'})
 
 
 @app.route('/stream', methods=['GET'])
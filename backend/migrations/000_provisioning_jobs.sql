@@ -0,0 +1,23 @@
+-- Adds the background job table to an existing database, database.sql already contains it.
+CREATE TABLE [dbo].[ProvisioningJobs](
+	[Job_Id] [uniqueidentifier] NOT NULL,
+	[Job_Type] [nvarchar](32) NOT NULL,
+	[Job_Status] [nvarchar](16) NOT NULL,
+	[Job_Result] [nvarchar](max) NULL,
+	[Job_Error] [nvarchar](max) NULL,
+	[Job_CreationDate] [datetime2](7) NULL,
+	[Job_StartedDate] [datetime2](7) NULL,
+	[Job_FinishedDate] [datetime2](7) NULL,
+ CONSTRAINT [PK_ProvisioningJobs] PRIMARY KEY CLUSTERED
+(
+	[Job_Id] ASC
+)
+) ON [PRIMARY] TEXTIMAGE_ON [PRIMARY]
+GO
+CREATE NONCLUSTERED INDEX [IX_ProvisioningJobs_Status] ON [dbo].[ProvisioningJobs]
+(
+	[Job_Status] ASC
+)
+GO
+ALTER TABLE [dbo].[ProvisioningJobs] ADD  CONSTRAINT [DF_ProvisioningJobs_CreationDate]  DEFAULT (getdate()) FOR [Job_CreationDate]
+GO
@@ -0,0 +1,21 @@
+-- Adds the provisioning queue to an existing database, database.sql already contains it.
+-- Instances without an IP address are queued as pending, the others are considered configured.
+ALTER TABLE [dbo].[User_Projects] ADD
+	[UserProject_ProvisioningState] [nvarchar](16) NULL,
+	[UserProject_LeaseUntil] [datetime2](7) NULL,
+	[UserProject_ProvisioningAttempts] [int] NOT NULL CONSTRAINT [DF_UserProjects_ProvisioningAttempts] DEFAULT ((0))
+GO
+ALTER TABLE [dbo].[User_Projects]  WITH CHECK ADD  CONSTRAINT [CK_UserProjects_ProvisioningState] CHECK  (([UserProject_ProvisioningState] IN (N'pending', N'running', N'configured', N'failed')))
+GO
+UPDATE UP
+SET UserProject_ProvisioningState = CASE WHEN UK.UserKey_IPAddress IS NULL THEN N'pending' ELSE N'configured' END
+FROM [dbo].[User_Projects] UP
+INNER JOIN [dbo].[UserKeys] UK ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
+GO
+CREATE NONCLUSTERED INDEX [IX_UserProjects_ProvisioningQueue] ON [dbo].[User_Projects]
+(
+	[UserProject_LeaseUntil] ASC
+)
+INCLUDE([UserProject_ProvisioningState],[UserProject_InstanceId])
+WHERE ([UserProject_ProvisioningState] IN (N'pending', N'running'))
+GO
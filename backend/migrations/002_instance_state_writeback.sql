@@ -0,0 +1,44 @@
+-- Adds the bulk instance state writeback to an existing database, database.sql already contains it.
+CREATE NONCLUSTERED INDEX [IX_UserProjects_InstanceId] ON [dbo].[User_Projects]
+(
+	[UserProject_InstanceId] ASC
+)
+INCLUDE([UserProject_UserIdKey])
+GO
+CREATE TYPE [dbo].[InstanceStateList] AS TABLE(
+	[InstanceId] [nvarchar](50) NOT NULL,
+	[IPAddress] [nvarchar](15) NULL,
+	[ProvisioningState] [nvarchar](16) NULL,
+	PRIMARY KEY CLUSTERED
+(
+	[InstanceId] ASC
+)WITH (IGNORE_DUP_KEY = OFF)
+)
+GO
+CREATE PROCEDURE [dbo].[sp_ApplyInstanceStates]
+    @Rows [dbo].[InstanceStateList] READONLY
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    UPDATE UK
+    SET UserKey_IPAddress = R.IPAddress,
+        UserKey_LastModifiedDate = SYSDATETIME()
+    FROM UserKeys UK
+    INNER JOIN User_Projects UP ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
+    INNER JOIN @Rows R ON R.InstanceId = UP.UserProject_InstanceId
+    WHERE R.IPAddress IS NOT NULL;
+
+    UPDATE UP
+    SET UserProject_ProvisioningState = R.ProvisioningState,
+        UserProject_LastModifiedDate = SYSDATETIME()
+    FROM User_Projects UP
+    INNER JOIN @Rows R ON R.InstanceId = UP.UserProject_InstanceId
+    WHERE R.ProvisioningState IS NOT NULL;
+
+    -- One row per instance and user project, UserIdKey is NULL if no user project has the instance
+    SELECT R.InstanceId, UP.UserProject_UserIdKey
+    FROM @Rows R
+    LEFT JOIN User_Projects UP ON R.InstanceId = UP.UserProject_InstanceId;
+END
+GO
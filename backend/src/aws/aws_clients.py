@@ -0,0 +1,68 @@
+import os
+import boto3
+import logging
+import threading
+
+from dotenv import load_dotenv
+from botocore.config import Config
+from typing import Dict, Tuple, Optional, Any
+
+load_dotenv()
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', 25))
+
+logger = logging.getLogger(__name__)
+
+# Registry key: (service, region, access key id, secret access key)
+ClientKey = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+_sessions: Dict[Tuple[Optional[str], Optional[str]], boto3.session.Session] = {}
+_clients: Dict[ClientKey, Any] = {}
+_lock = threading.Lock()
+_client_config = Config(max_pool_connections=AWS_MAX_POOL_CONNECTIONS)
+
+
+def _get_session(aws_access_key_id: Optional[str], aws_secret_access_key: Optional[str]) -> boto3.session.Session:
+    # Must be called with _lock held, boto3 sessions are not safe to use from several threads at once
+    credentials = (aws_access_key_id, aws_secret_access_key)
+    session = _sessions.get(credentials)
+    if session is None:
+        session = boto3.session.Session(aws_access_key_id=aws_access_key_id,
+                                        aws_secret_access_key=aws_secret_access_key)
+        _sessions[credentials] = session
+    return session
+
+
+def get_client(service_name: str, region_name: Optional[str] = None, aws_access_key_id: Optional[str] = None,
+               aws_secret_access_key: Optional[str] = None):
+    """
+    Return a shared boto3 client, creating it on first use.
+
+    Clients are thread-safe, so one instance per (service, region, credentials) is reused across
+    requests and scheduler jobs instead of reloading the service model on every call.
+
+    :param service_name: AWS service name, e.g. 'ec2'
+    :param region_name: AWS region
+    :param aws_access_key_id: Access key ID, None to use the default credential chain
+    :param aws_secret_access_key: Secret access key, None to use the default credential chain
+    :return: boto3 client
+    """
+    key: ClientKey = (service_name, region_name, aws_access_key_id, aws_secret_access_key)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            session = _get_session(aws_access_key_id, aws_secret_access_key)
+            client = session.client(service_name, region_name=region_name, config=_client_config)
+            _clients[key] = client
+            logger.info(f"Created boto3 {service_name} client for region {region_name}")
+    return client
+
+
+def clear_clients() -> None:
+    """Drop all cached sessions and clients, e.g. after rotating credentials."""
+    with _lock:
+        _clients.clear()
+        _sessions.clear()
@@ -1,14 +1,14 @@
 import os
 import time
-import boto3
 import base64
 import logging
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Iterable, Optional
 from dotenv import load_dotenv
 from botocore.exceptions import ClientError
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from src.aws.aws_clients import get_client
 from src.database.database import (generate_password_and_key, create_user_project, save_encrypted_password,
                                    update_instance_ip)
 
@@ -26,6 +26,7 @@ AMI_ID: str = "ami-0e04bcbe83a83792e"  # Amazon Linux 2 AMI (HVM), SSD Volume Ty
 KEY_PAIR_NAME: str = "default"
 ROOT_PASSWORD: str = "12345678"
 AWS_REGION: str = "eu-central-1"
+DESCRIBE_INSTANCES_FILTER_LIMIT: int = 200  # Max values per filter accepted by DescribeInstances
 
 logger = logging.getLogger(__name__)
 
@@ -66,10 +67,10 @@ def create_ec2_instance(data: Dict[str, Any]) -> Dict[str, Any]:
         if not password:
             raise AWSInstanceCreationError("Failed to generate password")
 
-        ec2 = boto3.client('ec2',
-                           aws_access_key_id=AWS_ACCESS_KEY_ID,
-                           aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                           region_name=data.get('region', AWS_REGION))
+        ec2 = get_client('ec2',
+                         aws_access_key_id=AWS_ACCESS_KEY_ID,
+                         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                         region_name=data.get('region', AWS_REGION))
 
         response = ec2.run_instances(
             ImageId=data.get('image_id', AMI_ID),
@@ -146,20 +147,56 @@ def wait_for_instance_running(instance_id: str, max_retries: int = 60, delay: in
 
 
 def get_instance_status(instance_id: str) -> str:
-    ec2 = boto3.client('ec2', aws_access_key_id=AWS_ACCESS_KEY_ID,
-                       aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                       region_name=AWS_REGION)
+    ec2 = get_client('ec2', aws_access_key_id=AWS_ACCESS_KEY_ID,
+                     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                     region_name=AWS_REGION)
     response = ec2.describe_instances(InstanceIds=[instance_id])
     state = response['Reservations'][0]['Instances'][0]['State']['Name']
     return state
 
 
-def get_public_ip(instance_id: str) -> str:
-    ec2 = boto3.resource('ec2', aws_access_key_id=AWS_ACCESS_KEY_ID,
-                         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                         region_name=AWS_REGION)
-    instance = ec2.Instance(instance_id)
-    return instance.public_ip_address
+def get_instance_statuses(instance_ids: Iterable[str]) -> Dict[str, Any]:
+    """
+    Fetch the states of many EC2 instances with as few DescribeInstances calls as possible.
+
+    IDs are queried through an ``instance-id`` filter in chunks of DESCRIBE_INSTANCES_FILTER_LIMIT,
+    so unknown IDs are reported individually instead of failing the whole request.
+
+    :param instance_ids: EC2 instance IDs to look up
+    :return: Dictionary with 'statuses' (instance ID -> state) and 'missing' (IDs AWS did not return)
+    :raises ClientError: If the DescribeInstances call fails
+    """
+    unique_ids: List[str] = list(dict.fromkeys(instance_id for instance_id in instance_ids if instance_id))
+    statuses: Dict[str, str] = {}
+
+    if not unique_ids:
+        return {'statuses': statuses, 'missing': []}
+
+    ec2 = get_client('ec2', aws_access_key_id=AWS_ACCESS_KEY_ID,
+                     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                     region_name=AWS_REGION)
+    paginator = ec2.get_paginator('describe_instances')
+
+    for start in range(0, len(unique_ids), DESCRIBE_INSTANCES_FILTER_LIMIT):
+        chunk = unique_ids[start:start + DESCRIBE_INSTANCES_FILTER_LIMIT]
+        pages = paginator.paginate(Filters=[{'Name': 'instance-id', 'Values': chunk}],
+                                   PaginationConfig={'PageSize': 1000})
+        for page in pages:
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    statuses[instance['InstanceId']] = instance['State']['Name']
+
+    missing = [instance_id for instance_id in unique_ids if instance_id not in statuses]
+    logger.info(f"Fetched status for {len(statuses)} instances, {len(missing)} not found")
+    return {'statuses': statuses, 'missing': missing}
+
+
+def get_public_ip(instance_id: str) -> Optional[str]:
+    ec2 = get_client('ec2', aws_access_key_id=AWS_ACCESS_KEY_ID,
+                     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                     region_name=AWS_REGION)
+    response = ec2.describe_instances(InstanceIds=[instance_id])
+    return response['Reservations'][0]['Instances'][0].get('PublicIpAddress')
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
@@ -172,10 +209,10 @@ def delete_ec2_instance(instance_id: str) -> bool:
     :raises AWSInstanceDeletionError: If there's an error during instance deletion
     """
     try:
-        ec2 = boto3.client('ec2',
-                           aws_access_key_id=AWS_ACCESS_KEY_ID,
-                           aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                           region_name=AWS_REGION)
+        ec2 = get_client('ec2',
+                         aws_access_key_id=AWS_ACCESS_KEY_ID,
+                         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                         region_name=AWS_REGION)
 
         # Terminate the instance
         response = ec2.terminate_instances(InstanceIds=[instance_id])
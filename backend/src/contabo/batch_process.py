@@ -1,52 +1,158 @@
+import os
+import time
 import atexit
 import logging
 
+from dotenv import load_dotenv
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Set, Tuple
 
 from src.contabo.contabo_exceptions import BatchProcessError
 from src.contabo.create_instance import check_instance_status
-from src.database.database import fetch_pending_instances
+from src.database.database import (claim_provisioning_work, set_provisioning_state, record_provisioning_failure,
+                                   apply_instance_states, PROVISIONING_PENDING, PROVISIONING_RUNNING, PROVISIONING_CONFIGURED)
 from src.vps.connect_vps import setup_vps
 
 
+# Concurrency limits for the two batch phases
+load_dotenv()
+BATCH_STATUS_WORKERS = int(os.getenv('BATCH_STATUS_WORKERS', 10))
+BATCH_STATUS_TIMEOUT = float(os.getenv('BATCH_STATUS_TIMEOUT', 60))
+BATCH_SETUP_WORKERS = int(os.getenv('BATCH_SETUP_WORKERS', 4))
+BATCH_SETUP_TIMEOUT = float(os.getenv('BATCH_SETUP_TIMEOUT', 900))
+# Instances claimed per run, and how long the claim keeps other workers away from them
+BATCH_CLAIM_SIZE = int(os.getenv('BATCH_CLAIM_SIZE', 100))
+BATCH_LEASE_SECONDS = float(os.getenv('BATCH_LEASE_SECONDS', 1200))
+BATCH_MAX_SETUP_ATTEMPTS = int(os.getenv('BATCH_MAX_SETUP_ATTEMPTS', 3))
+
 logger = logging.getLogger(__name__)
 
 
-def batch_check_instance_status() -> Dict[str, int]:
+def run_concurrently(func: Callable[[Any], Any], items: Iterable[Hashable], max_workers: int,
+                     task_timeout: float, name: str) -> Tuple[Dict[Any, Any], Dict[Any, str], Set[Any]]:
+    """
+    Run func for every item on a bounded thread pool.
+
+    A task that has been running for longer than task_timeout is reported as failed and no longer
+    waited for. Its thread cannot be interrupted and keeps its worker slot until it returns, such
+    items are also returned as still running.
+
+    :param func: Callable applied to each item
+    :param items: Unique, hashable items to process
+    :param max_workers: Maximum number of tasks running at once
+    :param task_timeout: Seconds a single task may run before it is given up on
+    :param name: Name used for worker threads and log messages
+    :return: Tuple of (item -> result, item -> error message, items whose timed out task is still running)
     """
-    Batch process to check instance statuses and update database.
+    results: Dict[Any, Any] = {}
+    errors: Dict[Any, str] = {}
+    timed_out: Set[Any] = set()
+    started_at: Dict[Any, float] = {}
+
+    def run(item):
+        started_at[item] = time.monotonic()
+        return func(item)
 
-    :return: Dictionary with counts of checked and running instances
+    executor = ThreadPoolExecutor(max_workers=max(max_workers, 1), thread_name_prefix=name)
+    try:
+        futures = {executor.submit(run, item): item for item in items}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=min(task_timeout, 1.0), return_when=FIRST_COMPLETED)
+            for future in done:
+                item = futures[future]
+                try:
+                    results[item] = future.result()
+                except Exception as e:
+                    logger.error(f"{name} failed for {item}: {e}")
+                    errors[item] = str(e)
+
+            now = time.monotonic()
+            for future in list(pending):
+                item = futures[future]
+                if item in started_at and now - started_at[item] > task_timeout:
+                    logger.error(f"{name} for {item} timed out after {task_timeout} seconds")
+                    errors[item] = f"Timed out after {task_timeout} seconds"
+                    timed_out.add(item)
+                    pending.discard(future)
+    finally:
+        # Do not block on timed out tasks, they finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # A timed out task may have finished since, only the ones still running are reported
+    return results, errors, {item for future, item in futures.items() if item in timed_out and not future.done()}
+
+
+def batch_check_instance_status(status_workers: int = BATCH_STATUS_WORKERS,
+                                status_timeout: float = BATCH_STATUS_TIMEOUT,
+                                setup_workers: int = BATCH_SETUP_WORKERS,
+                                setup_timeout: float = BATCH_SETUP_TIMEOUT,
+                                claim_size: int = BATCH_CLAIM_SIZE,
+                                lease_seconds: float = BATCH_LEASE_SECONDS,
+                                max_setup_attempts: int = BATCH_MAX_SETUP_ATTEMPTS) -> Dict[str, int]:
+    """
+    Batch process to check instance statuses and set up the instances that are running.
+
+    Works on instances claimed from the provisioning queue, so several workers can run it at once
+    without processing the same instance. Pending instances are checked and moved to running once
+    Contabo reports them running, running instances are set up and moved to configured. A failed
+    setup is retried by a later run, up to max_setup_attempts times.
+
+    Status checks and VPS setups each run on their own bounded thread pool.
+
+    :param status_workers: Maximum number of concurrent status checks
+    :param status_timeout: Seconds a single status check may take
+    :param setup_workers: Maximum number of concurrent VPS setups
+    :param setup_timeout: Seconds a single VPS setup may take
+    :param claim_size: Maximum number of instances to claim
+    :param lease_seconds: Seconds the claim lasts, should exceed status_timeout plus setup_timeout
+    :param max_setup_attempts: Failed setups after which an instance is moved to failed
+    :return: Dictionary with counts of checked, running and failed instances
     :raises BatchProcessError: If there's an error during the batch process
     """
     try:
-        pending_instances = fetch_pending_instances()
-        running_instances: List[int] = []
-
-        for instance in pending_instances:
-            try:
-                status = check_instance_status(instance['instance_id'])
-                if status['status'].lower() == "running":
-                    running_instances.append(instance['user_project_id'])
-            except Exception as e:
-                logger.error(f"Error checking status for instance {instance['instance_id']}: {e}")
-                # Continue with the next instance
-
-        for user_project_id in running_instances:
-            try:
-                setup_vps(int(user_project_id))
-            except Exception as e:
-                logger.error(f"Error setting up VPS for user project {user_project_id}: {e}")
-                # Continue with the next instance
+        claimed = claim_provisioning_work(claim_size, lease_seconds)
+        user_project_ids = {work['instance_id']: work['user_project_id'] for work in claimed
+                            if work['state'] == PROVISIONING_PENDING}
+
+        # IP addresses are saved below in one writeback instead of one update per instance
+        statuses, status_errors, _ = run_concurrently(
+            lambda instance_id: check_instance_status(instance_id, save_ip=False),
+            user_project_ids, status_workers, status_timeout, 'status-check')
+        started = {instance_id: status['ip_address'] for instance_id, status in statuses.items()
+                   if status['status'].lower() == "running"}
+        started_instances: List[int] = [int(user_project_ids[instance_id]) for instance_id in started]
+        # Checked again by the next run
+        set_provisioning_state([int(user_project_ids[instance_id]) for instance_id in user_project_ids
+                                if instance_id not in started], PROVISIONING_PENDING)
+        # Keeps the claims, the setups below still work on these
+        apply_instance_states((instance_id, ip_address, PROVISIONING_RUNNING)
+                              for instance_id, ip_address in started.items())
+
+        running_instances = started_instances + [int(work['user_project_id']) for work in claimed
+                                                 if work['state'] == PROVISIONING_RUNNING]
+        setups, setup_errors, setups_running = run_concurrently(
+            setup_vps, running_instances, setup_workers, setup_timeout, 'vps-setup')
+
+        set_provisioning_state(list(setups), PROVISIONING_CONFIGURED)
+        for user_project_id in setup_errors:
+            # A setup still running on the host keeps its claim until the lease expires, so no other
+            # worker starts a second setup on the same host meanwhile
+            record_provisioning_failure(user_project_id, max_setup_attempts,
+                                        release=user_project_id not in setups_running)
 
         logger.info(
-            f"Batch process completed. Checked {len(pending_instances)} instances, {len(running_instances)} are now running.")
+            f"Batch process completed. Checked {len(user_project_ids)} instances, {len(running_instances)} are now "
+            f"running, {len(status_errors)} status checks and {len(setup_errors)} setups failed.")
 
         return {
-            "checked_instances": len(pending_instances),
-            "running_instances": len(running_instances)
+            "checked_instances": len(user_project_ids),
+            "running_instances": len(running_instances),
+            "failed_status_checks": len(status_errors),
+            "completed_setups": len(setups),
+            "failed_setups": len(setup_errors)
         }
 
     except Exception as e:
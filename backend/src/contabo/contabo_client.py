@@ -0,0 +1,162 @@
+import os
+import logging
+import threading
+import requests
+
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Optional
+
+from src.contabo.token_cache import AccessTokenCache
+from src.contabo.contabo_exceptions import ContaboAuthError
+
+load_dotenv()
+CONTABO_CLIENT_ID = os.getenv('CONTABO_CLIENT_ID')
+CONTABO_CLIENT_SECRET = os.getenv('CONTABO_CLIENT_SECRET')
+CONTABO_API_USER = os.getenv('CONTABO_API_USER')
+CONTABO_API_SECRET = os.getenv('CONTABO_API_SECRET')
+CONTABO_API_AUTH = os.getenv('CONTABO_API_AUTH')
+CONTABO_TOKEN_REFRESH_MARGIN = float(os.getenv('CONTABO_TOKEN_REFRESH_MARGIN', 60))
+CONTABO_POOL_SIZE = int(os.getenv('CONTABO_POOL_SIZE', 10))
+CONTABO_CONNECT_TIMEOUT = float(os.getenv('CONTABO_CONNECT_TIMEOUT', 5))
+CONTABO_READ_TIMEOUT = float(os.getenv('CONTABO_READ_TIMEOUT', 30))
+
+logger = logging.getLogger(__name__)
+
+
+class ContaboClient:
+    """
+    Contabo API client on top of one pooled ``requests.Session``.
+
+    Keep-alive connections are reused across calls, every request gets a timeout and the OAuth
+    token is cached and renewed once when the API answers 401.
+    """
+
+    def __init__(self, pool_size: int = CONTABO_POOL_SIZE, connect_timeout: float = CONTABO_CONNECT_TIMEOUT,
+                 read_timeout: float = CONTABO_READ_TIMEOUT, refresh_margin: float = CONTABO_TOKEN_REFRESH_MARGIN):
+        """
+        :param pool_size: Maximum number of keep-alive connections per host
+        :param connect_timeout: Seconds to wait for a connection to be established
+        :param read_timeout: Seconds to wait for the server to send a response
+        :param refresh_margin: Seconds before expiry at which the access token is renewed
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Resolved on each call so the token fetch can be replaced on the instance
+        self._token_cache = AccessTokenCache(lambda: self.fetch_access_token(), refresh_margin=refresh_margin)
+
+    def fetch_access_token(self) -> Dict[str, Any]:
+        """
+        Request a new access token from the Contabo auth server.
+
+        Not retried here: this runs while the token cache lock is held, so retries are left to the
+        decorated API calls instead of blocking every waiting caller through the backoff.
+
+        :return: Token response containing 'access_token' and 'expires_in'
+        :raises ContaboAuthError: If authentication fails
+        """
+        headers = {
+            'client_id': CONTABO_CLIENT_ID,
+            'client_secret': CONTABO_CLIENT_SECRET,
+            'username': CONTABO_API_USER,
+            'password': CONTABO_API_SECRET,
+            'grant_type': 'password'
+        }
+
+        try:
+            response = self.session.post(CONTABO_API_AUTH, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+            token_data = response.json()
+            if 'access_token' not in token_data:
+                raise ContaboAuthError("Access token not found in response")
+
+            return token_data
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error during Contabo API authentication: {e}")
+            raise ContaboAuthError(f"Failed to authenticate with Contabo API: {e}") from e
+        except ValueError as e:
+            logger.error(f"Error parsing Contabo API response: {e}")
+            raise ContaboAuthError(f"Failed to parse Contabo API response: {e}") from e
+        except ContaboAuthError:
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error during Contabo API authentication: {e}")
+            raise ContaboAuthError(f"Unexpected error during Contabo API authentication: {e}") from e
+
+    def get_access_token(self, force_refresh: bool = False) -> str:
+        """
+        Return a cached access token, refreshing it shortly before it expires.
+
+        :param force_refresh: Ignore the cached token and fetch a new one
+        :return: Access token
+        :raises ContaboAuthError: If a new token could not be obtained
+        """
+        return self._token_cache.get(force_refresh=force_refresh)
+
+    def invalidate_access_token(self, token: Optional[str] = None) -> None:
+        """
+        Drop the cached access token.
+
+        :param token: Only drop it if this is still the cached token
+        """
+        self._token_cache.invalidate(token)
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                **kwargs) -> requests.Response:
+        """
+        Send an authorized Contabo API request, renewing the access token once on 401.
+
+        :param method: HTTP method, e.g. 'GET' or 'POST'
+        :param url: Request URL
+        :param headers: Request headers without Authorization
+        :return: Successful response
+        :raises ContaboAuthError: If no access token could be obtained
+        :raises requests.exceptions.RequestException: If the request fails or times out
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        headers = headers or {}
+
+        token = self.get_access_token()
+        response = self.session.request(method, url, headers={**headers, 'Authorization': f'Bearer {token}'},
+                                        **kwargs)
+
+        if response.status_code == 401:
+            logger.warning("Contabo API rejected the access token, requesting a new one")
+            self.invalidate_access_token(token)
+            token = self.get_access_token()
+            response = self.session.request(method, url, headers={**headers, 'Authorization': f'Bearer {token}'},
+                                            **kwargs)
+
+        response.raise_for_status()
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client: Optional[ContaboClient] = None
+_client_lock = threading.Lock()
+
+
+def get_contabo_client() -> ContaboClient:
+    """
+    Return the process-wide Contabo client shared by the Flask routes and the batch process.
+
+    :return: Shared ContaboClient instance
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ContaboClient()
+    return _client
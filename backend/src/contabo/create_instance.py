@@ -1,5 +1,4 @@
 import os
-import threading
 import requests
 import uuid
 import logging
@@ -14,8 +13,10 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 
 from src.aws.aws_instance import create_ec2_instance
 from src.database.database import (
-    update_instance_ip, generate_password_and_key, save_encrypted_password, create_user_project
+    update_instance_ip, generate_password_and_key, save_encrypted_password, create_user_project,
+    PROVISIONING_PENDING
 )
+from src.contabo.contabo_client import get_contabo_client
 from src.contabo.contabo_exceptions import (
     ContaboAuthError, ContaboInstanceCreationError, InstanceSetupError, InstanceCancellationError,
     InstanceStatusCheckError, SetupInstanceError
@@ -24,11 +25,6 @@ from src.contabo.contabo_exceptions import (
 
 load_dotenv()
 APP_SECRET = os.getenv('APP_SECRET')
-CONTABO_CLIENT_ID = os.getenv('CONTABO_CLIENT_ID')
-CONTABO_CLIENT_SECRET = os.getenv('CONTABO_CLIENT_SECRET')
-CONTABO_API_USER = os.getenv('CONTABO_API_USER')
-CONTABO_API_SECRET = os.getenv('CONTABO_API_SECRET')
-CONTABO_API_AUTH = os.getenv('CONTABO_API_AUTH')
 CONTABO_API_COMPUTE_INSTANCE = os.getenv('CONTABO_API_COMPUTE_INSTANCE')
 
 app = Flask(__name__)
@@ -38,34 +34,24 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def get_access_token() -> str:
-    headers = {
-        'client_id': CONTABO_CLIENT_ID,
-        'client_secret': CONTABO_CLIENT_SECRET,
-        'username': CONTABO_API_USER,
-        'password': CONTABO_API_SECRET,
-        'grant_type': 'password'
-    }
+def get_access_token(force_refresh: bool = False) -> str:
+    """
+    Return a cached Contabo access token, refreshing it shortly before it expires.
 
-    try:
-        response = requests.post(CONTABO_API_AUTH, headers=headers)
-        response.raise_for_status()
-        print(response)
-        token_data = response.json()
-        if 'access_token' not in token_data:
-            raise ContaboAuthError("Access token not found in response")
-
-        return token_data['access_token']
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error during Contabo API authentication: {e}")
-        raise ContaboAuthError(f"Failed to authenticate with Contabo API: {e}") from e
-    except ValueError as e:
-        logger.error(f"Error parsing Contabo API response: {e}")
-        raise ContaboAuthError(f"Failed to parse Contabo API response: {e}") from e
-    except Exception as e:
-        logger.error(f"Unexpected error during Contabo API authentication: {e}")
-        raise ContaboAuthError(f"Unexpected error during Contabo API authentication: {e}") from e
+    :param force_refresh: Ignore the cached token and fetch a new one
+    :return: Access token
+    :raises ContaboAuthError: If a new token could not be obtained
+    """
+    return get_contabo_client().get_access_token(force_refresh=force_refresh)
+
+
+def invalidate_access_token(token: Optional[str] = None) -> None:
+    """
+    Drop the cached Contabo access token.
+
+    :param token: Only drop it if this is still the cached token
+    """
+    get_contabo_client().invalidate_access_token(token)
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
@@ -76,6 +62,7 @@ def create_instance(data: Dict[str, Any]) -> Dict[str, Any]:
     :param data: Dictionary containing instance creation parameters
     :return: Dictionary containing user_project_id and instance_id
     :raises ContaboInstanceCreationError: If there's an error during instance creation
+    :raises ContaboAuthError: If no Contabo access token could be obtained
     """
     try:
         image_id = data.get('imageId')
@@ -91,10 +78,6 @@ def create_instance(data: Dict[str, Any]) -> Dict[str, Any]:
         if not password:
             raise ContaboInstanceCreationError("Failed to generate password")
 
-        ACCESS_TOKEN = get_access_token()
-        if not ACCESS_TOKEN:
-            raise ContaboInstanceCreationError("Failed to get access token")
-
         payload = {
             "imageId": image_id,
             "productId": product_id,
@@ -114,17 +97,17 @@ def create_instance(data: Dict[str, Any]) -> Dict[str, Any]:
 
         headers = {
             'Content-Type': 'application/json',
-            'Authorization': f'Bearer {ACCESS_TOKEN}',
             'x-request-id': str(uuid.uuid4()),
             'x-trace-id': str(uuid.uuid4())[:6]
         }
 
-        response = requests.post(CONTABO_API_COMPUTE_INSTANCE, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
+        response = get_contabo_client().post(CONTABO_API_COMPUTE_INSTANCE, headers=headers, json=payload)
         response_data = response.json()
 
         instance_id = response_data['data'][0]['instanceId']
-        user_project_id = create_user_project(user_id=user_id, project_id=project_id, instance_id=instance_id)
+        # Queued for the batch process, which sets the VPS up once Contabo reports it running
+        user_project_id = create_user_project(user_id=user_id, project_id=project_id, instance_id=instance_id,
+                                              provisioning_state=PROVISIONING_PENDING)
 
         if not user_project_id:
             raise ContaboInstanceCreationError(f"Failed creating user project for instance ID {instance_id}")
@@ -138,6 +121,8 @@ def create_instance(data: Dict[str, Any]) -> Dict[str, Any]:
             "instance_id": instance_id
         }
 
+    except ContaboAuthError:
+        raise
     except requests.exceptions.RequestException as e:
         logger.error(f"Error creating Contabo instance: {e}")
         raise ContaboInstanceCreationError(f"Failed to create Contabo instance: {e}") from e
@@ -209,23 +194,16 @@ def setup_instance(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     Set up a VPS instance.
 
+    Runs in the calling thread, submit it to the job queue to run it in the background.
+
     :param data: Dictionary containing instance setup parameters
     :return: Dictionary containing setup result or None if setup failed
     :raises SetupInstanceError: Specific class if there's an error during instance setup
     """
     try:
         result_queue = queue.Queue()
-
-        # Start the setup process in a new thread
-        thread = threading.Thread(
-            target=setup_instance_async,
-            args=(data, result_queue)
-        )
-        thread.start()
-
-        # Wait for the thread to finish and get the result
-        thread.join()
-        result = result_queue.get()
+        setup_instance_async(data, result_queue)
+        result = result_queue.get_nowait()
 
         if "error" in result:
             raise SetupInstanceError(result["error"])
@@ -240,27 +218,26 @@ def setup_instance(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def check_instance_status(instance_id: int) -> Dict[str, Any]:
+def check_instance_status(instance_id: int, save_ip: bool = True) -> Dict[str, Any]:
     """
     Check Contabo instance status.
 
     :param instance_id: ID of the instance to check
+    :param save_ip: Whether to save the IP address of a running instance, False if the caller saves it
     :return: Dictionary containing instance status information
     :raises InstanceStatusCheckError: If there's an error checking instance status
+    :raises ContaboAuthError: If no Contabo access token could be obtained
     """
     ip_address = None
     url = f"{CONTABO_API_COMPUTE_INSTANCE}/{instance_id}"
-    ACCESS_TOKEN = get_access_token()
 
     headers = {
-        'Authorization': f'Bearer {ACCESS_TOKEN}',
         'x-request-id': f'status-check-{int(time.time())}',
         'x-trace-id': f'trace-{int(time.time())}'
     }
 
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        response = get_contabo_client().get(url, headers=headers)
         instance_data = response.json()['data'][0]
         status = instance_data['status']
 
@@ -268,7 +245,7 @@ def check_instance_status(instance_id: int) -> Dict[str, Any]:
 
         if status.lower() == 'running':
             ip_address = instance_data['ipConfig']['v4']['ip']
-            if not update_instance_ip(instance_id=instance_id, ip_address=ip_address):
+            if save_ip and not update_instance_ip(instance_id=instance_id, ip_address=ip_address):
                 logger.warning(f"Failed to update IP address for instance {instance_id}")
 
         return {
@@ -276,6 +253,8 @@ def check_instance_status(instance_id: int) -> Dict[str, Any]:
             'ip_address': ip_address if status.lower() == 'running' else None
         }
 
+    except ContaboAuthError:
+        raise
     except requests.exceptions.RequestException as e:
         logger.error(f"Error checking instance status: {e}")
         raise InstanceStatusCheckError(f"Failed to check instance status: {str(e)}") from e
@@ -295,22 +274,22 @@ def cancel_instance(instance_id: int) -> bool:
     :param instance_id: ID of the instance to cancel
     :return: True if cancellation was successful, False otherwise
     :raises InstanceCancellationError: If there's an error during instance cancellation
+    :raises ContaboAuthError: If no Contabo access token could be obtained
     """
     url = f"{CONTABO_API_COMPUTE_INSTANCE}/{instance_id}/cancel"
-    ACCESS_TOKEN = get_access_token()
 
     headers = {
-        'Authorization': f'Bearer {ACCESS_TOKEN}',
         'x-request-id': str(uuid.uuid4()),
         'x-trace-id': str(uuid.uuid4())[:6]
     }
 
     try:
         logger.info(f"Attempting to cancel instance with ID: {instance_id}")
-        response = requests.post(url, headers=headers, timeout=30)
-        response.raise_for_status()
+        get_contabo_client().post(url, headers=headers)
         logger.info(f"Instance {instance_id} cancelled successfully")
         return True
+    except ContaboAuthError:
+        raise
     except requests.exceptions.RequestException as e:
         logger.error(f"Error cancelling instance {instance_id}: {e}")
         raise InstanceCancellationError(f"Failed to cancel instance {instance_id}: {str(e)}") from e
@@ -0,0 +1,93 @@
+import time
+import logging
+import threading
+
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AccessTokenCache:
+    """
+    Caches an OAuth access token and refreshes it shortly before it expires.
+
+    Refreshes are single-flight. While the current token is still valid, one caller renews it and the
+    others keep using the old token. Once it has expired, all callers wait for that one refresh instead
+    of each hitting the auth server.
+    """
+
+    def __init__(self, fetch_token: Callable[[], Dict[str, Any]], refresh_margin: float = 60.0,
+                 default_expires_in: float = 300.0):
+        """
+        :param fetch_token: Callable returning the token response, must contain 'access_token' and may contain 'expires_in'
+        :param refresh_margin: Seconds before expiry at which the token is renewed
+        :param default_expires_in: Lifetime assumed when the response carries no 'expires_in'
+        """
+        self._fetch_token = fetch_token
+        self.refresh_margin = refresh_margin
+        self.default_expires_in = default_expires_in
+
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+
+    def _refresh(self) -> str:
+        # Must be called with _lock held
+        token_data = self._fetch_token()
+        expires_in = float(token_data.get('expires_in') or self.default_expires_in)
+        now = time.monotonic()
+
+        self._token = token_data['access_token']
+        self._expires_at = now + expires_in
+        # Short-lived tokens are renewed at half their lifetime rather than after they expired
+        self._refresh_at = now + max(expires_in - self.refresh_margin, expires_in / 2)
+        logger.info(f"Access token refreshed, valid for {expires_in:.0f} seconds")
+        return self._token
+
+    def get(self, force_refresh: bool = False) -> str:
+        """
+        Return a valid access token, fetching a new one if needed.
+
+        :param force_refresh: Ignore the cached token and fetch a new one
+        :return: Access token
+        """
+        now = time.monotonic()
+        token = self._token
+
+        if not force_refresh and token is not None and now < self._refresh_at:
+            return token
+
+        if not force_refresh and token is not None and now < self._expires_at:
+            # Still valid: renew if nobody else is doing so, otherwise keep using the current token
+            if self._lock.acquire(blocking=False):
+                try:
+                    if time.monotonic() >= self._refresh_at:
+                        try:
+                            return self._refresh()
+                        except Exception as e:
+                            logger.warning(f"Proactive token refresh failed, using current token: {e}")
+                    return self._token
+                finally:
+                    self._lock.release()
+            return token
+
+        with self._lock:
+            # Another caller may have refreshed while we were waiting for the lock
+            if not force_refresh and self._token is not None and time.monotonic() < self._refresh_at:
+                return self._token
+            if force_refresh and self._token is not None and self._token != token:
+                return self._token
+            return self._refresh()
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """
+        Drop the cached token, e.g. after the API answered 401.
+
+        :param token: Only invalidate if this is still the cached token, so a token that was already renewed is kept
+        """
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expires_at = 0.0
+                self._refresh_at = 0.0
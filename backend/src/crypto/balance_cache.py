@@ -0,0 +1,175 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+
+from collections import OrderedDict
+from dotenv import load_dotenv
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.crypto.balance_service import get_balance_service
+
+load_dotenv()
+# Seconds a balance is served without asking the provider again
+BALANCE_CACHE_TTL = float(os.getenv('BALANCE_CACHE_TTL', 30))
+# Seconds past the TTL a balance is still served while it is refreshed in the background
+BALANCE_CACHE_MAX_STALE = float(os.getenv('BALANCE_CACHE_MAX_STALE', 300))
+BALANCE_CACHE_MAX_ENTRIES = int(os.getenv('BALANCE_CACHE_MAX_ENTRIES', 10000))
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]
+BalanceFetcher = Callable[[str, List[str]], Awaitable[Dict[str, float]]]
+
+
+async def fetch_from_service(network: str, addresses: List[str]) -> Dict[str, float]:
+    return await get_balance_service().get_balances(network, addresses)
+
+
+class BalanceCache:
+    """
+    Caches wallet balances by (network, address) in front of the RPC providers.
+
+    A balance younger than ttl is served from the cache. An older one is still served for up to
+    max_stale seconds, while one background request refreshes it. Concurrent lookups of an
+    address that is not cached share a single request (single flight) instead of each asking the
+    provider.
+
+    Entries are shared by all event loops; a lookup only joins a request running on its own loop.
+    """
+
+    def __init__(self, fetch: BalanceFetcher = fetch_from_service, ttl: float = BALANCE_CACHE_TTL,
+                 max_stale: float = BALANCE_CACHE_MAX_STALE, max_entries: int = BALANCE_CACHE_MAX_ENTRIES):
+        """
+        :param fetch: Coroutine function returning the balances of addresses on a network
+        :param ttl: Seconds a balance is fresh
+        :param max_stale: Seconds past ttl a balance is served while it is refreshed
+        :param max_entries: Maximum number of cached balances, the least recently fetched are dropped first
+        """
+        self._fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        # (network, address) -> (balance, fetched at), oldest fetch first
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, float]]' = OrderedDict()
+        self._in_flight: Dict[CacheKey, asyncio.Task] = {}
+        self._refreshes: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'fetch_errors': 0}
+
+    async def get_balances(self, network: str, addresses: Iterable[str]) -> Dict[str, float]:
+        """
+        Look up balances, asking the provider only for addresses without a usable cached balance.
+
+        :param network: 'solana' or an Ethereum network
+        :param addresses: Wallet addresses
+        :return: Balance per address
+        :raises ValueError: If an address is invalid
+        :raises SolanaBalanceCheckError: If the Solana lookup failed
+        :raises EthereumBalanceCheckError: If the network is not supported or the Ethereum lookup failed
+        """
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        balances: Dict[str, float] = {}
+        waiting: Dict[str, asyncio.Task] = {}
+        to_fetch: List[str] = []
+        to_refresh: List[str] = []
+
+        with self._lock:
+            for address in dict.fromkeys(addresses):
+                key = (network, address)
+                entry = self._entries.get(key)
+                age = now - entry[1] if entry is not None else None
+                in_flight = self._in_flight.get(key)
+                joinable = in_flight is not None and in_flight.get_loop() is loop
+
+                if age is not None and age <= self.ttl:
+                    self._stats['hits'] += 1
+                    balances[address] = entry[0]
+                elif age is not None and age <= self.ttl + self.max_stale:
+                    self._stats['stale_hits'] += 1
+                    balances[address] = entry[0]
+                    if not joinable:
+                        to_refresh.append(address)
+                elif joinable:
+                    self._stats['coalesced'] += 1
+                    waiting[address] = in_flight
+                else:
+                    self._stats['misses'] += 1
+                    to_fetch.append(address)
+
+            if to_fetch:
+                task = self._start_fetch(loop, network, to_fetch)
+                waiting.update((address, task) for address in to_fetch)
+            if to_refresh:
+                self._refreshes.add(self._start_fetch(loop, network, to_refresh))
+
+        for address, task in waiting.items():
+            # Shielded, so a caller giving up does not cancel the request others are waiting for
+            balances[address] = (await asyncio.shield(task))[address]
+        return balances
+
+    def _start_fetch(self, loop: asyncio.AbstractEventLoop, network: str, addresses: List[str]) -> asyncio.Task:
+        # Called with the lock held
+        task = loop.create_task(self._load(network, addresses))
+        for address in addresses:
+            self._in_flight[(network, address)] = task
+        task.add_done_callback(lambda finished: self._finish_fetch(network, addresses, finished))
+        return task
+
+    async def _load(self, network: str, addresses: List[str]) -> Dict[str, float]:
+        fetched = await self._fetch(network, addresses)
+        fetched_at = time.monotonic()
+        with self._lock:
+            for address, balance in fetched.items():
+                key = (network, address)
+                self._entries[key] = (balance, fetched_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fetched
+
+    def _finish_fetch(self, network: str, addresses: List[str], task: asyncio.Task) -> None:
+        with self._lock:
+            for address in addresses:
+                key = (network, address)
+                if self._in_flight.get(key) is task:
+                    del self._in_flight[key]
+            self._refreshes.discard(task)
+            # Retrieving the exception here also keeps asyncio from warning when nobody awaited it
+            if not task.cancelled() and task.exception() is not None:
+                self._stats['fetch_errors'] += 1
+                logger.warning(f"Fetching {len(addresses)} {network} balances failed: {task.exception()}")
+
+    def invalidate(self, network: str, address: str) -> None:
+        """
+        Drop the cached balance of an address, e.g. after a transfer from it.
+        """
+        with self._lock:
+            self._entries.pop((network, address), None)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: Lookup counters and the number of cached balances
+        """
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries)}
+
+
+_balance_cache: Optional[BalanceCache] = None
+_balance_cache_lock = threading.Lock()
+
+
+def get_balance_cache() -> BalanceCache:
+    """
+    Return the process-wide balance cache, creating it on first use.
+
+    :return: Shared BalanceCache instance
+    """
+    global _balance_cache
+    if _balance_cache is None:
+        with _balance_cache_lock:
+            if _balance_cache is None:
+                _balance_cache = BalanceCache()
+    return _balance_cache
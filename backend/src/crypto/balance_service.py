@@ -0,0 +1,260 @@
+import os
+import asyncio
+import logging
+import itertools
+import threading
+import weakref
+
+import aiohttp
+from web3 import Web3
+from dotenv import load_dotenv
+from solders.pubkey import Pubkey
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.crypto.crypto_exceptions import SolanaBalanceCheckError, EthereumBalanceCheckError, BalanceRpcError
+
+load_dotenv()
+INFURA_KEY = os.getenv('INFURA_KEY')
+SOLANA_RPC = os.getenv('SOLANA_RPC')
+ETHEREUM_MAINNET_RPC = os.getenv('ETHEREUM_MAINNET_RPC')
+ETHEREUM_ARBITRUM_RPC = os.getenv('ETHEREUM_ARBITRUM_RPC')
+ETHEREUM_OPTIMISM_RPC = os.getenv('ETHEREUM_OPTIMISM_RPC')
+# Addresses per JSON-RPC request, Solana's getMultipleAccounts takes at most 100
+BALANCE_RPC_BATCH_SIZE = int(os.getenv('BALANCE_RPC_BATCH_SIZE', 100))
+BALANCE_RPC_CONCURRENCY = int(os.getenv('BALANCE_RPC_CONCURRENCY', 8))
+BALANCE_RPC_TIMEOUT = float(os.getenv('BALANCE_RPC_TIMEOUT', 15))
+
+SOLANA = 'solana'
+ETHEREUM_NETWORKS = ('mainnet', 'arbitrum', 'optimism')
+SOLANA_MAX_ACCOUNTS = 100
+LAMPORTS_PER_SOL = 10 ** 9
+
+logger = logging.getLogger(__name__)
+
+
+def rpc_url(network: str) -> str:
+    """
+    :param network: 'solana' or one of ETHEREUM_NETWORKS
+    :return: RPC endpoint of the network
+    :raises SolanaBalanceCheckError: If no Solana endpoint is configured
+    :raises EthereumBalanceCheckError: If the network is not supported
+    """
+    if network == SOLANA:
+        if not SOLANA_RPC:
+            raise SolanaBalanceCheckError("SOLANA_RPC is not set")
+        return SOLANA_RPC
+
+    base_urls = {
+        'mainnet': ETHEREUM_MAINNET_RPC,
+        'arbitrum': ETHEREUM_ARBITRUM_RPC,
+        'optimism': ETHEREUM_OPTIMISM_RPC,
+    }
+    if network not in base_urls:
+        raise EthereumBalanceCheckError("Network is not supported")
+    return f"{base_urls[network]}{INFURA_KEY}"
+
+
+class JsonRpcClient:
+    """
+    JSON-RPC client for one endpoint that sends many calls in a single batch request.
+
+    Requests go over a shared aiohttp session, so connections are kept alive between them, and
+    at most `concurrency` requests to the endpoint are in flight at once.
+    """
+
+    def __init__(self, url: str, session: aiohttp.ClientSession, concurrency: int = BALANCE_RPC_CONCURRENCY):
+        """
+        :param url: Endpoint URL
+        :param session: HTTP session the requests are sent with
+        :param concurrency: Maximum number of requests in flight
+        """
+        self.url = url
+        self._session = session
+        self._semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self._ids = itertools.count(1)
+
+    async def batch(self, calls: Sequence[Tuple[str, List[Any]]]) -> List[Any]:
+        """
+        Send calls as one batch request.
+
+        :param calls: (method, params) pairs
+        :return: Result of each call, in the order of calls
+        :raises BalanceRpcError: If the request or any of the calls failed
+        """
+        if not calls:
+            return []
+
+        ids = [next(self._ids) for _ in calls]
+        payload = [{'jsonrpc': '2.0', 'id': call_id, 'method': method, 'params': params}
+                   for call_id, (method, params) in zip(ids, calls)]
+        try:
+            async with self._semaphore:
+                async with self._session.post(self.url, json=payload) as response:
+                    response.raise_for_status()
+                    replies = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise BalanceRpcError(f"Request to {self.url} failed: {e}") from e
+
+        # A rejected batch is answered with a single error object instead of a list
+        if not isinstance(replies, list):
+            raise BalanceRpcError(f"Batch rejected: {replies.get('error') if isinstance(replies, dict) else replies}")
+
+        # Replies may come back in any order
+        replies_by_id = {reply.get('id'): reply for reply in replies}
+        results = []
+        for call_id, (method, params) in zip(ids, calls):
+            reply = replies_by_id.get(call_id)
+            if reply is None or 'error' in reply:
+                raise BalanceRpcError(f"{method} failed: {reply.get('error') if reply else 'no reply'}")
+            results.append(reply.get('result'))
+        return results
+
+    async def call(self, method: str, params: List[Any]) -> Any:
+        """
+        Send a single call.
+
+        :raises BalanceRpcError: If the call failed
+        """
+        return (await self.batch([(method, params)]))[0]
+
+
+class BalanceService:
+    """
+    Looks up wallet balances in bulk, with one JSON-RPC client per network.
+
+    The clients share one HTTP session, so it must be used from the event loop it was created on,
+    see get_balance_service.
+    """
+
+    def __init__(self, batch_size: int = BALANCE_RPC_BATCH_SIZE, concurrency: int = BALANCE_RPC_CONCURRENCY,
+                 timeout: float = BALANCE_RPC_TIMEOUT, session: Optional[aiohttp.ClientSession] = None):
+        """
+        :param batch_size: Addresses per request
+        :param concurrency: Maximum number of requests in flight per network
+        :param timeout: Seconds a request may take
+        :param session: HTTP session to use, created on first use if not given
+        """
+        self.batch_size = max(batch_size, 1)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._session = session
+        self._clients: Dict[str, JsonRpcClient] = {}
+
+    def client(self, network: str) -> JsonRpcClient:
+        """
+        Return the client of a network, creating it on first use.
+
+        :raises SolanaBalanceCheckError: If no Solana endpoint is configured
+        :raises EthereumBalanceCheckError: If the network is not supported
+        """
+        client = self._clients.get(network)
+        if client is None:
+            url = rpc_url(network)
+            if self._session is None:
+                self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+            client = self._clients[network] = JsonRpcClient(url, self._session, self.concurrency)
+        return client
+
+    async def get_balances(self, network: str, addresses: Iterable[str]) -> Dict[str, float]:
+        """
+        Look up the balances of many wallets on one network.
+
+        Addresses are split into batches of batch_size, and the batches are requested concurrently.
+
+        :param network: 'solana' or one of ETHEREUM_NETWORKS
+        :param addresses: Wallet addresses
+        :return: Balance in SOL or ETH per address
+        :raises ValueError: If an address is invalid
+        :raises SolanaBalanceCheckError: If the Solana lookup failed
+        :raises EthereumBalanceCheckError: If the network is not supported or the Ethereum lookup failed
+        """
+        unique_addresses = list(dict.fromkeys(addresses))
+        if not unique_addresses:
+            return {}
+        if network == SOLANA:
+            return await self._solana_balances(unique_addresses)
+        return await self._ethereum_balances(network, unique_addresses)
+
+    def _chunks(self, items: List[str], size: int) -> List[List[str]]:
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    async def _ethereum_balances(self, network: str, addresses: List[str]) -> Dict[str, float]:
+        client = self.client(network)
+        for address in addresses:
+            if not Web3.is_address(address):
+                raise ValueError(f"Invalid Ethereum address: {address}")
+
+        chunks = self._chunks(addresses, self.batch_size)
+        try:
+            results = await asyncio.gather(*(
+                client.batch([('eth_getBalance', [Web3.to_checksum_address(address), 'latest']) for address in chunk])
+                for chunk in chunks))
+        except BalanceRpcError as e:
+            raise EthereumBalanceCheckError(f"Failed to retrieve {network} balances: {e}") from e
+
+        balances = {}
+        for chunk, chunk_results in zip(chunks, results):
+            for address, balance_wei in zip(chunk, chunk_results):
+                balances[address] = float(Web3.from_wei(int(balance_wei, 16), 'ether'))
+        return balances
+
+    async def _solana_balances(self, addresses: List[str]) -> Dict[str, float]:
+        client = self.client(SOLANA)
+        for address in addresses:
+            Pubkey.from_string(address)
+
+        # Only the lamports are needed, so no account data is transferred
+        options = {'encoding': 'base64', 'dataSlice': {'offset': 0, 'length': 0}}
+        chunks = self._chunks(addresses, min(self.batch_size, SOLANA_MAX_ACCOUNTS))
+        try:
+            results = await asyncio.gather(*(client.call('getMultipleAccounts', [chunk, options])
+                                             for chunk in chunks))
+        except BalanceRpcError as e:
+            raise SolanaBalanceCheckError(f"Failed to retrieve Solana balances: {e}") from e
+
+        balances = {}
+        for chunk, result in zip(chunks, results):
+            # Accounts that were never funded do not exist and come back as null
+            for address, account in zip(chunk, result['value']):
+                balances[address] = (account['lamports'] if account else 0) / LAMPORTS_PER_SOL
+        return balances
+
+    async def close(self) -> None:
+        """
+        Close the HTTP session and its connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+        self._session = None
+        self._clients.clear()
+
+
+# aiohttp sessions belong to the event loop they were created on, so every loop gets its own service
+_services: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, BalanceService]' = weakref.WeakKeyDictionary()
+_services_lock = threading.Lock()
+
+
+def get_balance_service() -> BalanceService:
+    """
+    Return the balance service of the running event loop, creating it on first use.
+
+    :return: Shared BalanceService instance
+    """
+    loop = asyncio.get_running_loop()
+    service = _services.get(loop)
+    if service is None:
+        with _services_lock:
+            service = _services.get(loop)
+            if service is None:
+                service = _services[loop] = BalanceService()
+    return service
+
+
+async def close_balance_service() -> None:
+    """
+    Close the balance service of the running event loop, if it has one.
+    """
+    with _services_lock:
+        service = _services.pop(asyncio.get_running_loop(), None)
+    if service is not None:
+        await service.close()
@@ -1,31 +1,31 @@
-import os
 import asyncio
 import logging
 
-from web3 import Web3
-from dotenv import load_dotenv
-from solders.pubkey import Pubkey
-from solana.rpc.async_api import AsyncClient
+from typing import Dict, Iterable
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-logger = logging.getLogger(__name__)
-load_dotenv()
+from src.crypto.balance_cache import get_balance_cache
+from src.crypto.balance_service import close_balance_service, SOLANA
+from src.crypto.crypto_exceptions import SolanaBalanceCheckError, EthereumBalanceCheckError
 
-INFURA_KEY = os.getenv('INFURA_KEY')
-SOLANA_RPC = os.getenv('SOLANA_RPC')
-ETHEREUM_MAINNET_RPC = os.getenv('ETHEREUM_MAINNET_RPC')
-ETHEREUM_ARBITRUM_RPC = os.getenv('ETHEREUM_ARBITRUM_RPC')
-ETHEREUM_OPTIMISM_RPC = os.getenv('ETHEREUM_OPTIMISM_RPC')
+logger = logging.getLogger(__name__)
 
 
-class SolanaBalanceCheckError(Exception):
-    """Custom exception for Solana balance check errors"""
-    pass
+async def check_balances(network: str, addresses: Iterable[str]) -> Dict[str, float]:
+    """
+    Check the balances of many wallets on one network.
 
+    Balances checked within the last BALANCE_CACHE_TTL seconds come from the cache, the rest are
+    requested in batches, see BalanceCache.
 
-class EthereumBalanceCheckError(Exception):
-    """Custom exception for Ethereum balance check errors"""
-    pass
+    :param network: 'solana', 'mainnet', 'arbitrum' or 'optimism'
+    :param addresses: Wallet addresses
+    :return: Balance in SOL or ETH per address
+    :raises ValueError: If an address is invalid
+    :raises SolanaBalanceCheckError: If there's an error checking Solana balances
+    :raises EthereumBalanceCheckError: If the network is not supported or there's an error checking Ethereum balances
+    """
+    return await get_balance_cache().get_balances(network, addresses)
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
@@ -39,17 +39,8 @@ async def check_solana_balance(public_key_str: str) -> float:
     :raises SolanaBalanceCheckError: If there's an error checking the balance
     """
     try:
-        public_key = Pubkey.from_string(public_key_str)
-        async with AsyncClient(SOLANA_RPC) as client:
-            if not await client.is_connected():
-                raise SolanaBalanceCheckError("Failed to connect to Solana network")
-
-            balance_response = await client.get_balance(public_key)
-            if balance_response.value is None:
-                raise SolanaBalanceCheckError("Failed to retrieve balance")
-
-            balance_sol = balance_response.value / 1e9
-            return balance_sol
+        balances = await check_balances(SOLANA, [public_key_str])
+        return balances[public_key_str]
 
     except ValueError as ve:
         logger.error(f"Invalid Solana public key: {ve}")
@@ -72,33 +63,9 @@ async def check_ethereum_balance(address: str, network: str = "mainnet") -> floa
     :raises ValueError: If the address is invalid
     :raises EthereumBalanceCheckError: If there's an error checking the balance
     """
-
-    if network == 'mainnet':
-        infura_url = ETHEREUM_MAINNET_RPC + INFURA_KEY
-        w3 = Web3(Web3.HTTPProvider(infura_url))
-
-    elif network == 'arbitrum':
-        infura_url = ETHEREUM_ARBITRUM_RPC + INFURA_KEY
-        w3 = Web3(Web3.HTTPProvider(infura_url))
-
-    elif network == 'optimism':
-        infura_url = ETHEREUM_OPTIMISM_RPC + INFURA_KEY
-        w3 = Web3(Web3.HTTPProvider(infura_url))
-
-    else:
-        raise EthereumBalanceCheckError("Network is not supported")
-
     try:
-        if not w3.is_connected():
-            raise EthereumBalanceCheckError("Failed to connect to Ethereum network")
-
-        if not w3.is_address(address):
-            raise ValueError("Invalid Ethereum address")
-
-        checksum_address = w3.to_checksum_address(address)
-        balance_wei = w3.eth.get_balance(checksum_address)
-        balance_eth = w3.from_wei(balance_wei, 'ether')
-        return float(balance_eth)
+        balances = await check_balances(network, [address])
+        return balances[address]
 
     except ValueError as ve:
         logger.error(f"Invalid Ethereum address: {ve}")
@@ -121,6 +88,8 @@ async def main():
     sol_balance = await check_solana_balance(sol_address)
     print(f"The balance of the Solana wallet {sol_address} is: {sol_balance} SOL")
 
+    await close_balance_service()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
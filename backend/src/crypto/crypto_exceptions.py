@@ -0,0 +1,18 @@
+class SolanaBalanceCheckError(Exception):
+    """Custom exception for Solana balance check errors"""
+    pass
+
+
+class EthereumBalanceCheckError(Exception):
+    """Custom exception for Ethereum balance check errors"""
+    pass
+
+
+class BalanceRpcError(Exception):
+    """Custom exception for failed JSON-RPC requests to a balance provider"""
+    pass
+
+
+class PasswordHasherBusyError(Exception):
+    """Custom exception for password hashes rejected because too many are pending"""
+    pass
@@ -0,0 +1,178 @@
+import os
+import time
+import bcrypt
+import logging
+import threading
+import multiprocessing
+
+from dotenv import load_dotenv
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+from src.crypto.crypto_exceptions import PasswordHasherBusyError
+
+# Password hashing pool configuration
+load_dotenv()
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+# bcrypt cost factor of new hashes, existing hashes are verified with the cost they were made with
+PASSWORD_HASH_ROUNDS = int(os.getenv('PASSWORD_HASH_ROUNDS', 12))
+# Hashes queued or running at once, further requests are rejected instead of waiting
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', PASSWORD_HASH_WORKERS * 4))
+# Workers are started from a clean server process rather than forked from the threaded web server
+PASSWORD_HASH_START_METHOD = os.getenv('PASSWORD_HASH_START_METHOD', 'forkserver')
+logger = logging.getLogger(__name__)
+
+
+def _hashpw(password: bytes, salt: bytes) -> bytes:
+    return bcrypt.hashpw(password, salt)
+
+
+def _checkpw(password: bytes, hashed_password: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a process pool, off the request threads.
+
+    At most max_pending operations are queued or running. Beyond that, operations are rejected
+    with PasswordHasherBusyError instead of piling up behind each other, so a login storm cannot
+    tie up every request thread.
+    """
+
+    def __init__(self, max_workers: int = PASSWORD_HASH_WORKERS, rounds: int = PASSWORD_HASH_ROUNDS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING, start_method: str = PASSWORD_HASH_START_METHOD):
+        """
+        :param max_workers: Number of worker processes
+        :param rounds: bcrypt cost factor of new hashes
+        :param max_pending: Maximum number of operations queued or running at once
+        :param start_method: multiprocessing start method of the workers
+        """
+        self.max_workers = max(max_workers, 1)
+        self.rounds = rounds
+        self.max_pending = max(max_pending, 1)
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._metrics: Dict[str, float] = {
+            'submitted': 0,
+            'completed': 0,
+            'rejected': 0,
+            'max_pending_seen': 0,
+            'total_time': 0.0,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Called with the lock held
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context(self.start_method))
+            logger.info(f"Started password hashing pool with {self.max_workers} workers")
+        return self._executor
+
+    def _run(self, func, *args) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._metrics['rejected'] += 1
+                raise PasswordHasherBusyError(f"{self._pending} password hashes are already pending")
+            self._pending += 1
+            self._metrics['submitted'] += 1
+            self._metrics['max_pending_seen'] = max(self._metrics['max_pending_seen'], self._pending)
+            started_at = time.monotonic()
+            try:
+                executor = self._get_executor()
+                future: Future = executor.submit(func, *args)
+            except Exception:
+                self._pending -= 1
+                raise
+
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # A worker died, the pool cannot be used anymore and is replaced on the next call
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            logger.error("Password hashing pool broke, restarting it")
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._metrics['completed'] += 1
+                self._metrics['total_time'] += time.monotonic() - started_at
+
+    def hash_password(self, password: str) -> Tuple[str, str]:
+        """
+        Hash a password with a new salt.
+
+        :param password: Plain text password
+        :return: Tuple of (hash, salt)
+        :raises PasswordHasherBusyError: If too many operations are pending
+        """
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        hashed_password = self._run(_hashpw, password.encode('utf-8'), salt)
+        return hashed_password.decode('utf-8'), salt.decode('utf-8')
+
+    def check_password(self, password: str, hashed_password: str) -> bool:
+        """
+        Check a password against a stored hash.
+
+        :param password: Plain text password
+        :param hashed_password: Hash made by hash_password
+        :return: True if the password matches
+        :raises PasswordHasherBusyError: If too many operations are pending
+        """
+        return self._run(_checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of the pool counters and queue depth.
+
+        :return: Dictionary of hasher metrics, times in seconds
+        """
+        with self._lock:
+            snapshot: Dict[str, Any] = dict(self._metrics)
+            snapshot['pending'] = self._pending
+        snapshot['workers'] = self.max_workers
+        snapshot['max_pending'] = self.max_pending
+        completed = snapshot['completed']
+        snapshot['avg_time'] = snapshot['total_time'] / completed if completed else 0.0
+        return snapshot
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, operations still running are finished first."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_password_hasher: Optional[PasswordHasher] = None
+_password_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """
+    Return the process-wide password hasher, creating it on first use.
+
+    :return: Shared PasswordHasher instance
+    """
+    global _password_hasher
+    if _password_hasher is None:
+        with _password_hasher_lock:
+            if _password_hasher is None:
+                _password_hasher = PasswordHasher()
+    return _password_hasher
+
+
+def shutdown_password_hasher() -> None:
+    """
+    Stop the worker processes of the process-wide password hasher, if it was created.
+    """
+    global _password_hasher
+    with _password_hasher_lock:
+        hasher, _password_hasher = _password_hasher, None
+    if hasher is not None:
+        hasher.shutdown()
@@ -0,0 +1,296 @@
+import os
+import time
+import pyodbc
+import logging
+import threading
+
+from dotenv import load_dotenv
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+
+from src.database.database_exceptions import DatabaseConnectionError, ConnectionPoolTimeoutError
+
+# Pool configuration
+load_dotenv()
+DB_CONNECTION_STRING = os.getenv('MSSQL_CONNECTION_STRING')
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 1800))
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', 30))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', 5))
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """A pyodbc connection together with the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, connection: pyodbc.Connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+    def idle_time(self) -> float:
+        return time.monotonic() - self.last_used_at
+
+    def close(self) -> None:
+        try:
+            self.connection.close()
+        except pyodbc.Error as e:
+            logger.warning(f"Error while closing pooled connection: {e}")
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MSSQL connections.
+
+    Connections are validated on checkout, recycled once they exceed ``max_lifetime`` and
+    handed out in LIFO order so that the warmest connections are reused first.
+    """
+
+    def __init__(self, connection_string: str, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 max_lifetime: float = DB_POOL_MAX_LIFETIME, checkout_timeout: float = DB_POOL_CHECKOUT_TIMEOUT,
+                 health_check_after: float = DB_POOL_HEALTH_CHECK_AFTER):
+        """
+        :param connection_string: ODBC connection string
+        :param min_size: Number of connections opened on first use and kept warm
+        :param max_size: Maximum number of open connections
+        :param max_lifetime: Seconds after which a connection is closed and replaced
+        :param checkout_timeout: Seconds to wait for a free connection before giving up
+        :param health_check_after: Connections idle for longer than this are validated before being handed out
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size configuration: min={min_size}, max={max_size}")
+
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+
+        # Guards the idle list and the size counter. Waiters are notified whenever a connection is
+        # returned or capacity frees up because one was discarded.
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle: List[PooledConnection] = []
+        self._size = 0
+        self._warmed_up = False
+        self._closed = False
+        self._metrics: Dict[str, float] = {
+            'checkouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'failed_health_checks': 0,
+            'checkout_timeouts': 0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'total_hold_time': 0.0,
+            'max_hold_time': 0.0,
+        }
+
+    def _open(self) -> PooledConnection:
+        try:
+            connection = pyodbc.connect(self.connection_string)
+        except pyodbc.Error as e:
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            logger.error(f"Failed to open database connection: {e}")
+            raise DatabaseConnectionError(f"Failed to open database connection: {str(e)}") from e
+
+        with self._lock:
+            self._metrics['connections_created'] += 1
+        return PooledConnection(connection)
+
+    def _discard(self, pooled: PooledConnection) -> None:
+        pooled.close()
+        with self._available:
+            self._size -= 1
+            self._metrics['connections_recycled'] += 1
+            self._available.notify()
+
+    def _is_healthy(self, pooled: PooledConnection) -> bool:
+        if pooled.idle_time() < self.health_check_after:
+            return True
+        try:
+            with pooled.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            return True
+        except pyodbc.Error as e:
+            logger.warning(f"Pooled connection failed health check: {e}")
+            with self._lock:
+                self._metrics['failed_health_checks'] += 1
+            return False
+
+    def _warm_up(self) -> None:
+        with self._lock:
+            if self._warmed_up:
+                return
+            self._warmed_up = True
+            missing = max(self.min_size - self._size, 0)
+            self._size += missing
+
+        for _ in range(missing):
+            try:
+                self._put_idle(self._open())
+            except DatabaseConnectionError:
+                # Warm-up is best effort, checkouts will retry opening connections on demand
+                pass
+
+    def acquire(self) -> PooledConnection:
+        """
+        Check out a healthy connection from the pool, opening a new one if there is capacity.
+
+        :return: Pooled connection wrapper
+        :raises ConnectionPoolTimeoutError: If no connection became available within checkout_timeout
+        :raises DatabaseConnectionError: If a new connection could not be opened
+        """
+        if self._closed:
+            raise DatabaseConnectionError("Connection pool is closed")
+
+        self._warm_up()
+        deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            pooled = self._checkout(deadline)
+            if pooled is None:
+                return self._open()
+            if pooled.age() >= self.max_lifetime or not self._is_healthy(pooled):
+                self._discard(pooled)
+                continue
+            return pooled
+
+    def _checkout(self, deadline: float) -> Optional[PooledConnection]:
+        # Returns an idle connection, or None after reserving capacity for a new one
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics['checkout_timeouts'] += 1
+                    break
+                self._available.wait(remaining)
+
+        logger.error(f"Timed out after {self.checkout_timeout}s waiting for a database connection")
+        raise ConnectionPoolTimeoutError(
+            f"No database connection available within {self.checkout_timeout} seconds")
+
+    def _put_idle(self, pooled: PooledConnection) -> None:
+        with self._available:
+            self._idle.append(pooled)
+            self._available.notify()
+
+    def release(self, pooled: PooledConnection, discard: bool = False) -> None:
+        """
+        Return a connection to the pool.
+
+        :param pooled: Connection previously obtained from acquire()
+        :param discard: Close the connection instead of reusing it
+        """
+        if discard or self._closed or pooled.age() >= self.max_lifetime:
+            self._discard(pooled)
+            return
+        pooled.last_used_at = time.monotonic()
+        self._put_idle(pooled)
+
+    @contextmanager
+    def connection(self) -> Iterator[pyodbc.Connection]:
+        """
+        Context manager handing out a pooled connection.
+
+        Mirrors ``with pyodbc.connect(...) as conn``: the transaction is committed when the block
+        exits normally and rolled back when it raises. The connection is returned to the pool afterwards.
+        """
+        wait_start = time.perf_counter()
+        pooled = self.acquire()
+        wait_time = time.perf_counter() - wait_start
+        hold_start = time.perf_counter()
+        broken = False
+
+        try:
+            yield pooled.connection
+            pooled.connection.commit()
+        except Exception:
+            try:
+                pooled.connection.rollback()
+            except pyodbc.Error as e:
+                logger.warning(f"Rollback failed, discarding connection: {e}")
+                broken = True
+            raise
+        finally:
+            hold_time = time.perf_counter() - hold_start
+            self._record_checkout(wait_time, hold_time)
+            self.release(pooled, discard=broken)
+
+    def _record_checkout(self, wait_time: float, hold_time: float) -> None:
+        with self._lock:
+            self._metrics['checkouts'] += 1
+            self._metrics['total_wait_time'] += wait_time
+            self._metrics['max_wait_time'] = max(self._metrics['max_wait_time'], wait_time)
+            self._metrics['total_hold_time'] += hold_time
+            self._metrics['max_hold_time'] = max(self._metrics['max_hold_time'], hold_time)
+        logger.debug(f"Database checkout: waited {wait_time * 1000:.2f}ms, held {hold_time * 1000:.2f}ms")
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of the pool counters and checkout timings.
+
+        :return: Dictionary of pool metrics, times in seconds
+        """
+        with self._lock:
+            snapshot: Dict[str, Any] = dict(self._metrics)
+            snapshot['size'] = self._size
+            snapshot['idle'] = len(self._idle)
+        snapshot['in_use'] = snapshot['size'] - snapshot['idle']
+        checkouts = snapshot['checkouts']
+        snapshot['avg_wait_time'] = snapshot['total_wait_time'] / checkouts if checkouts else 0.0
+        snapshot['avg_hold_time'] = snapshot['total_hold_time'] / checkouts if checkouts else 0.0
+        return snapshot
+
+    def close(self) -> None:
+        """Close all idle connections. Connections still checked out are closed when released."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._discard(pooled)
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    :return: Shared ConnectionPool instance
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONNECTION_STRING)
+    return _pool
+
+
+def get_connection():
+    """
+    Check out a connection from the shared pool.
+
+    Usage: ``with get_connection() as conn: ...``
+    """
+    return get_pool().connection()
+
+
+def get_pool_metrics() -> Dict[str, Any]:
+    return get_pool().metrics()
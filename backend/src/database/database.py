@@ -1,32 +1,70 @@
 import os
-import bcrypt
+import json
+import uuid
 import pyodbc
 import string
 import secrets
 import logging
 import smtplib
+import threading
 
 from dotenv import load_dotenv
-from typing import List, Dict, Tuple, Optional
+from collections import OrderedDict
+from typing import List, Dict, Iterable, Tuple, Optional, Sequence
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from cryptography.fernet import Fernet, InvalidToken
 from datetime import datetime
 
+from src.database.connection_pool import get_connection
+from src.database.query_cache import get_user_projects_cache
+from src.crypto.password_hasher import get_password_hasher
+from src.crypto.crypto_exceptions import PasswordHasherBusyError
 from src.database.database_exceptions import (
     UserRegistrationError, UserProjectCreationError, WalletKeySaveError, InstanceIPUpdateError,
     PasswordGenerationError, PasswordSaveError, DatabaseFetchError, EmailVerificationError, DecryptionError,
-    VPSDataFetchError, UserLoginError, PasswordResetCompletionError, PasswordResetInitiationError
+    VPSDataFetchError, UserLoginError, PasswordResetCompletionError, PasswordResetInitiationError, JobPersistenceError,
+    ProvisioningQueueError
 )
 
-# Database connection string
 load_dotenv()
-DB_CONNECTION_STRING = os.getenv('MSSQL_CONNECTION_STRING')
 MAIL_ADDRESS = os.getenv("MAIL_ADDRESS")
 MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
 BASE_URL = os.getenv('BASE_URL')
+FERNET_KEY_CACHE_SIZE = int(os.getenv('FERNET_KEY_CACHE_SIZE', 1024))
+USER_PROJECTS_PAGE_SIZE = int(os.getenv('USER_PROJECTS_PAGE_SIZE', 50))
+USER_PROJECTS_MAX_PAGE_SIZE = int(os.getenv('USER_PROJECTS_MAX_PAGE_SIZE', 500))
 logger = logging.getLogger(__name__)
 
+# Fernet keys per user project, filled whenever a key is written or read
+_fernet_key_cache: "OrderedDict[int, str]" = OrderedDict()
+_fernet_key_cache_lock = threading.Lock()
+
+# Fields selectable in fetch_user_projects_page: field -> (column, alias of the table it needs joined)
+# Key material is deliberately not selectable
+USER_PROJECT_FIELDS: Dict[str, Tuple[str, Optional[str]]] = {
+    'id': ('UP.UserProject_IdKey', None),
+    'project_id': ('UP.UserProject_ProjectIdKey', None),
+    'instance_id': ('UP.UserProject_InstanceId', None),
+    'version': ('UP.UserProject_Version', None),
+    'network': ('UP.UserProject_Network', None),
+    'creation_date': ('UP.UserProject_CreationDate', None),
+    'last_modified_date': ('UP.UserProject_LastModifiedDate', None),
+    'project_name': ('P.Project_Name', 'P'),
+    'ip_address': ('UK.UserKey_IPAddress', 'UK'),
+}
+# Provisioning states of a user project, rows without a state are not provisioned by the batch process
+PROVISIONING_PENDING = 'pending'
+PROVISIONING_RUNNING = 'running'
+PROVISIONING_CONFIGURED = 'configured'
+PROVISIONING_FAILED = 'failed'
+PROVISIONING_STATES = (PROVISIONING_PENDING, PROVISIONING_RUNNING, PROVISIONING_CONFIGURED, PROVISIONING_FAILED)
+
+USER_PROJECT_JOINS = {
+    'P': "JOIN Projectdata P ON UP.UserProject_ProjectIdKey = P.Project_IdKey",
+    'UK': "LEFT JOIN UserKeys UK ON UP.UserProject_IdKey = UK.UserKey_UserProjectIdKey",
+}
+
 
 def register_user(username: str, email: str, password: str) -> Tuple[int, str, None] | Tuple[None, None, str]:
     """
@@ -36,18 +74,18 @@ def register_user(username: str, email: str, password: str) -> Tuple[int, str, N
     :param email: Email address for the new user
     :param password: Password for the new user
     :return: Tuple of (user_id, None) if successful, or (None, error_message) if failed
+    :raises PasswordHasherBusyError: If too many password hashes are pending
     :raises UserRegistrationError: If there's an error during user registration
     """
     try:
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
+        # Hashed before taking a connection, so none is held while the hash is computed
+        hashed_password, salt = get_password_hasher().hash_password(password)
         verification_token = secrets.token_urlsafe(32)
 
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("{CALL sp_RegisterUser(?,?,?,?,?)}",
-                               (username, email, hashed_password.decode('utf-8'), salt.decode('utf-8'),
-                                verification_token))
+                               (username, email, hashed_password, salt, verification_token))
                 user_id = cursor.fetchval()
                 conn.commit()
 
@@ -57,6 +95,8 @@ def register_user(username: str, email: str, password: str) -> Tuple[int, str, N
                 else:
                     raise UserRegistrationError("Failed to retrieve user ID after registration")
 
+    except PasswordHasherBusyError:
+        raise
     except pyodbc.IntegrityError as e:
         if "50001" in str(e):
             logger.warning(f"Registration failed: Username '{username}' already exists")
@@ -75,18 +115,20 @@ def register_user(username: str, email: str, password: str) -> Tuple[int, str, N
         raise UserRegistrationError(f"Unexpected error: {str(e)}") from e
 
 
-def create_user_project(user_id: int, project_id: int, instance_id: str) -> Optional[int]:
+def create_user_project(user_id: int, project_id: int, instance_id: str,
+                        provisioning_state: Optional[str] = None) -> Optional[int]:
     """
     Create a new user project in the database.
 
     :param user_id: ID of the user
     :param project_id: ID of the project
     :param instance_id: ID of the instance
+    :param provisioning_state: PROVISIONING_PENDING to queue the instance for the batch process
     :return: ID of the created user project, or None if creation failed
     :raises UserProjectCreationError: If there's an error during user project creation
     """
     try:
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 # Insert into User_Projects, including the network information
                 cursor.execute("""
@@ -95,7 +137,8 @@ def create_user_project(user_id: int, project_id: int, instance_id: str) -> Opti
                     UserProject_ProjectIdKey, 
                     UserProject_InstanceId, 
                     UserProject_Version,
-                    UserProject_Network
+                    UserProject_Network,
+                    UserProject_ProvisioningState
                 )
                 OUTPUT INSERTED.UserProject_IdKey
                 SELECT 
@@ -103,10 +146,11 @@ def create_user_project(user_id: int, project_id: int, instance_id: str) -> Opti
                     ?, 
                     ?, 
                     Project_Version,
-                    Project_Network
+                    Project_Network,
+                    ?
                 FROM Projectdata
                 WHERE Project_IdKey = ?
-                """, (user_id, project_id, instance_id, project_id))
+                """, (user_id, project_id, instance_id, provisioning_state, project_id))
                 user_project_id = cursor.fetchval()
 
                 if user_project_id is None:
@@ -119,6 +163,7 @@ def create_user_project(user_id: int, project_id: int, instance_id: str) -> Opti
                 """, (user_project_id,))
 
                 conn.commit()
+                get_user_projects_cache().invalidate(user_id)
                 logger.info(f"User project created successfully with ID: {user_project_id}")
                 return user_project_id
 
@@ -144,7 +189,7 @@ def _create_user_project(user_id: int, project_id: int, instance_id: int) -> Opt
     :raises UserProjectCreationError: If there's an error during user project creation
     """
     try:
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 # Insert into User_Projects, including the network information
                 cursor.execute("""
@@ -191,10 +236,37 @@ def _create_user_project(user_id: int, project_id: int, instance_id: int) -> Opt
         raise UserProjectCreationError(f"Unexpected error: {str(e)}") from e
 
 
+def _get_cached_fernet_key(user_project_id: int) -> Optional[str]:
+    with _fernet_key_cache_lock:
+        fernet_key = _fernet_key_cache.get(user_project_id)
+        if fernet_key is not None:
+            _fernet_key_cache.move_to_end(user_project_id)
+        return fernet_key
+
+
+def _cache_fernet_key(user_project_id: int, fernet_key: str | bytes) -> None:
+    if isinstance(fernet_key, bytes):
+        fernet_key = fernet_key.decode('utf-8')
+    with _fernet_key_cache_lock:
+        _fernet_key_cache[user_project_id] = fernet_key
+        _fernet_key_cache.move_to_end(user_project_id)
+        while len(_fernet_key_cache) > FERNET_KEY_CACHE_SIZE:
+            _fernet_key_cache.popitem(last=False)
+
+
+def _invalidate_fernet_key(user_project_id: int) -> None:
+    with _fernet_key_cache_lock:
+        _fernet_key_cache.pop(user_project_id, None)
+
+
 def save_wallet_keys(user_project_id: int, pub_key: str, priv_key: str) -> bool:
     """
     Save encrypted wallet keys for a user project.
 
+    Runs as one transaction on one connection. With a cached Fernet key this is a single UPDATE
+    guarded on the stored key, otherwise the key is read under an update lock and written in the
+    same transaction.
+
     :param user_project_id: ID of the user project
     :param pub_key: Public key of the wallet
     :param priv_key: Private key of the wallet
@@ -202,32 +274,53 @@ def save_wallet_keys(user_project_id: int, pub_key: str, priv_key: str) -> bool:
     :raises WalletKeySaveError: If there's an error during the key saving process
     """
     try:
-        # Retrieve the stored Fernet key
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT UserKey_IV FROM UserKeys WHERE UserKey_UserProjectIdKey = ?", user_project_id)
-                row = cursor.fetchone()
-                if not row or row.UserKey_IV is None:
-                    raise WalletKeySaveError("No Fernet key found for this user project")
-                fernet_key = row.UserKey_IV
-
-        # Create Fernet instance
-        fernet = Fernet(fernet_key)
-
-        # Encrypt the wallet keys
-        encrypted_pub_key = fernet.encrypt(pub_key.encode())
-        encrypted_priv_key = fernet.encrypt(priv_key.encode())
-
-        # Update the UserKeys table with the encrypted wallet keys
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                UPDATE UserKeys 
-                SET UserKey_EncryptedPubKey = ?, UserKey_EncryptedPrivKey = ?
-                WHERE UserKey_UserProjectIdKey = ?
-                """, (encrypted_pub_key, encrypted_priv_key, user_project_id))
-                conn.commit()
+                fernet_key = _get_cached_fernet_key(user_project_id)
+
+                if fernet_key is not None:
+                    fernet = Fernet(fernet_key)
+                    cursor.execute("""
+                    UPDATE UK
+                    SET UserKey_EncryptedPubKey = ?, UserKey_EncryptedPrivKey = ?,
+                        UserKey_LastModifiedDate = SYSDATETIME()
+                    OUTPUT INSERTED.UserKey_UserProjectIdKey, UP.UserProject_UserIdKey
+                    FROM UserKeys UK
+                    INNER JOIN User_Projects UP ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
+                    WHERE UK.UserKey_UserProjectIdKey = ? AND UK.UserKey_IV = ?
+                    """, (fernet.encrypt(pub_key.encode()), fernet.encrypt(priv_key.encode()),
+                          user_project_id, fernet_key))
+                    row = cursor.fetchone()
+                    if row is None:
+                        # Key was rotated or the row is gone, fall back to reading it
+                        _invalidate_fernet_key(user_project_id)
+                        fernet_key = None
+                    else:
+                        user_id = row[1]
 
+                if fernet_key is None:
+                    cursor.execute("""
+                    SELECT UK.UserKey_IV, UP.UserProject_UserIdKey
+                    FROM UserKeys UK WITH (UPDLOCK, ROWLOCK)
+                    INNER JOIN User_Projects UP ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
+                    WHERE UK.UserKey_UserProjectIdKey = ?
+                    """, user_project_id)
+                    row = cursor.fetchone()
+                    if not row or row.UserKey_IV is None:
+                        raise WalletKeySaveError("No Fernet key found for this user project")
+                    fernet_key = row.UserKey_IV
+                    user_id = row.UserProject_UserIdKey
+
+                    fernet = Fernet(fernet_key)
+                    cursor.execute("""
+                    UPDATE UserKeys
+                    SET UserKey_EncryptedPubKey = ?, UserKey_EncryptedPrivKey = ?,
+                        UserKey_LastModifiedDate = SYSDATETIME()
+                    WHERE UserKey_UserProjectIdKey = ?
+                    """, (fernet.encrypt(pub_key.encode()), fernet.encrypt(priv_key.encode()), user_project_id))
+                    _cache_fernet_key(user_project_id, fernet_key)
+
+        get_user_projects_cache().invalidate(user_id)
         logger.info(f"Wallet keys saved successfully for user project ID: {user_project_id}")
         return True
 
@@ -249,21 +342,25 @@ def update_instance_ip(instance_id: str, ip_address: str) -> bool:
     :raises InstanceIPUpdateError: If there's an error during the IP update process
     """
     try:
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("""
-                UPDATE UserKeys
-                SET UserKey_IPAddress = ?
+                UPDATE UK
+                SET UserKey_IPAddress = ?, UserKey_LastModifiedDate = SYSDATETIME()
+                OUTPUT UP.UserProject_UserIdKey
                 FROM UserKeys UK
                 INNER JOIN User_Projects UP ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
                 WHERE UP.UserProject_InstanceId = ?
                 """, (ip_address, instance_id))
+                user_ids = {row[0] for row in cursor.fetchall()}
 
-                if cursor.rowcount == 0:
+                if not user_ids:
                     logger.warning(f"No matching record found for instance ID: {instance_id}")
                     return False
 
                 conn.commit()
+                for user_id in user_ids:
+                    get_user_projects_cache().invalidate(user_id)
                 logger.info(f"IP address updated successfully for instance ID: {instance_id}")
                 return True
 
@@ -275,6 +372,56 @@ def update_instance_ip(instance_id: str, ip_address: str) -> bool:
         raise InstanceIPUpdateError(f"Unexpected error: {str(e)}") from e
 
 
+def apply_instance_states(updates: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> Dict[str, bool]:
+    """
+    Write the IP addresses and provisioning states of many instances in one round trip.
+
+    The rows are sent as one table-valued parameter to sp_ApplyInstanceStates. A None IP address
+    or state leaves that column unchanged, and claims on the rows are kept. If an instance is
+    listed more than once, its last row wins.
+
+    :param updates: (instance_id, ip_address, provisioning_state) tuples
+    :return: Per instance ID, whether a user project with that instance was found and updated
+    :raises ValueError: If a state is not one of PROVISIONING_STATES
+    :raises InstanceIPUpdateError: If there's an error during the update
+    """
+    rows = {str(instance_id): (str(instance_id), ip_address, state) for instance_id, ip_address, state in updates}
+    unknown = {state for _, _, state in rows.values() if state is not None and state not in PROVISIONING_STATES}
+    if unknown:
+        raise ValueError(f"Unknown provisioning states: {', '.join(sorted(unknown))}")
+    if not rows:
+        return {}
+
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("{CALL sp_ApplyInstanceStates (?)}", (list(rows.values()),))
+                matches = cursor.fetchall()
+                conn.commit()
+
+        outcomes = dict.fromkeys(rows, False)
+        user_ids = set()
+        for instance_id, user_id in matches:
+            if user_id is not None:
+                outcomes[instance_id] = True
+                user_ids.add(user_id)
+        for user_id in user_ids:
+            get_user_projects_cache().invalidate(user_id)
+
+        missing = [instance_id for instance_id, found in outcomes.items() if not found]
+        if missing:
+            logger.warning(f"No matching record found for instance IDs: {', '.join(missing)}")
+        logger.info(f"Applied the states of {len(rows) - len(missing)} instances")
+        return outcomes
+
+    except pyodbc.Error as e:
+        logger.error(f"Database error while applying instance states: {e}")
+        raise InstanceIPUpdateError(f"Database error: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while applying instance states: {e}")
+        raise InstanceIPUpdateError(f"Unexpected error: {str(e)}") from e
+
+
 def generate_and_save_password(user_project_id: int) -> Optional[str]:
     """
     Generate a random password, encrypt it, and save it for a user project.
@@ -292,15 +439,16 @@ def generate_and_save_password(user_project_id: int) -> Optional[str]:
         fernet = Fernet(fernet_key)
         encrypted_password = fernet.encrypt(password.encode())
 
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("""
                 UPDATE UserKeys
-                SET UserKey_EncryptedPassword = ?, UserKey_IV = ?
+                SET UserKey_EncryptedPassword = ?, UserKey_IV = ?, UserKey_LastModifiedDate = SYSDATETIME()
                 WHERE UserKey_UserProjectIdKey = ?
                 """, (encrypted_password, fernet_key, user_project_id))
                 conn.commit()
 
+        _cache_fernet_key(user_project_id, fernet_key)
         logger.info(f"Password generated and saved successfully for user project ID: {user_project_id}")
         return password
 
@@ -333,7 +481,7 @@ def save_encrypted_password(user_project_id: int, password: str, fernet_key: byt
         fernet = Fernet(fernet_key)
         encrypted_password = fernet.encrypt(password.encode())
 
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("""
                 UPDATE UserKeys
@@ -342,6 +490,7 @@ def save_encrypted_password(user_project_id: int, password: str, fernet_key: byt
                 """, (encrypted_password, fernet_key, user_project_id))
                 conn.commit()
 
+        _cache_fernet_key(user_project_id, fernet_key)
         logger.info(f"Encrypted password saved successfully for user project ID: {user_project_id}")
         return True
     except pyodbc.Error as e:
@@ -353,20 +502,27 @@ def save_encrypted_password(user_project_id: int, password: str, fernet_key: byt
 
 
 def fetch_pending_instances() -> List[Dict]:
+    """
+    Fetch the instances queued for provisioning whose wallet keys have been saved.
+
+    Only reads the rows in the filtered provisioning queue index. Batch workers should use
+    claim_provisioning_work, which also keeps other workers from picking the same rows.
+
+    :return: List of dictionaries with user_project_id and instance_id
+    :raises DatabaseFetchError: If there's an error during the database fetch operation
+    """
     try:
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("""
-                    SELECT UK.UserKey_UserProjectIdKey, UP.UserProject_InstanceId
-                    FROM UserKeys UK
-                    INNER JOIN User_Projects UP ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
-                    WHERE UK.UserKey_IPAddress IS NULL
-                    AND UK.UserKey_EncryptedPubKey IS NOT NULL
-                    AND UK.UserKey_EncryptedPrivKey IS NOT NULL
+                    SELECT UP.UserProject_IdKey, UP.UserProject_InstanceId
+                    FROM User_Projects UP
+                    INNER JOIN UserKeys UK ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
+                    WHERE UP.UserProject_ProvisioningState = ?
                     AND UK.UserKey_EncryptedPubKey != ''
                     AND UK.UserKey_EncryptedPrivKey != ''
-                """)
-                results = [{"user_project_id": row.UserKey_UserProjectIdKey, "instance_id": row.UserProject_InstanceId}
+                """, (PROVISIONING_PENDING,))
+                results = [{"user_project_id": row.UserProject_IdKey, "instance_id": row.UserProject_InstanceId}
                            for row in cursor.fetchall()]
 
         logger.info(f"Successfully fetched {len(results)} pending instances")
@@ -379,6 +535,205 @@ def fetch_pending_instances() -> List[Dict]:
         raise DatabaseFetchError(f"Unexpected error while fetching pending instances: {str(e)}") from e
 
 
+def claim_provisioning_work(limit: int, lease_seconds: float) -> List[Dict]:
+    """
+    Claim up to limit pending or running instances whose wallet keys have been saved.
+
+    Each claimed row is leased for lease_seconds. Rows leased or locked by another worker are
+    skipped, so concurrent workers never get the same row. A lease that runs out, e.g. because
+    its worker died, makes the row claimable again.
+
+    :param limit: Maximum number of rows to claim
+    :param lease_seconds: Seconds the claim lasts, must cover checking and setting up an instance
+    :return: List of dictionaries with user_project_id, instance_id and state
+    :raises ProvisioningQueueError: If there's an error during the database operation
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE TOP (?) UP
+                    SET UserProject_LeaseUntil = DATEADD(SECOND, ?, SYSUTCDATETIME())
+                    OUTPUT INSERTED.UserProject_IdKey, INSERTED.UserProject_InstanceId,
+                           INSERTED.UserProject_ProvisioningState
+                    FROM User_Projects UP WITH (ROWLOCK, UPDLOCK, READPAST)
+                    INNER JOIN UserKeys UK ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
+                    WHERE UP.UserProject_ProvisioningState IN (?, ?)
+                    AND (UP.UserProject_LeaseUntil IS NULL OR UP.UserProject_LeaseUntil < SYSUTCDATETIME())
+                    AND UK.UserKey_EncryptedPubKey != ''
+                    AND UK.UserKey_EncryptedPrivKey != ''
+                """, (limit, int(lease_seconds), PROVISIONING_PENDING, PROVISIONING_RUNNING))
+                claimed = [{"user_project_id": row[0], "instance_id": row[1], "state": row[2]}
+                           for row in cursor.fetchall()]
+                conn.commit()
+
+        logger.info(f"Claimed {len(claimed)} instances for provisioning")
+        return claimed
+    except pyodbc.Error as e:
+        logger.error(f"Database error while claiming provisioning work: {e}")
+        raise ProvisioningQueueError(f"Failed to claim provisioning work: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while claiming provisioning work: {e}")
+        raise ProvisioningQueueError(f"Unexpected error while claiming provisioning work: {str(e)}") from e
+
+
+def set_provisioning_state(user_project_ids: Sequence[int], state: str, release: bool = True) -> int:
+    """
+    Move user projects to a provisioning state.
+
+    :param user_project_ids: IDs of the user projects
+    :param state: One of PROVISIONING_STATES
+    :param release: Whether to end the claims on the rows, keep them while the worker still works on them
+    :return: Number of updated rows
+    :raises ValueError: If the state is unknown
+    :raises ProvisioningQueueError: If there's an error during the database operation
+    """
+    if state not in PROVISIONING_STATES:
+        raise ValueError(f"Unknown provisioning state: {state}")
+    if not user_project_ids:
+        return 0
+
+    placeholders = ', '.join('?' * len(user_project_ids))
+    lease = "NULL" if release else "UserProject_LeaseUntil"
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    UPDATE User_Projects
+                    SET UserProject_ProvisioningState = ?, UserProject_LeaseUntil = {lease},
+                        UserProject_LastModifiedDate = SYSDATETIME()
+                    WHERE UserProject_IdKey IN ({placeholders})
+                """, (state, *user_project_ids))
+                updated = cursor.rowcount
+                conn.commit()
+
+        logger.info(f"Moved {updated} user projects to provisioning state {state}")
+        return updated
+    except pyodbc.Error as e:
+        logger.error(f"Database error while setting provisioning state: {e}")
+        raise ProvisioningQueueError(f"Failed to set provisioning state: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while setting provisioning state: {e}")
+        raise ProvisioningQueueError(f"Unexpected error while setting provisioning state: {str(e)}") from e
+
+
+def record_provisioning_failure(user_project_id: int, max_attempts: int, release: bool = True) -> Optional[str]:
+    """
+    Count a failed setup of a running instance and end its claim.
+
+    The instance stays running and is retried by the next claim, until max_attempts setups have
+    failed and it is moved to failed.
+
+    :param user_project_id: ID of the user project
+    :param max_attempts: Number of failed setups after which the instance is given up on
+    :param release: Whether to end the claim, keep it while the setup may still be running on the host
+    :return: New provisioning state, or None if the user project does not exist
+    :raises ProvisioningQueueError: If there's an error during the database operation
+    """
+    lease = "NULL" if release else "UserProject_LeaseUntil"
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    UPDATE User_Projects
+                    SET UserProject_ProvisioningAttempts = UserProject_ProvisioningAttempts + 1,
+                        UserProject_ProvisioningState = CASE
+                            WHEN UserProject_ProvisioningAttempts + 1 >= ? THEN ? ELSE ? END,
+                        UserProject_LeaseUntil = {lease},
+                        UserProject_LastModifiedDate = SYSDATETIME()
+                    OUTPUT INSERTED.UserProject_ProvisioningState
+                    WHERE UserProject_IdKey = ?
+                """, (max_attempts, PROVISIONING_FAILED, PROVISIONING_RUNNING, user_project_id))
+                row = cursor.fetchone()
+                conn.commit()
+
+        state = row[0] if row else None
+        if state == PROVISIONING_FAILED:
+            logger.error(f"Giving up on user project {user_project_id} after {max_attempts} failed setups")
+        return state
+    except pyodbc.Error as e:
+        logger.error(f"Database error while recording provisioning failure: {e}")
+        raise ProvisioningQueueError(f"Failed to record provisioning failure: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while recording provisioning failure: {e}")
+        raise ProvisioningQueueError(f"Unexpected error while recording provisioning failure: {str(e)}") from e
+
+
+def claim_user_project(user_project_id: int, lease_seconds: float) -> Optional[str]:
+    """
+    Claim one user project for provisioning outside the batch queue, e.g. for a fleet setup.
+
+    The row is only claimed if no other worker holds a lease on it, like in claim_provisioning_work.
+    End the claim with set_provisioning_state.
+
+    :param user_project_id: ID of the user project
+    :param lease_seconds: Seconds the claim lasts, must cover setting up the instance
+    :return: Provisioning state of the claimed row, or None if it is leased elsewhere or does not exist
+    :raises ProvisioningQueueError: If there's an error during the database operation
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE UP
+                    SET UserProject_LeaseUntil = DATEADD(SECOND, ?, SYSUTCDATETIME())
+                    OUTPUT INSERTED.UserProject_ProvisioningState
+                    FROM User_Projects UP WITH (ROWLOCK, UPDLOCK, READPAST)
+                    WHERE UP.UserProject_IdKey = ?
+                    AND (UP.UserProject_LeaseUntil IS NULL OR UP.UserProject_LeaseUntil < SYSUTCDATETIME())
+                """, (int(lease_seconds), user_project_id))
+                row = cursor.fetchone()
+                conn.commit()
+
+        if row is None:
+            logger.info(f"User project {user_project_id} is already being provisioned, not claimed")
+            return None
+        # Rows from before the provisioning queue have no state, they were set up already
+        return row[0] or PROVISIONING_CONFIGURED
+    except pyodbc.Error as e:
+        logger.error(f"Database error while claiming user project {user_project_id}: {e}")
+        raise ProvisioningQueueError(f"Failed to claim user project: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while claiming user project {user_project_id}: {e}")
+        raise ProvisioningQueueError(f"Unexpected error while claiming user project: {str(e)}") from e
+
+
+def fetch_project_instances(project_id: int) -> List[Dict]:
+    """
+    Fetch every provisioned instance of a project.
+
+    Instances still being provisioned, by state or by an active lease, are left out.
+
+    :param project_id: ID of the project in Projectdata
+    :return: List of dictionaries with user_project_id and ip, ordered by user_project_id
+    :raises DatabaseFetchError: If there's an error during the database fetch operation
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT UP.UserProject_IdKey, UK.UserKey_IPAddress
+                    FROM User_Projects UP
+                    INNER JOIN UserKeys UK ON UK.UserKey_UserProjectIdKey = UP.UserProject_IdKey
+                    WHERE UP.UserProject_ProjectIdKey = ?
+                    AND UK.UserKey_IPAddress IS NOT NULL
+                    AND (UP.UserProject_ProvisioningState IS NULL OR UP.UserProject_ProvisioningState NOT IN (?, ?))
+                    AND (UP.UserProject_LeaseUntil IS NULL OR UP.UserProject_LeaseUntil < SYSUTCDATETIME())
+                    ORDER BY UP.UserProject_IdKey
+                """, (project_id, PROVISIONING_PENDING, PROVISIONING_RUNNING))
+                results = [{"user_project_id": row.UserProject_IdKey, "ip": row.UserKey_IPAddress}
+                           for row in cursor.fetchall()]
+
+        logger.info(f"Fetched {len(results)} instances of project {project_id}")
+        return results
+    except pyodbc.Error as e:
+        logger.error(f"Database error while fetching instances of project {project_id}: {e}")
+        raise DatabaseFetchError(f"Failed to fetch project instances: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while fetching instances of project {project_id}: {e}")
+        raise DatabaseFetchError(f"Unexpected error while fetching project instances: {str(e)}") from e
+
+
 def decrypt_data(encrypted_data, fernet_key):
     try:
         # Ensure fernet_key is in the correct format
@@ -410,7 +765,7 @@ def decrypt_data(encrypted_data, fernet_key):
 
 def fetch_vps_data(user_project_id: int) -> Dict[str, any]:
     try:
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 query = """
                 SELECT 
@@ -461,7 +816,7 @@ def fetch_vps_data(user_project_id: int) -> Dict[str, any]:
 
 def verify_email_process(token: str, email: str) -> bool:
     try:
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("{CALL sp_VerifyEmail(?, ?, ?)}", (email, token, pyodbc.SQL_PARAM_OUTPUT))
                 # Fetch the result
@@ -483,7 +838,7 @@ def verify_email_process(token: str, email: str) -> bool:
 
 def initiate_password_reset(email: str, reset_token: str, expiration_time: datetime) -> bool:
     try:
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 result = cursor.execute("{CALL sp_InitiatePasswordReset(?, ?, ?, ?)}",
                                         (email, reset_token, expiration_time, 0)).fetchone()[0]
@@ -506,14 +861,12 @@ def initiate_password_reset(email: str, reset_token: str, expiration_time: datet
 
 def complete_password_reset(reset_token: str, new_password: str) -> bool:
     try:
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), salt)
+        hashed_password, salt = get_password_hasher().hash_password(new_password)
 
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 result = cursor.execute("{CALL sp_CompletePasswordReset(?, ?, ?, ?)}",
-                                        (reset_token, hashed_password.decode('utf-8'),
-                                         salt.decode('utf-8'), 0)).fetchone()[0]
+                                        (reset_token, hashed_password, salt, 0)).fetchone()[0]
                 conn.commit()
 
                 if result == 0:
@@ -523,6 +876,8 @@ def complete_password_reset(reset_token: str, new_password: str) -> bool:
                     logger.warning(f"Failed to complete password reset for token: {reset_token}")
                     return False
 
+    except PasswordHasherBusyError:
+        raise
     except pyodbc.Error as e:
         logger.error(f"Database error during password reset completion: {e}")
         raise PasswordResetCompletionError(f"Failed to complete password reset: {str(e)}") from e
@@ -532,8 +887,21 @@ def complete_password_reset(reset_token: str, new_password: str) -> bool:
 
 
 def login_user(email: str, password: str, ip_address: str) -> Tuple[int | None, str | None, None | str]:
+    """
+    Check a user's credentials.
+
+    The stored hash is read on one connection and the failed login counter written on another, so
+    no connection is held while the password is checked on the password hashing pool.
+
+    :param email: Email address of the user
+    :param password: Password to check
+    :param ip_address: IP address the login came from
+    :return: Tuple of (user_id, user_name, None) if successful, or (None, None, error_message) if failed
+    :raises PasswordHasherBusyError: If too many password checks are pending
+    :raises UserLoginError: If there's an error during the login
+    """
     try:
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 # Execute the stored procedure
                 cursor.execute("{CALL sp_UserLogin (?, ?)}", (email, ip_address))
@@ -545,37 +913,43 @@ def login_user(email: str, password: str, ip_address: str) -> Tuple[int | None,
 
                 result = row.Result  # Use column name to access the result
 
+                user = None
                 if result == 0:
-                    # Fetch user details and check password
                     user = cursor.execute(
                         "SELECT User_IdKey, User_PasswordHash, User_Name FROM Userdata WHERE User_Mail = ?",
                         (email,)).fetchone()
-                    if user and bcrypt.checkpw(password.encode('utf-8'), user.User_PasswordHash.encode('utf-8')):
-                        # Reset failed login attempts
-                        cursor.execute("{CALL sp_UpdateFailedLoginAttempts(?, ?)}", (user.User_IdKey, 0))
+                conn.commit()
+
+        if result == 0:
+            # Check the password without holding a connection
+            valid = user is not None and get_password_hasher().check_password(password, user.User_PasswordHash)
+            if user is not None:
+                with get_connection() as conn:
+                    with conn.cursor() as cursor:
+                        # Reset the failed login attempts, or count this one
+                        cursor.execute("{CALL sp_UpdateFailedLoginAttempts(?, ?)}",
+                                       (user.User_IdKey, 0 if valid else 1))
                         conn.commit()
-                        logger.info(f"User logged in successfully: {email}")
-                        return user.User_IdKey, user.User_Name, None
-                    else:
-                        # Increment failed login attempts
-                        if user:
-                            cursor.execute("{CALL sp_UpdateFailedLoginAttempts(?, ?)}", (user.User_IdKey, 1))
-                            conn.commit()
-                        logger.warning(f"Login failed: Invalid password for email: {email}")
-                        return None, None, "Invalid password"
-                elif result == -1:
-                    logger.warning(f"Login failed: User not found for email: {email}")
-                    return None, None, "User not found"
-                elif result == -2:
-                    logger.warning(f"Login failed: Email not verified for: {email}")
-                    return None, None, "Email not verified"
-                elif result == -3:
-                    logger.warning(f"Login failed: Account is locked for email: {email}")
-                    return None, None, "Account is locked"
-                else:
-                    logger.error(f"Unknown login result: {result} for email: {email}")
-                    return None, None, "Unknown error occurred"
+            if valid:
+                logger.info(f"User logged in successfully: {email}")
+                return user.User_IdKey, user.User_Name, None
+            logger.warning(f"Login failed: Invalid password for email: {email}")
+            return None, None, "Invalid password"
+        elif result == -1:
+            logger.warning(f"Login failed: User not found for email: {email}")
+            return None, None, "User not found"
+        elif result == -2:
+            logger.warning(f"Login failed: Email not verified for: {email}")
+            return None, None, "Email not verified"
+        elif result == -3:
+            logger.warning(f"Login failed: Account is locked for email: {email}")
+            return None, None, "Account is locked"
+        else:
+            logger.error(f"Unknown login result: {result} for email: {email}")
+            return None, None, "Unknown error occurred"
 
+    except PasswordHasherBusyError:
+        raise
     except pyodbc.Error as e:
         logger.error(f"Database error during login: {str(e)}")
         raise UserLoginError(f"Database error occurred: {str(e)}") from e
@@ -611,12 +985,19 @@ def fetch_user_projects(user_id: int) -> List[Dict]:
     """
     Fetch all user project data for a specific user ID and return it as JSON.
 
+    Results are cached per user for USER_PROJECTS_CACHE_TTL seconds. Writes that change a user's
+    projects invalidate the cached result, so callers see them at once.
+
     :param user_id: ID of the user
-    :return: JSON string containing user project data
+    :return: JSON string containing user project data, must not be modified
     :raises DatabaseFetchError: If there's an error during the database fetch operation
     """
+    return get_user_projects_cache().get_or_load(user_id, lambda: _fetch_user_projects(user_id))
+
+
+def _fetch_user_projects(user_id: int) -> List[Dict]:
     try:
-        with pyodbc.connect(DB_CONNECTION_STRING) as conn:
+        with get_connection() as conn:
             with conn.cursor() as cursor:
                 query = """
                 SELECT 
@@ -674,6 +1055,223 @@ def fetch_user_projects(user_id: int) -> List[Dict]:
         raise DatabaseFetchError(f"Unexpected error while fetching user projects: {str(e)}") from e
 
 
+
+def fetch_user_projects_page(user_id: int, fields: Sequence[str] = tuple(USER_PROJECT_FIELDS),
+                             after_id: int = 0, limit: int = USER_PROJECTS_PAGE_SIZE) -> Tuple[List[Dict], Optional[int]]:
+    """
+    Fetch a page of a user's projects with only the requested fields, ordered by project ID.
+
+    Pages are keyset-paginated: pass the returned next ID as after_id to get the following page.
+    Tables are only joined when a requested field needs them.
+
+    :param user_id: ID of the user
+    :param fields: Names from USER_PROJECT_FIELDS, 'id' is always included
+    :param after_id: Return projects with a higher ID than this
+    :param limit: Maximum number of projects, capped at USER_PROJECTS_MAX_PAGE_SIZE
+    :return: Tuple of (projects, ID to pass as after_id for the next page or None on the last page)
+    :raises ValueError: If a field is unknown
+    :raises DatabaseFetchError: If there's an error during the database fetch operation
+    """
+    unknown = set(fields) - USER_PROJECT_FIELDS.keys()
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    selected = ['id'] + [field for field in dict.fromkeys(fields) if field != 'id']
+    aliases = {USER_PROJECT_FIELDS[field][1] for field in selected} - {None}
+    columns = ', '.join(USER_PROJECT_FIELDS[field][0] for field in selected)
+    joins = ' '.join(USER_PROJECT_JOINS[alias] for alias in USER_PROJECT_JOINS if alias in aliases)
+    limit = max(1, min(limit, USER_PROJECTS_MAX_PAGE_SIZE))
+
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # One row more than the page tells whether there is a next page
+                cursor.execute(f"""
+                SELECT TOP (?) {columns}
+                FROM User_Projects UP {joins}
+                WHERE UP.UserProject_UserIdKey = ? AND UP.UserProject_IdKey > ?
+                ORDER BY UP.UserProject_IdKey
+                """, (limit + 1, user_id, after_id))
+                rows = cursor.fetchall()
+
+        projects = [{field: value.isoformat() if isinstance(value, datetime) else value
+                     for field, value in zip(selected, row)} for row in rows[:limit]]
+        next_after_id = projects[-1]['id'] if len(rows) > limit else None
+        return projects, next_after_id
+
+    except pyodbc.Error as e:
+        logger.error(f"Database error while fetching user projects page: {e}")
+        raise DatabaseFetchError(f"Failed to fetch user projects: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while fetching user projects page: {e}")
+        raise DatabaseFetchError(f"Unexpected error while fetching user projects: {str(e)}") from e
+
+
+def fetch_user_projects_version(user_id: int) -> str:
+    """
+    Return a token that changes whenever one of the user's projects or its keys is added, removed or modified.
+
+    Computed from the project count and the latest modification dates, so it is one aggregate
+    over the user's rows instead of reading them.
+
+    :param user_id: ID of the user
+    :return: Version token
+    :raises DatabaseFetchError: If there's an error during the database fetch operation
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                SELECT COUNT(*), MAX(UP.UserProject_IdKey), MAX(UP.UserProject_LastModifiedDate),
+                       MAX(UK.UserKey_LastModifiedDate)
+                FROM User_Projects UP
+                LEFT JOIN UserKeys UK ON UP.UserProject_IdKey = UK.UserKey_UserProjectIdKey
+                WHERE UP.UserProject_UserIdKey = ?
+                """, (user_id,))
+                row = cursor.fetchone()
+
+        return '-'.join(value.isoformat() if isinstance(value, datetime) else str(value) for value in row)
+
+    except pyodbc.Error as e:
+        logger.error(f"Database error while fetching user projects version: {e}")
+        raise DatabaseFetchError(f"Failed to fetch user projects version: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while fetching user projects version: {e}")
+        raise DatabaseFetchError(f"Unexpected error while fetching user projects version: {str(e)}") from e
+
+
+def create_job(job_type: str) -> str:
+    """
+    Persist a new provisioning job in the 'queued' state.
+
+    :param job_type: Kind of job, e.g. 'instance_setup'
+    :return: ID of the created job
+    :raises JobPersistenceError: If the job could not be saved
+    """
+    try:
+        job_id = str(uuid.uuid4())
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                INSERT INTO ProvisioningJobs (Job_Id, Job_Type, Job_Status)
+                VALUES (?, ?, 'queued')
+                """, (job_id, job_type))
+
+        logger.info(f"Created {job_type} job {job_id}")
+        return job_id
+    except pyodbc.Error as e:
+        logger.error(f"Database error while creating {job_type} job: {e}")
+        raise JobPersistenceError(f"Database error: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while creating {job_type} job: {e}")
+        raise JobPersistenceError(f"Unexpected error: {str(e)}") from e
+
+
+def update_job_status(job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None) -> bool:
+    """
+    Move a provisioning job to a new state.
+
+    :param job_id: ID of the job
+    :param status: One of 'running', 'succeeded' or 'failed'
+    :param result: JSON-serialisable result of a finished job
+    :param error: Error message of a failed job
+    :return: True if the job was updated, False if it does not exist
+    :raises JobPersistenceError: If the job could not be updated
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                UPDATE ProvisioningJobs
+                SET Job_Status = ?,
+                    Job_Result = ?,
+                    Job_Error = ?,
+                    Job_StartedDate = CASE WHEN ? = 'running' THEN GETDATE() ELSE Job_StartedDate END,
+                    Job_FinishedDate = CASE WHEN ? IN ('succeeded', 'failed') THEN GETDATE() ELSE NULL END
+                WHERE Job_Id = ?
+                """, (status, json.dumps(result, default=str) if result is not None else None, error,
+                      status, status, job_id))
+
+                if cursor.rowcount == 0:
+                    logger.warning(f"No job found with ID: {job_id}")
+                    return False
+
+        return True
+    except pyodbc.Error as e:
+        logger.error(f"Database error while updating job {job_id}: {e}")
+        raise JobPersistenceError(f"Database error: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while updating job {job_id}: {e}")
+        raise JobPersistenceError(f"Unexpected error: {str(e)}") from e
+
+
+def update_job_progress(job_id: str, progress: Dict) -> bool:
+    """
+    Store the progress of a running job in its result, so status queries can show it.
+
+    :param job_id: ID of the job
+    :param progress: JSON-serialisable progress snapshot
+    :return: True if the job was updated, False if it does not exist or is no longer running
+    :raises JobPersistenceError: If the progress could not be saved
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                UPDATE ProvisioningJobs
+                SET Job_Result = ?
+                WHERE Job_Id = ? AND Job_Status = 'running'
+                """, (json.dumps(progress, default=str), job_id))
+
+                return cursor.rowcount > 0
+    except pyodbc.Error as e:
+        logger.error(f"Database error while updating progress of job {job_id}: {e}")
+        raise JobPersistenceError(f"Database error: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while updating progress of job {job_id}: {e}")
+        raise JobPersistenceError(f"Unexpected error: {str(e)}") from e
+
+
+def fetch_job(job_id: str) -> Optional[Dict]:
+    """
+    Fetch a provisioning job by its ID.
+
+    :param job_id: ID of the job
+    :return: Dictionary with the job state, or None if no such job exists
+    :raises DatabaseFetchError: If there's an error during the database fetch operation
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                SELECT Job_Id, Job_Type, Job_Status, Job_Result, Job_Error,
+                       Job_CreationDate, Job_StartedDate, Job_FinishedDate
+                FROM ProvisioningJobs
+                WHERE Job_Id = ?
+                """, (job_id,))
+                row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            "id": str(row.Job_Id).lower(),
+            "type": row.Job_Type,
+            "status": row.Job_Status,
+            "result": json.loads(row.Job_Result) if row.Job_Result else None,
+            "error": row.Job_Error,
+            "creation_date": row.Job_CreationDate.isoformat() if row.Job_CreationDate else None,
+            "started_date": row.Job_StartedDate.isoformat() if row.Job_StartedDate else None,
+            "finished_date": row.Job_FinishedDate.isoformat() if row.Job_FinishedDate else None,
+        }
+    except pyodbc.Error as e:
+        logger.error(f"Database error while fetching job {job_id}: {e}")
+        raise DatabaseFetchError(f"Failed to fetch job: {str(e)}") from e
+    except Exception as e:
+        logger.error(f"Unexpected error while fetching job {job_id}: {e}")
+        raise DatabaseFetchError(f"Unexpected error while fetching job: {str(e)}") from e
+
+
 def main():
     # User registration
     while True:
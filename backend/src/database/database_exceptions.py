@@ -66,3 +66,23 @@ class UserLoginError(Exception):
 class ProjectCreationError(Exception):
     """Custom exception for project creation errors"""
     pass
+
+
+class DatabaseConnectionError(Exception):
+    """Custom exception for database connection errors"""
+    pass
+
+
+class ConnectionPoolTimeoutError(DatabaseConnectionError):
+    """Custom exception for connection pool checkout timeouts"""
+    pass
+
+
+class JobPersistenceError(Exception):
+    """Custom exception for provisioning job persistence errors"""
+    pass
+
+
+class ProvisioningQueueError(Exception):
+    """Custom exception for provisioning queue errors"""
+    pass
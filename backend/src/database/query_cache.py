@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from dotenv import load_dotenv
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+load_dotenv()
+USER_PROJECTS_CACHE_TTL = float(os.getenv('USER_PROJECTS_CACHE_TTL', 60))
+USER_PROJECTS_CACHE_SIZE = int(os.getenv('USER_PROJECTS_CACHE_SIZE', 1024))
+# redis:// URL of a store shared by all workers, the cache is per process if not set
+USER_PROJECTS_CACHE_URL = os.getenv('USER_PROJECTS_CACHE_URL')
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """
+    Storage behind a QueryCache. Implementations must be thread-safe.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        :return: Stored value, or None if there is none or it has expired
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class LRUCacheBackend(CacheBackend):
+    """
+    In-process store that drops the least recently used entries beyond max_entries.
+
+    Values are returned as stored, callers must not modify them.
+    """
+
+    def __init__(self, max_entries: int = USER_PROJECTS_CACHE_SIZE):
+        self.max_entries = max_entries
+        # key -> (expires at, value), least recently used first
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Store shared by all workers, values are kept as JSON.
+
+    A failing store is treated as empty, so reads fall back to the database.
+    """
+
+    def __init__(self, url: str):
+        """
+        :param url: redis:// URL
+        :raises ImportError: If the redis package is not installed
+        """
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._errors = redis.RedisError
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self._client.get(key)
+        except self._errors as e:
+            logger.warning(f"Cache read of {key} failed: {e}")
+            return None
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            self._client.set(key, json.dumps(value, default=str), px=int(ttl * 1000))
+        except self._errors as e:
+            logger.warning(f"Cache write of {key} failed: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self._client.delete(key)
+        except self._errors as e:
+            logger.warning(f"Cache invalidation of {key} failed, it expires with its TTL: {e}")
+
+
+class QueryCache:
+    """
+    Read-through cache for query results, invalidated explicitly by the code that writes the data.
+
+    A result loaded while its key is being invalidated is returned but not stored, so a slow read
+    cannot put data back that a write has just made stale.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float, namespace: str):
+        """
+        :param backend: Store for the results
+        :param ttl: Seconds a result is kept, the upper bound for staleness if an invalidation is missed
+        :param namespace: Prefix of the keys in the store
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        # Invalidations per key, compared before storing a freshly loaded result
+        self._generations: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for key, or load, store and return it.
+
+        :param key: Cache key, e.g. a user ID
+        :param load: Runs the query, its exceptions are passed on and nothing is stored
+        :return: Query result, must not be modified
+        """
+        value = self.backend.get(self._key(key))
+        with self._lock:
+            self._stats['hits' if value is not None else 'misses'] += 1
+            generation = self._generations.get(key, 0)
+        if value is not None:
+            return value
+
+        value = load()
+        with self._lock:
+            unchanged = self._generations.get(key, 0) == generation
+        if unchanged and value is not None:
+            self.backend.set(self._key(key), value, self.ttl)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop the cached result for key. Call after the write has been committed.
+        """
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._stats['invalidations'] += 1
+        self.backend.delete(self._key(key))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+def create_backend(url: Optional[str] = USER_PROJECTS_CACHE_URL) -> CacheBackend:
+    """
+    :param url: URL of a shared store, None for an in-process cache
+    :return: Shared store if configured and available, in-process LRU cache otherwise
+    """
+    if url:
+        try:
+            return RedisCacheBackend(url)
+        except ImportError:
+            logger.warning("USER_PROJECTS_CACHE_URL is set but redis is not installed, caching in process")
+    return LRUCacheBackend()
+
+
+_user_projects_cache: Optional[QueryCache] = None
+_user_projects_cache_lock = threading.Lock()
+
+
+def get_user_projects_cache() -> QueryCache:
+    """
+    Return the process-wide cache of fetch_user_projects results, creating it on first use.
+
+    :return: Shared QueryCache instance, keyed by user ID
+    """
+    global _user_projects_cache
+    if _user_projects_cache is None:
+        with _user_projects_cache_lock:
+            if _user_projects_cache is None:
+                _user_projects_cache = QueryCache(create_backend(), USER_PROJECTS_CACHE_TTL, 'user_projects')
+    return _user_projects_cache
@@ -0,0 +1,118 @@
+import os
+import logging
+import threading
+
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from src.database.database import create_job, update_job_status, update_job_progress, fetch_job
+
+load_dotenv()
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 8))
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Runs long provisioning tasks on a bounded worker pool.
+
+    submit() persists the job and returns its ID straight away. The job state moves from 'queued'
+    to 'running' to 'succeeded' or 'failed' in the ProvisioningJobs table, so any worker process
+    can answer a status query.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS):
+        """
+        :param max_workers: Maximum number of jobs running at once, further jobs wait in the queue
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    def submit(self, job_type: str, func: Callable[..., Any], *args, **kwargs) -> str:
+        """
+        Queue func for execution and return without waiting for it.
+
+        :param job_type: Kind of job, stored with the job, e.g. 'instance_setup'
+        :param func: Callable to run, its return value must be JSON-serialisable
+        :return: ID of the created job
+        :raises JobPersistenceError: If the job could not be saved
+        """
+        job_id = create_job(job_type)
+        self._executor.submit(self._run, job_id, job_type, func, *args, **kwargs)
+        return job_id
+
+    def submit_with_progress(self, job_type: str, func: Callable[..., Any], *args, **kwargs) -> str:
+        """
+        Like submit, but func is also passed a progress keyword argument.
+
+        Calling progress(snapshot) stores the JSON-serialisable snapshot as the result of the running
+        job, so status queries can follow a long job before it has finished.
+
+        :param job_type: Kind of job, stored with the job, e.g. 'fleet_setup'
+        :param func: Callable to run, its return value must be JSON-serialisable
+        :return: ID of the created job
+        :raises JobPersistenceError: If the job could not be saved
+        """
+        job_id = create_job(job_type)
+
+        def progress(snapshot: Dict) -> None:
+            try:
+                update_job_progress(job_id, snapshot)
+            except Exception as e:
+                # Progress is informational, losing an update must not fail the job
+                logger.warning(f"Could not record progress of job {job_id}: {e}")
+
+        self._executor.submit(self._run, job_id, job_type, func, *args, progress=progress, **kwargs)
+        return job_id
+
+    @staticmethod
+    def _run(job_id: str, job_type: str, func: Callable[..., Any], *args, **kwargs) -> None:
+        try:
+            update_job_status(job_id, 'running')
+            result = func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"{job_type} job {job_id} failed: {e}")
+            try:
+                update_job_status(job_id, 'failed', error=str(e))
+            except Exception as persist_error:
+                logger.error(f"Could not record failure of job {job_id}: {persist_error}")
+            return
+
+        try:
+            update_job_status(job_id, 'succeeded', result=result)
+            logger.info(f"{job_type} job {job_id} succeeded")
+        except Exception as e:
+            logger.error(f"Could not record result of job {job_id}: {e}")
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Return the process-wide job queue, creating it on first use.
+
+    :return: Shared JobQueue instance
+    """
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+    return _job_queue
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """
+    Look up the state of a job.
+
+    :param job_id: ID returned by JobQueue.submit
+    :return: Job state, or None if no such job exists
+    :raises DatabaseFetchError: If the job could not be read
+    """
+    return fetch_job(job_id)
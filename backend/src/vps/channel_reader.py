@@ -0,0 +1,107 @@
+import os
+import codecs
+import select
+import logging
+
+from dotenv import load_dotenv
+from typing import Generator, List, Tuple
+from paramiko import Channel
+
+load_dotenv()
+CHANNEL_POLL_INTERVAL = float(os.getenv('CHANNEL_POLL_INTERVAL', 1))
+CHANNEL_READ_SIZE = int(os.getenv('CHANNEL_READ_SIZE', 32768))
+
+STDOUT = 'stdout'
+STDERR = 'stderr'
+
+logger = logging.getLogger(__name__)
+
+
+class LineSplitter:
+    """
+    Turns a byte stream into complete text lines.
+
+    Bytes are decoded incrementally, so a multi-byte character split across two reads is decoded
+    once both halves have arrived. An unfinished line is held back until its newline is seen.
+    """
+
+    def __init__(self, encoding: str = 'utf-8'):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self._pending = ''
+
+    def feed(self, data: bytes) -> List[str]:
+        """
+        :param data: Next chunk of the stream
+        :return: Lines completed by this chunk, without line endings
+        """
+        lines = (self._pending + self._decoder.decode(data)).split('\n')
+        self._pending = lines.pop()
+        return [line.rstrip('\r') for line in lines]
+
+    def flush(self) -> List[str]:
+        """
+        :return: The last unterminated line, if any
+        """
+        text = self._pending + self._decoder.decode(b'', final=True)
+        self._pending = ''
+        return [text.rstrip('\r')] if text else []
+
+
+def iter_channel_batches(channel: Channel, poll_interval: float = CHANNEL_POLL_INTERVAL,
+                         read_size: int = CHANNEL_READ_SIZE) -> Generator[List[Tuple[str, str]], None, None]:
+    """
+    Yield the output of a remote command in batches of complete lines as it arrives.
+
+    Blocks in select() on the channel while it is idle instead of polling, and drains stdout and
+    stderr together so neither buffer fills up and stalls the remote process. Each batch holds
+    every line that was complete after draining what was available. Ends once the command has
+    exited and all of its output has been read, or the channel is closed.
+
+    :param channel: Channel the command was started on
+    :param poll_interval: Seconds to block per select() call before rechecking the exit status
+    :param read_size: Maximum number of bytes to read per recv() call
+    :return: Generator of non-empty lists of (stream, line) tuples, stream being STDOUT or STDERR
+    """
+    splitters = {STDOUT: LineSplitter(), STDERR: LineSplitter()}
+
+    while True:
+        # Checked before draining: the exit status arrives after the command's last output,
+        # so once it is set everything still to read is already buffered
+        finished = channel.exit_status_ready() or channel.closed
+        drained = False
+        batch: List[Tuple[str, str]] = []
+
+        while channel.recv_ready():
+            drained = True
+            batch.extend((STDOUT, line) for line in splitters[STDOUT].feed(channel.recv(read_size)))
+
+        while channel.recv_stderr_ready():
+            drained = True
+            batch.extend((STDERR, line) for line in splitters[STDERR].feed(channel.recv_stderr(read_size)))
+
+        if batch:
+            yield batch
+        if drained:
+            continue
+        if finished:
+            break
+
+        select.select([channel], [], [], poll_interval)
+
+    batch = [(stream, line) for stream, splitter in splitters.items() for line in splitter.flush()]
+    if batch:
+        yield batch
+
+
+def iter_channel_lines(channel: Channel, poll_interval: float = CHANNEL_POLL_INTERVAL,
+                       read_size: int = CHANNEL_READ_SIZE) -> Generator[Tuple[str, str], None, None]:
+    """
+    Yield the output of a remote command line by line as it arrives, see iter_channel_batches.
+
+    :param channel: Channel the command was started on
+    :param poll_interval: Seconds to block per select() call before rechecking the exit status
+    :param read_size: Maximum number of bytes to read per recv() call
+    :return: Generator of (stream, line) tuples, stream being STDOUT or STDERR
+    """
+    for batch in iter_channel_batches(channel, poll_interval, read_size):
+        yield from batch
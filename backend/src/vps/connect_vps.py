@@ -2,15 +2,18 @@ import time
 import paramiko
 import logging
 import queue
-import threading
-import uuid
 
-from typing import Dict, Any
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from src.database.database import fetch_vps_data
-from src.vps.run_scripts import execute_script, replace_placeholders, stream_logs
-from src.vps.upload_script import upload_file
+from src.vps.run_scripts import execute_script
+from src.vps.templates import render_script
+from src.vps.upload_script import upload_fileobj
+from src.vps.readiness import wait_for_host_ready
+from src.vps.ssh_pool import get_ssh_pool
+from src.vps.log_hub import get_log_broadcaster, LogSubscription
 from src.vps.vps_exceptions import (
     VPSConnectionError, VPSAuthenticationError, VPSFileOperationError,
     VPSSetupError, VPSExecutionError
@@ -19,46 +22,77 @@ from src.vps.vps_exceptions import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Phases of setup_server, in order, as reported to the phase callback and in the timings
+SETUP_PHASES = ('connect', 'upload', 'execute')
 
-def vps_logs_stream(instanceIp: str, password: str = "", username='root', pem=False):
-    ssh = None
-    try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
-        logger.info(f"Attempting to connect to {instanceIp}")
-        if not pem:
-            ssh.connect(hostname=instanceIp, username=username, password=password)
-        else:
-            ssh.connect(hostname=instanceIp, username="ubuntu", key_filename="src/aws/default.pem")
+def vps_session(instanceIp: str, password: str = "", username: str = 'root', pem: bool = False):
+    """
+    Borrow a pooled SSH connection to the instance.
+
+    :param instanceIp: Public IP address of the VPS instance
+    :param password: Instance password, if not logging in with the key file
+    :param username: Username for the VPS instance (default: 'root')
+    :param pem: Log in as ubuntu with the key file instead
+    :return: Context manager yielding the connected SSH client
+    """
+    if not pem:
+        return get_ssh_pool().session(instanceIp, username, password=password)
+    return get_ssh_pool().session(instanceIp, "ubuntu", key_filename="src/aws/default.pem")
+
+
+def subscribe_vps_logs(instanceIp: str, password: str = "", username='root', pem=False) -> LogSubscription:
+    """
+    Subscribe to the validator logs of an instance.
+
+    Viewers of the same instance share one remote log tail, a new viewer first receives the
+    most recent lines. Close the subscription when done.
 
-        logger.info(f"Successfully connected to {instanceIp}")
+    :param instanceIp: Public IP address of the VPS instance
+    :param password: Instance password, if not logging in with the key file
+    :param username: Username for the VPS instance (default: 'root')
+    :param pem: Bool to set login method
+    :return: Log subscription, errors arrive as lines starting with 'Error:'
+    """
+    key = (instanceIp, "ubuntu" if pem else username, pem)
+    logger.info(f"Streaming logs of {instanceIp}")
+    return get_log_broadcaster().subscribe(key, lambda: vps_session(instanceIp, password, username, pem))
+
+
+def vps_logs_stream(instanceIp: str, password: str = "", username='root', pem=False):
+    """
+    Stream the validator logs of an instance line by line, see subscribe_vps_logs.
 
-        logger.info("Starting to stream logs")
+    :return: Generator of log lines, errors are yielded as lines starting with 'Error:'
+    """
+    subscription = subscribe_vps_logs(instanceIp, password, username, pem)
+    try:
         log_count = 0
-        for log_line in stream_logs(ssh):
-            print(f"vps_logs_stream yielding: {log_line}")  # Debug-Ausgabe
+        for log_line in subscription:
             yield log_line
             log_count += 1
         logger.info(f"Finished streaming logs. Total lines: {log_count}")
+    finally:
+        subscription.close()
 
-    except paramiko.AuthenticationException as auth_error:
-        logger.error(f"Authentication failed: {auth_error}")
-        yield f"Error: Authentication failed. {str(auth_error)}"
-    except paramiko.SSHException as ssh_error:
-        logger.error(f"SSH connection error: {ssh_error}")
-        yield f"Error: SSH connection failed. {str(ssh_error)}"
-    except Exception as e:
-        logger.error(f"Failed to stream logs {instanceIp}. Error: {e}")
-        yield f"Error: Failed to stream logs. {str(e)}"
+
+@contextmanager
+def _timed_phase(phase: str, timings: Dict[str, float], on_phase: Optional[Callable[[str], None]]):
+    """
+    Report the start of a setup phase and record how long it took in timings.
+    """
+    if on_phase is not None:
+        on_phase(phase)
+    started = time.monotonic()
+    try:
+        yield
     finally:
-        if ssh:
-            ssh.close()
-            print("SSH connection closed.")  # Debug-Ausgabe
+        timings[phase] = round(time.monotonic() - started, 3)
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def setup_server(instanceIp: str, script_path: str, payload: Dict[str, Any], password: str, username='root', pem=False) -> None:
+def setup_server(instanceIp: str, script_path: str, payload: Dict[str, Any], password: str, username='root', pem=False,
+                 on_phase: Optional[Callable[[str], None]] = None) -> Dict[str, float]:
     """
     Connects to a VPS instance and executes a setup script.
     :param pem: Bool to set login method
@@ -67,51 +101,47 @@ def setup_server(instanceIp: str, script_path: str, payload: Dict[str, Any], pas
     :param payload: Variables to exchange in Scripts
     :param password: Instance Password
     :param username: Username for the VPS instance (default: 'root')
+    :param on_phase: Called with the name of each phase in SETUP_PHASES as it starts
+    :return: Seconds spent in each phase of the last attempt
     :raises VPSConnectionError: If there's an error connecting to the VPS
     :raises VPSAuthenticationError: If authentication fails
     :raises VPSFileOperationError: If there's an error with file operations
     :raises VPSExecutionError: If there's an error executing the script
     """
 
+    timings: Dict[str, float] = {}
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # Rendered in memory, the private key in the payload never touches the local disk
+        setup_file = render_script(script_path, payload)
+        logger.info("Setup File Rendered")
 
         logger.info(f"Attempting to connect to {instanceIp}")
-        if not pem:
-            ssh.connect(hostname=instanceIp, username=username, password=password)
-        else:
-            ssh.connect(hostname=instanceIp, username="ubuntu", key_filename="src/aws/default.pem")
-
-        logger.info(f"Connected to {instanceIp}")
-
-        setup_file = replace_placeholders(script_path=script_path, replacements=payload)
-        file_path = f'scripts/elixir/'
-        file_name = f'elixir-{uuid.uuid4()}.sh'
-
-        with open(file_path + file_name, 'w', newline='\n') as file:
-            file.write(setup_file)
-        logger.info("Setup File Saved")
-
-        time.sleep(60)  # Wait for instance initialization
+        if on_phase is not None:
+            on_phase('connect')
+        connect_started = time.monotonic()
+        with vps_session(instanceIp, password, username, pem) as ssh:
+            logger.info(f"Connected to {instanceIp}")
 
-        upload_file(ssh, local_file_path=file_path + file_name, filename='elixir.sh')
-        logger.info("File Uploaded")
+            wait_for_host_ready(ssh, instanceIp)
+            timings['connect'] = round(time.monotonic() - connect_started, 3)
 
-        time.sleep(60)
+            with _timed_phase('upload', timings, on_phase):
+                upload_fileobj(ssh, setup_file, filename='elixir.sh')
+            logger.info("File Uploaded")
 
-        try:
-            execute_script(ssh, "/root/elixir.sh")
-            logger.info("File Executed Successfully")
-        except Exception as exec_error:
-            logger.error(f"Error executing script: {exec_error}")
-            raise VPSExecutionError(f"Failed to execute script on {instanceIp}: {str(exec_error)}") from exec_error
+            with _timed_phase('execute', timings, on_phase):
+                try:
+                    execute_script(ssh, "/root/elixir.sh")
+                    logger.info("File Executed Successfully")
+                except Exception as exec_error:
+                    logger.error(f"Error executing script: {exec_error}")
+                    raise VPSExecutionError(
+                        f"Failed to execute script on {instanceIp}: {str(exec_error)}") from exec_error
 
-        logger.info("File Executed")
+            logger.info("File Executed")
 
-        time.sleep(60)
-        ssh.close()
-        logger.info("Session Closed")
+        logger.info(f"Session Released, phase timings for {instanceIp}: {timings}")
+        return timings
 
     except paramiko.AuthenticationException as auth_error:
         logger.error(f"Authentication failed: {auth_error}")
@@ -132,21 +162,16 @@ def setup_vps(user_project_id: int) -> Dict[str, Any]:
     """
     Set up a VPS instance.
 
+    Runs in the calling thread, submit it to the job queue to run it in the background.
+
     :param user_project_id: ID of the user project
     :return: Dictionary containing setup result
     :raises VPSSetupError: If there's an error during VPS setup
     """
     try:
         result_queue = queue.Queue()
-
-        thread = threading.Thread(
-            target=setup_vps_async,
-            args=(user_project_id, result_queue)
-        )
-        thread.start()
-        thread.join()
-
-        result = result_queue.get()
+        setup_vps_async(user_project_id, result_queue)
+        result = result_queue.get_nowait()
 
         if isinstance(result, Exception):
             raise result
@@ -160,6 +185,35 @@ def setup_vps(user_project_id: int) -> Dict[str, Any]:
         raise VPSSetupError(f"Failed to set up VPS: {str(e)}") from e
 
 
+def provision_vps(user_project_id: int, on_phase: Optional[Callable[[str], None]] = None) -> Dict[str, float]:
+    """
+    Run the project's setup script on the instance of a user project.
+
+    :param user_project_id: ID of the user project
+    :param on_phase: Called with the name of each phase in SETUP_PHASES as it starts
+    :return: Seconds spent in each phase
+    :raises VPSDataFetchError: If the instance data could not be read
+    :raises VPSSetupError: If the setup failed
+    """
+    data = fetch_vps_data(user_project_id)
+    ip_address = data.get('ip')
+    wallet = data.get('wallet')
+    project_name = data.get('project_name')
+    private_key = data.get('priv_key')
+    password = data.get('password')
+
+    payload = {
+        'ip': ip_address,
+        'name': "1cy1c3",
+        'wallet': wallet,
+        'priv_key': private_key,
+    }
+
+    return setup_server(instanceIp=ip_address, script_path=f"scripts/templates/{project_name}.sh",
+                        payload=payload, password=password, username='root', pem=True,  # TODO: True for MVP, change later
+                        on_phase=on_phase)
+
+
 def setup_vps_async(user_project_id: int, result_queue: queue.Queue) -> None:
     """
     Asynchronously set up a VPS instance.
@@ -168,23 +222,7 @@ def setup_vps_async(user_project_id: int, result_queue: queue.Queue) -> None:
     :param result_queue: Queue to put the result of the setup process
     """
     try:
-        data = fetch_vps_data(user_project_id)
-        ip_address = data.get('ip')
-        wallet = data.get('wallet')
-        project_name = data.get('project_name')
-        private_key = data.get('priv_key')
-        password = data.get('password')
-
-        payload = {
-            'ip': ip_address,
-            'name': "1cy1c3",
-            'wallet': wallet,
-            'priv_key': private_key,
-        }
-
-        setup_server(instanceIp=ip_address, script_path=f"scripts/templates/{project_name}.sh",
-                     payload=payload, password=password, username='root', pem=True)  # TODO: True for MVP, change later
-
+        provision_vps(user_project_id)
         result_queue.put({'message': 'VPS instance created, setup completed'})
     except Exception as e:
         logger.error(f"VPS setup failed: {e}")
@@ -0,0 +1,150 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, Optional
+
+from src.database.database import claim_user_project, set_provisioning_state, PROVISIONING_CONFIGURED
+from src.vps.connect_vps import provision_vps
+
+load_dotenv()
+FLEET_SETUP_WORKERS = int(os.getenv('FLEET_SETUP_WORKERS', 8))
+# How long a host is claimed for its setup, keeps the batch process and other fleet setups away from it
+FLEET_SETUP_LEASE_SECONDS = float(os.getenv('FLEET_SETUP_LEASE_SECONDS', 1200))
+
+# Host states reported in fleet progress events
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+FINISHED_STATES = frozenset({SUCCEEDED, FAILED, SKIPPED})
+
+logger = logging.getLogger(__name__)
+
+
+def release_claim(user_project_id: Hashable, state: str) -> None:
+    """
+    End the claim on a user project, a failure to do so only delays the next setup until the lease runs out.
+
+    :param user_project_id: ID of the user project
+    :param state: Provisioning state to leave the user project in
+    """
+    try:
+        set_provisioning_state([user_project_id], state)
+    except Exception as e:
+        logger.error(f"Could not release the claim on user project {user_project_id}: {e}")
+
+
+def iter_fleet_setup(user_project_ids: Iterable[Hashable], max_workers: int = FLEET_SETUP_WORKERS,
+                     fail_fast: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Provision several user projects in parallel, yielding progress events as they happen.
+
+    Every event has the user_project_id and its status. 'running' events name the phase that
+    started, 'succeeded' events carry the phase timings and 'failed' events the error. Each host
+    ends with exactly one 'succeeded', 'failed' or 'skipped' event.
+
+    With fail_fast the first failure skips every host that has not started yet. Hosts already
+    running are left to finish, a setup script stopped halfway leaves the node in a worse state.
+
+    Every host is claimed before its setup starts, like the batch process does. A host another
+    worker is provisioning right now is skipped.
+
+    :param user_project_ids: IDs of the user projects to provision, duplicates are provisioned once
+    :param max_workers: Maximum number of hosts provisioned at once
+    :param fail_fast: Stop starting new hosts after the first failure
+    :return: Generator of progress events
+    """
+    project_ids = list(dict.fromkeys(user_project_ids))
+    events: queue.Queue = queue.Queue()
+    abort = threading.Event()
+
+    def provision(user_project_id) -> None:
+        if abort.is_set():
+            events.put({'user_project_id': user_project_id, 'status': SKIPPED})
+            return
+
+        started = time.monotonic()
+        try:
+            state = claim_user_project(user_project_id, FLEET_SETUP_LEASE_SECONDS)
+        except Exception as e:
+            logger.error(f"Could not claim user project {user_project_id} for fleet setup: {e}")
+            state = None
+        if state is None:
+            events.put({'user_project_id': user_project_id, 'status': SKIPPED,
+                        'error': 'Already being provisioned'})
+            return
+
+        try:
+            timings = provision_vps(user_project_id, on_phase=lambda phase: events.put(
+                {'user_project_id': user_project_id, 'status': RUNNING, 'phase': phase}))
+        except Exception as e:
+            logger.error(f"Fleet setup failed for user project {user_project_id}: {e}")
+            release_claim(user_project_id, state)
+            if fail_fast:
+                abort.set()
+            events.put({'user_project_id': user_project_id, 'status': FAILED, 'error': str(e),
+                        'elapsed': round(time.monotonic() - started, 3)})
+            return
+
+        release_claim(user_project_id, PROVISIONING_CONFIGURED)
+        events.put({'user_project_id': user_project_id, 'status': SUCCEEDED, 'timings': timings,
+                    'elapsed': round(time.monotonic() - started, 3)})
+
+    workers = max(min(max_workers, len(project_ids)), 1)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fleet_setup')
+    try:
+        for user_project_id in project_ids:
+            executor.submit(provision, user_project_id)
+
+        remaining = len(project_ids)
+        while remaining:
+            event = events.get()
+            if event['status'] in FINISHED_STATES:
+                remaining -= 1
+            yield event
+    finally:
+        # Also reached when the consumer stops early, hosts not yet started are then skipped
+        abort.set()
+        executor.shutdown(wait=False)
+
+
+def provision_fleet(user_project_ids: Iterable[Hashable], max_workers: int = FLEET_SETUP_WORKERS,
+                    fail_fast: bool = False, progress: Optional[Callable[[Dict], None]] = None) -> Dict[str, Any]:
+    """
+    Provision several user projects in parallel and summarise the outcome per host.
+
+    Failed hosts do not fail the whole run, they are listed in the summary with their error.
+
+    :param user_project_ids: IDs of the user projects to provision
+    :param max_workers: Maximum number of hosts provisioned at once
+    :param fail_fast: Stop starting new hosts after the first failure
+    :param progress: Called with the current summary after every progress event
+    :return: Summary with the state of every host, counts per final state and the total elapsed seconds
+    """
+    project_ids = list(dict.fromkeys(user_project_ids))
+    hosts: Dict[Any, Dict[str, Any]] = {user_project_id: {'status': QUEUED} for user_project_id in project_ids}
+    started = time.monotonic()
+
+    def summary() -> Dict[str, Any]:
+        counts = {state: 0 for state in (SUCCEEDED, FAILED, SKIPPED)}
+        for host in hosts.values():
+            if host['status'] in counts:
+                counts[host['status']] += 1
+        return {'hosts': hosts, **counts, 'elapsed': round(time.monotonic() - started, 3)}
+
+    for event in iter_fleet_setup(project_ids, max_workers=max_workers, fail_fast=fail_fast):
+        host = hosts[event['user_project_id']]
+        host.update((key, value) for key, value in event.items() if key != 'user_project_id')
+        if progress is not None:
+            progress(summary())
+
+    result = summary()
+    logger.info(f"Fleet setup of {len(project_ids)} hosts finished: {result[SUCCEEDED]} succeeded, "
+                f"{result[FAILED]} failed, {result[SKIPPED]} skipped in {result['elapsed']} seconds")
+    return result
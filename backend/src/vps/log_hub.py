@@ -0,0 +1,215 @@
+import os
+import queue
+import logging
+import threading
+import paramiko
+
+from collections import deque
+from dotenv import load_dotenv
+from paramiko import SSHClient
+from typing import Callable, ContextManager, Deque, Dict, Hashable, Iterator, List, Optional, Set
+
+from src.vps.run_scripts import LOG_TAIL_COMMAND, read_log_batches
+
+load_dotenv()
+LOG_HUB_BUFFER_LINES = int(os.getenv('LOG_HUB_BUFFER_LINES', 200))
+LOG_SUBSCRIBER_QUEUE_SIZE = int(os.getenv('LOG_SUBSCRIBER_QUEUE_SIZE', 1000))
+
+logger = logging.getLogger(__name__)
+
+SessionFactory = Callable[[], ContextManager[SSHClient]]
+
+
+class LogSubscription:
+    """
+    One viewer's feed of a shared log stream. Iterate it to receive lines, or call get() to
+    receive them in batches, and close it when done.
+    """
+
+    def __init__(self, broadcaster: 'LogBroadcaster', hub: '_LogHub', max_batches: int):
+        self._broadcaster = broadcaster
+        self._hub = hub
+        self._queue: queue.Queue = queue.Queue(maxsize=max_batches)
+        self.dropped = 0
+        # Called from the pump thread after every delivery, lets async consumers wait without a thread
+        self.waker: Optional[Callable[[], None]] = None
+
+    def _deliver(self, batch: Optional[List[str]]) -> None:
+        # Called by the pump thread, a slow viewer loses its oldest batches instead of stalling the others
+        while True:
+            try:
+                self._queue.put_nowait(batch)
+                break
+            except queue.Full:
+                try:
+                    self.dropped += len(self._queue.get_nowait() or ())
+                except queue.Empty:
+                    pass
+
+        if self.waker is not None:
+            self.waker()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[List[str]]:
+        """
+        :param timeout: Seconds to wait for new lines, None to wait indefinitely
+        :return: Next batch of lines, or None once the stream has ended
+        :raises queue.Empty: If no lines arrived within timeout
+        """
+        return self._queue.get(timeout=timeout)
+
+    def get_nowait(self) -> Optional[List[str]]:
+        """
+        :return: Next batch of lines, or None once the stream has ended
+        :raises queue.Empty: If no lines are waiting
+        """
+        return self._queue.get_nowait()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            batch = self.get()
+            if batch is None:
+                return
+            yield from batch
+
+    def close(self) -> None:
+        self._broadcaster.unsubscribe(self)
+
+
+class _LogHub:
+    __slots__ = ('key', 'recent', 'subscribers', 'channel', 'stopped')
+
+    def __init__(self, key: Hashable, buffer_lines: int):
+        self.key = key
+        self.recent: Deque[str] = deque(maxlen=buffer_lines)
+        self.subscribers: Set[LogSubscription] = set()
+        self.channel: Optional[paramiko.Channel] = None
+        self.stopped = False
+
+
+class LogBroadcaster:
+    """
+    Shares one remote ``docker logs -f`` per host between all of its viewers.
+
+    The first subscriber for a host starts a pump thread that tails the log over a pooled SSH
+    connection and fans every line out to the subscribers. The last buffer_lines lines are kept
+    so viewers joining later see recent history first. When the last subscriber leaves, the
+    remote command is stopped.
+    """
+
+    def __init__(self, buffer_lines: int = LOG_HUB_BUFFER_LINES, queue_size: int = LOG_SUBSCRIBER_QUEUE_SIZE):
+        """
+        :param buffer_lines: Number of recent lines replayed to a new subscriber
+        :param queue_size: Number of undelivered batches kept per subscriber before the oldest are dropped
+        """
+        self.buffer_lines = buffer_lines
+        self.queue_size = queue_size
+        self._hubs: Dict[Hashable, _LogHub] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key: Hashable, open_session: SessionFactory) -> LogSubscription:
+        """
+        Subscribe to the log stream identified by key, starting it if nobody is watching yet.
+
+        :param key: Identifies the stream, subscribers with equal keys share it
+        :param open_session: Returns a context manager yielding a connected SSH client, used to start the stream
+        :return: Subscription, already holding the buffered recent lines
+        """
+        with self._lock:
+            hub = self._hubs.get(key)
+            start = hub is None
+            if start:
+                hub = _LogHub(key, self.buffer_lines)
+                self._hubs[key] = hub
+
+            subscription = LogSubscription(self, hub, self.queue_size)
+            if hub.recent:
+                subscription._deliver(list(hub.recent))
+            hub.subscribers.add(subscription)
+
+        if start:
+            threading.Thread(target=self._pump, args=(hub, open_session), name=f'log-hub-{key}',
+                             daemon=True).start()
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription) -> None:
+        """
+        Remove a subscriber and stop the remote stream if it was the last one.
+
+        :param subscription: Subscription returned by subscribe
+        """
+        hub = subscription._hub
+        with self._lock:
+            hub.subscribers.discard(subscription)
+            if hub.subscribers or hub.stopped:
+                return
+            channel = self._stop(hub)
+
+        if channel is not None:
+            # Wakes the pump thread, which is blocked reading from the channel
+            channel.close()
+
+    def active_streams(self) -> int:
+        with self._lock:
+            return len(self._hubs)
+
+    def _stop(self, hub: _LogHub) -> Optional[paramiko.Channel]:
+        # Called with self._lock held
+        hub.stopped = True
+        if self._hubs.get(hub.key) is hub:
+            del self._hubs[hub.key]
+        return hub.channel
+
+    def _publish(self, hub: _LogHub, batch: List[str]) -> None:
+        with self._lock:
+            hub.recent.extend(batch)
+            for subscription in hub.subscribers:
+                subscription._deliver(batch)
+
+    def _pump(self, hub: _LogHub, open_session: SessionFactory) -> None:
+        logger.info(f"Starting shared log stream {hub.key}")
+        try:
+            with open_session() as ssh:
+                stdin, stdout, stderr = ssh.exec_command(LOG_TAIL_COMMAND, get_pty=True)
+                with self._lock:
+                    hub.channel = stdout.channel
+                    stopped = hub.stopped
+                try:
+                    if not stopped:
+                        for batch in read_log_batches(stdout.channel):
+                            self._publish(hub, batch)
+                finally:
+                    stdout.channel.close()
+        except paramiko.AuthenticationException as auth_error:
+            logger.error(f"Authentication failed: {auth_error}")
+            self._publish(hub, [f"Error: Authentication failed. {str(auth_error)}"])
+        except paramiko.SSHException as ssh_error:
+            logger.error(f"SSH connection error: {ssh_error}")
+            self._publish(hub, [f"Error: SSH connection failed. {str(ssh_error)}"])
+        except Exception as e:
+            logger.error(f"Failed to stream logs {hub.key}. Error: {e}")
+            self._publish(hub, [f"Error: Failed to stream logs. {str(e)}"])
+        finally:
+            with self._lock:
+                self._stop(hub)
+                subscribers = list(hub.subscribers)
+            for subscription in subscribers:
+                subscription._deliver(None)
+            logger.info(f"Shared log stream {hub.key} ended")
+
+
+_broadcaster: Optional[LogBroadcaster] = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_log_broadcaster() -> LogBroadcaster:
+    """
+    Return the process-wide log broadcaster, creating it on first use.
+
+    :return: Shared LogBroadcaster instance
+    """
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                _broadcaster = LogBroadcaster()
+    return _broadcaster
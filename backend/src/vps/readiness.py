@@ -0,0 +1,116 @@
+import os
+import time
+import logging
+
+from dotenv import load_dotenv
+from paramiko import SSHClient
+from typing import Optional, Tuple
+
+from src.vps.vps_exceptions import VPSReadinessError
+
+load_dotenv()
+VPS_READY_TIMEOUT = float(os.getenv('VPS_READY_TIMEOUT', 600))
+VPS_READY_INITIAL_DELAY = float(os.getenv('VPS_READY_INITIAL_DELAY', 2))
+VPS_READY_MAX_DELAY = float(os.getenv('VPS_READY_MAX_DELAY', 30))
+VPS_PROBE_TIMEOUT = float(os.getenv('VPS_PROBE_TIMEOUT', 15))
+
+# (name, command) pairs, each command exits with 0 once that part of the host is ready
+READINESS_PROBES: Tuple[Tuple[str, str], ...] = (
+    ('shell', 'true'),
+    ('cloud-init', 'test ! -d /var/lib/cloud || test -f /var/lib/cloud/instance/boot-finished'),
+    # fuser also exits non-zero when it fails, so a missing fuser or a sudo needing a password must not pass
+    ('package manager', 'command -v fuser >/dev/null 2>&1 && sudo -n true >/dev/null 2>&1 && '
+                        '! sudo -n fuser /var/lib/dpkg/lock-frontend /var/lib/dpkg/lock /var/lib/apt/lists/lock '
+                        '>/dev/null 2>&1'),
+)
+
+logger = logging.getLogger(__name__)
+
+
+def run_probe(ssh_client: SSHClient, command: str, timeout: float = VPS_PROBE_TIMEOUT) -> Optional[int]:
+    """
+    Run a probe command and wait for its exit status.
+
+    :param ssh_client: An active SSH client connected to the remote server
+    :param command: Shell command to run
+    :param timeout: Seconds to wait for the command to finish
+    :return: Exit status, or None if the command did not finish in time
+    """
+    stdin, stdout, stderr = ssh_client.exec_command(command, timeout=timeout)
+    channel = stdout.channel
+    if not channel.status_event.wait(timeout):
+        channel.close()
+        return None
+    return channel.recv_exit_status()
+
+
+def check_sftp(ssh_client: SSHClient) -> bool:
+    """
+    Check that the SFTP subsystem accepts sessions.
+
+    :param ssh_client: An active SSH client connected to the remote server
+    :return: True if an SFTP session could be opened
+    """
+    sftp = ssh_client.open_sftp()
+    sftp.close()
+    return True
+
+
+def first_unready_probe(ssh_client: SSHClient) -> Optional[str]:
+    """
+    Run all readiness probes in order and stop at the first one that fails.
+
+    :param ssh_client: An active SSH client connected to the remote server
+    :return: Name of the failing probe, or None if the host is ready
+    """
+    for name, command in READINESS_PROBES:
+        try:
+            if run_probe(ssh_client, command) != 0:
+                return name
+        except Exception as e:
+            logger.debug(f"Readiness probe '{name}' raised: {e}")
+            return name
+
+    try:
+        check_sftp(ssh_client)
+    except Exception as e:
+        logger.debug(f"SFTP readiness probe raised: {e}")
+        return 'sftp'
+    return None
+
+
+def wait_for_host_ready(ssh_client: SSHClient, host: str, timeout: float = VPS_READY_TIMEOUT,
+                        initial_delay: float = VPS_READY_INITIAL_DELAY,
+                        max_delay: float = VPS_READY_MAX_DELAY) -> float:
+    """
+    Block until cloud-init has finished, SSH and SFTP work and no package manager holds its lock.
+
+    Probes are repeated with exponential backoff and the call returns as soon as all of them pass.
+
+    :param ssh_client: An active SSH client connected to the remote server
+    :param host: Host name or IP, used for logging
+    :param timeout: Seconds to wait before giving up
+    :param initial_delay: Seconds to wait after the first failed probe round
+    :param max_delay: Upper bound for the delay between probe rounds
+    :return: Seconds it took until the host was ready
+    :raises VPSReadinessError: If the host was not ready within timeout
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+
+    while True:
+        unready = first_unready_probe(ssh_client)
+        elapsed = time.monotonic() - start
+        if unready is None:
+            logger.info(f"Host {host} ready after {elapsed:.1f} seconds")
+            return elapsed
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.error(f"Host {host} not ready after {timeout} seconds, waiting on {unready}")
+            raise VPSReadinessError(f"Host {host} not ready after {timeout} seconds, waiting on {unready}")
+
+        logger.info(f"Host {host} not ready yet, waiting on {unready}. Next check in {min(delay, remaining):.0f}s")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
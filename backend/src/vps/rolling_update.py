@@ -0,0 +1,243 @@
+import os
+import re
+import time
+import shlex
+import logging
+
+from dotenv import load_dotenv
+from paramiko import SSHClient
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.database.database import fetch_project_instances
+from src.vps.connect_vps import vps_session
+from src.vps.vps_exceptions import VPSUpdateError
+
+load_dotenv()
+ROLLING_UPDATE_BATCH_SIZE = int(os.getenv('ROLLING_UPDATE_BATCH_SIZE', 5))
+# Seconds a restarted container must keep running before its host counts as healthy
+ROLLING_UPDATE_SETTLE_TIME = float(os.getenv('ROLLING_UPDATE_SETTLE_TIME', 60))
+ROLLING_UPDATE_POLL_INTERVAL = float(os.getenv('ROLLING_UPDATE_POLL_INTERVAL', 5))
+ROLLING_UPDATE_PULL_TIMEOUT = float(os.getenv('ROLLING_UPDATE_PULL_TIMEOUT', 600))
+# Env file written by the setup script, relative to the home directory of the SSH user
+VALIDATOR_ENV_FILE = os.getenv('VALIDATOR_ENV_FILE', 'validator.env')
+CONTAINER_NAME = 'elixir'
+
+IMAGE_REFERENCE_PATTERN = re.compile(r'^[a-z0-9][a-z0-9._\-/:@]*$', re.IGNORECASE)
+# Repositories an update may move hosts to, the containers get the validator's private key
+ROLLING_UPDATE_ALLOWED_REPOSITORIES = frozenset(
+    repository.strip().lower() for repository in
+    os.getenv('ROLLING_UPDATE_ALLOWED_REPOSITORIES', 'elixirprotocol/validator').split(',') if repository.strip())
+
+# Host states reported in the rolling update summary
+QUEUED = 'queued'
+UPDATING = 'updating'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+logger = logging.getLogger(__name__)
+
+
+def run_command(ssh_client: SSHClient, command: str, timeout: float) -> Tuple[int, str, str]:
+    """
+    Run a command and wait for it to finish.
+
+    :param ssh_client: An active SSH client connected to the remote server
+    :param command: Shell command to run
+    :param timeout: Seconds the channel may stay silent before the read fails
+    :return: Tuple of (exit status, stdout, stderr)
+    """
+    stdin, stdout, stderr = ssh_client.exec_command(command, timeout=timeout)
+    output = stdout.read().decode('utf-8', errors='replace').strip()
+    error_output = stderr.read().decode('utf-8', errors='replace').strip()
+    return stdout.channel.recv_exit_status(), output, error_output
+
+
+def redeploy_container(ssh_client: SSHClient, image: str, env_file: str = VALIDATOR_ENV_FILE,
+                       timeout: float = ROLLING_UPDATE_PULL_TIMEOUT) -> None:
+    """
+    Pull image and replace the validator container with one running it.
+
+    The image is pulled before the old container is removed, so the node is only down for the
+    restart and a failed pull leaves it running the old version.
+
+    :param ssh_client: An active SSH client connected to the remote server
+    :param image: Image reference to run, e.g. 'elixirprotocol/validator:v4'
+    :param env_file: Env file the container is started with
+    :param timeout: Seconds the pull may stay silent before it is given up on
+    :raises VPSUpdateError: If any step fails
+    """
+    image, env_file, name = shlex.quote(image), shlex.quote(env_file), shlex.quote(CONTAINER_NAME)
+    command = (f"test -f {env_file} && sudo docker pull -q {image} && sudo docker rm -f {name} && "
+               f"sudo docker run -d --env-file {env_file} --name {name} --restart unless-stopped {image}")
+
+    exit_status, output, error_output = run_command(ssh_client, command, timeout)
+    if exit_status != 0:
+        raise VPSUpdateError(f"Redeploy failed (exit status {exit_status}): {error_output or output}")
+
+
+def container_state(ssh_client: SSHClient, timeout: float = 30) -> Tuple[bool, str, int]:
+    """
+    Read the state of the validator container.
+
+    :param ssh_client: An active SSH client connected to the remote server
+    :param timeout: Seconds to wait for docker to answer
+    :return: Tuple of (running, image reference, restart count)
+    :raises VPSUpdateError: If the container could not be inspected
+    """
+    command = (f"sudo docker inspect -f '{{{{.State.Running}}}} {{{{.Config.Image}}}} {{{{.RestartCount}}}}' "
+               f"{shlex.quote(CONTAINER_NAME)}")
+    exit_status, output, error_output = run_command(ssh_client, command, timeout)
+    if exit_status != 0:
+        raise VPSUpdateError(f"Could not inspect container {CONTAINER_NAME}: {error_output or output}")
+
+    running, current_image, restart_count = output.split()
+    return running == 'true', current_image, int(restart_count)
+
+
+def wait_until_healthy(ssh_client: SSHClient, image: str, settle_time: float = ROLLING_UPDATE_SETTLE_TIME,
+                       poll_interval: float = ROLLING_UPDATE_POLL_INTERVAL) -> None:
+    """
+    Watch the container for settle_time and fail as soon as it stops, restarts or runs another image.
+
+    :param ssh_client: An active SSH client connected to the remote server
+    :param image: Image reference the container should run
+    :param settle_time: Seconds the container must stay up
+    :param poll_interval: Seconds between checks
+    :raises VPSUpdateError: If the container is not healthy
+    """
+    deadline = time.monotonic() + settle_time
+    while True:
+        running, current_image, restart_count = container_state(ssh_client)
+        if current_image != image:
+            raise VPSUpdateError(f"Container runs {current_image} instead of {image}")
+        if not running or restart_count > 0:
+            raise VPSUpdateError(f"Container is not staying up (running: {running}, restarts: {restart_count})")
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(poll_interval, remaining))
+
+
+def update_host(ip: str, image: str, settle_time: float = ROLLING_UPDATE_SETTLE_TIME) -> Dict[str, float]:
+    """
+    Redeploy the validator on one host and wait until it is healthy, over a pooled connection.
+
+    :param ip: Public IP address of the instance
+    :param image: Image reference to run
+    :param settle_time: Seconds the new container must stay up
+    :return: Seconds spent redeploying and in the health check
+    :raises VPSUpdateError: If the redeploy or the health check failed
+    """
+    timings: Dict[str, float] = {}
+    with vps_session(ip, pem=True) as ssh:  # TODO: True for MVP, like setup_vps
+        started = time.monotonic()
+        redeploy_container(ssh, image)
+        timings['redeploy'] = round(time.monotonic() - started, 3)
+
+        started = time.monotonic()
+        wait_until_healthy(ssh, image, settle_time)
+        timings['health'] = round(time.monotonic() - started, 3)
+
+    logger.info(f"Updated {ip} to {image}: {timings}")
+    return timings
+
+
+def image_repository(image: str) -> str:
+    """
+    :param image: Image reference, e.g. 'elixirprotocol/validator:v4' or 'repo@sha256:...'
+    :return: Repository part of the reference, without tag or digest
+    """
+    repository = image.split('@', 1)[0]
+    name_start = repository.rfind('/') + 1
+    tag_start = repository.find(':', name_start)
+    return (repository[:tag_start] if tag_start != -1 else repository).lower()
+
+
+def validate_image(image: str) -> None:
+    """
+    Check that an image may be rolled out.
+
+    :param image: Image reference
+    :raises VPSUpdateError: If the reference is invalid or its repository is not in ROLLING_UPDATE_ALLOWED_REPOSITORIES
+    """
+    if not IMAGE_REFERENCE_PATTERN.match(image):
+        raise VPSUpdateError(f"Invalid image reference: {image}")
+    if image_repository(image) not in ROLLING_UPDATE_ALLOWED_REPOSITORIES:
+        raise VPSUpdateError(f"Image repository of {image} is not allowed")
+
+
+def rolling_update(project_id: int, image: str, batch_size: int = ROLLING_UPDATE_BATCH_SIZE,
+                   max_failures: int = 0, settle_time: float = ROLLING_UPDATE_SETTLE_TIME,
+                   progress: Optional[Callable[[Dict], None]] = None) -> Dict[str, Any]:
+    """
+    Move every instance of a project to a new validator image, batch_size hosts at a time.
+
+    Hosts within a wave are updated concurrently. A wave only counts as done once all of its hosts
+    kept the new container up for settle_time. When more than max_failures hosts have failed,
+    the remaining waves are skipped, so a bad image never reaches the whole fleet.
+
+    Hosts that are still being provisioned are left out, see fetch_project_instances.
+
+    :param project_id: ID of the project in Projectdata
+    :param image: Image reference to run, e.g. 'elixirprotocol/validator:v4'
+    :param batch_size: Number of hosts per wave
+    :param max_failures: Number of failed hosts tolerated before the update stops
+    :param settle_time: Seconds a new container must stay up before its host counts as healthy
+    :param progress: Called with the current summary whenever a host changes state
+    :return: Summary with the state of every host and counts per final state
+    :raises VPSUpdateError: If the image reference is invalid or not allowed
+    :raises DatabaseFetchError: If the instances could not be read
+    """
+    validate_image(image)
+
+    instances = fetch_project_instances(project_id)
+    hosts: Dict[Any, Dict[str, Any]] = {instance['user_project_id']: {'ip': instance['ip'], 'status': QUEUED}
+                                        for instance in instances}
+    batch_size = max(batch_size, 1)
+    waves: List[List[Dict]] = [instances[i:i + batch_size] for i in range(0, len(instances), batch_size)]
+    started = time.monotonic()
+
+    def summary() -> Dict[str, Any]:
+        counts = {state: 0 for state in (SUCCEEDED, FAILED, SKIPPED)}
+        for host in hosts.values():
+            if host['status'] in counts:
+                counts[host['status']] += 1
+        return {'image': image, 'waves': len(waves), 'hosts': hosts, **counts,
+                'elapsed': round(time.monotonic() - started, 3)}
+
+    def report() -> None:
+        if progress is not None:
+            progress(summary())
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=batch_size, thread_name_prefix='rolling_update') as executor:
+        for wave_number, wave in enumerate(waves, start=1):
+            if failures > max_failures:
+                for instance in wave:
+                    hosts[instance['user_project_id']]['status'] = SKIPPED
+                continue
+
+            logger.info(f"Updating wave {wave_number}/{len(waves)} of project {project_id} to {image}")
+            for instance in wave:
+                hosts[instance['user_project_id']].update(status=UPDATING, wave=wave_number)
+            report()
+
+            futures = {instance['user_project_id']: executor.submit(update_host, instance['ip'], image, settle_time)
+                       for instance in wave}
+            for user_project_id, future in futures.items():
+                host = hosts[user_project_id]
+                try:
+                    host.update(status=SUCCEEDED, timings=future.result())
+                except Exception as e:
+                    logger.error(f"Update of {host['ip']} failed: {e}")
+                    host.update(status=FAILED, error=str(e))
+                    failures += 1
+            report()
+
+    result = summary()
+    logger.info(f"Rolling update of project {project_id} to {image} finished: {result[SUCCEEDED]} succeeded, "
+                f"{result[FAILED]} failed, {result[SKIPPED]} skipped in {result['elapsed']} seconds")
+    return result
@@ -1,13 +1,19 @@
-import re
-import time
+import os
 import signal
 import logging
-from typing import Dict, Any, Generator
-from paramiko import SSHClient
+from collections import deque
+from dotenv import load_dotenv
+from typing import Dict, Any, Generator, List
+from paramiko import SSHClient, Channel
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from src.vps.channel_reader import iter_channel_batches, iter_channel_lines, STDERR
+from src.vps.templates import ScriptTemplate
 from src.vps.vps_exceptions import VPSExecutionError, VPSFileOperationError
-# from src.vps.upload_script import elevate_privileges
+
+load_dotenv()
+SCRIPT_ERROR_TAIL_LINES = int(os.getenv('SCRIPT_ERROR_TAIL_LINES', 50))
+LOG_TAIL_COMMAND = "sudo docker logs -f elixir --tail 10"
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,17 +32,20 @@ def execute_script(ssh_client: SSHClient, script_path: str) -> None:
         logger.info(f"Executing script: {script_path}")
         stdin, stdout, stderr = ssh_client.exec_command(f"sudo bash {script_path}")
 
-        # Read and log output in real-time
-        while not stdout.channel.exit_status_ready():
-            if stdout.channel.recv_ready():
-                line = read_vps_line(stdout)
+        # Log output as it arrives, keeping the tail of stderr for the error message
+        error_lines = deque(maxlen=SCRIPT_ERROR_TAIL_LINES)
+        for stream, line in iter_channel_lines(stdout.channel):
+            if stream == STDERR:
+                error_lines.append(line)
+                logger.warning(line)
+            elif line:
                 logger.info(line)
 
         # Get the exit status
         exit_status = stdout.channel.recv_exit_status()
 
         if exit_status != 0:
-            error_output = stderr.read().decode('utf-8')
+            error_output = '\n'.join(error_lines)
             logger.error(f"Script execution failed with exit status {exit_status}. Error: {error_output}")
             raise VPSExecutionError(f"Script execution failed: {error_output}")
 
@@ -46,36 +55,20 @@ def execute_script(ssh_client: SSHClient, script_path: str) -> None:
         raise VPSExecutionError(f"Failed to execute script: {str(e)}") from e
 
 
-def read_vps_line(stdout):
-    return stdout.channel.recv(1024).decode('utf-8').strip()
+def read_log_batches(channel: Channel) -> Generator[List[str], None, None]:
+    """
+    Yield a log stream in batches of non-empty lines until its channel is closed.
 
+    Blocks until the channel has data and then takes everything that is available at once, so a
+    burst of log output arrives as one batch.
 
-def stream_logs(ssh_client: SSHClient) -> Generator[str, None, None]:
-    stdin, stdout, stderr = [None] * 3
-    try:
-        logger.info("Starting log streaming...")
-        stdin, stdout, stderr = ssh_client.exec_command("sudo docker logs -f elixir --tail 10", get_pty=True)
-
-        while not stdout.channel.closed:
-            line = stdout.readline()
-            if line:
-                stripped_line = line.strip()
-                if stripped_line:
-                    logger.info(f"Log line: {stripped_line}")
-                    yield stripped_line
-            else:
-                time.sleep(0.1)  # Short sleep to prevent CPU overuse
-    except Exception as e:
-        logger.error(f"Failed to execute command. Error: {e}")
-        yield f"Error: Failed to execute command. {str(e)}"
-    finally:
-        logger.info("Cleaning up SSH resources")
-        if stdout:
-            stdout.close()
-        if stdin:
-            stdin.close()
-        if stderr:
-            stderr.close()
+    :param channel: Channel of the command producing the log
+    :return: Generator of non-empty lists of log lines
+    """
+    for batch in iter_channel_batches(channel):
+        lines = [stripped_line for stripped_line in (line.strip() for stream, line in batch) if stripped_line]
+        if lines:
+            yield lines
 
 
 def replace_placeholders(script_path: str, replacements: Dict[str, Any]) -> str:
@@ -92,15 +85,7 @@ def replace_placeholders(script_path: str, replacements: Dict[str, Any]) -> str:
         with open(script_path, 'r') as f:
             script_content = f.read()
 
-        def replacement_func(match):
-            placeholder = match.group(1)
-            if placeholder in replacements:
-                value = replacements[placeholder]
-                return str(value).strip("'\"")
-            return match.group(0)  # Return original if no replacement found
-
-        # Use regex to find placeholders and apply the replacement function
-        replaced_content = re.sub(r'\{(\w+)}', replacement_func, script_content)
+        replaced_content = ScriptTemplate(script_path, script_content).render(replacements, strict=False)
         logger.info(f"Placeholders replaced in script: {script_path}")
         return replaced_content
     except FileNotFoundError:
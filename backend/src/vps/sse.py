@@ -0,0 +1,118 @@
+import os
+import time
+import queue
+
+from dotenv import load_dotenv
+from typing import Generator, List, Optional
+
+from src.vps.log_hub import LogSubscription
+
+load_dotenv()
+LOG_STREAM_FLUSH_INTERVAL = float(os.getenv('LOG_STREAM_FLUSH_INTERVAL', 0.25))
+LOG_STREAM_HEARTBEAT_INTERVAL = float(os.getenv('LOG_STREAM_HEARTBEAT_INTERVAL', 15))
+LOG_STREAM_MAX_BATCH_LINES = int(os.getenv('LOG_STREAM_MAX_BATCH_LINES', 500))
+
+# Comment line, ignored by SSE clients but keeps proxies from closing an idle stream
+SSE_HEARTBEAT = ": keep-alive\n\n"
+
+
+def format_sse(lines: List[str]) -> str:
+    """
+    Build one SSE event carrying several lines, one 'data:' field per line.
+
+    :param lines: Lines without line endings
+    :return: Event text including the terminating blank line
+    """
+    return ''.join(f"data: {line}\n" for line in lines) + "\n"
+
+
+class SSEBatcher:
+    """
+    Decides when collected log lines are sent as one SSE event and when a heartbeat is due.
+
+    Lines are collected for up to flush_interval seconds, or until max_batch_lines are pending,
+    and then sent as one event. A heartbeat comment is sent whenever nothing was sent for
+    heartbeat_interval seconds. Shared by the threaded and the async stream.
+    """
+
+    def __init__(self, flush_interval: float = LOG_STREAM_FLUSH_INTERVAL,
+                 heartbeat_interval: float = LOG_STREAM_HEARTBEAT_INTERVAL,
+                 max_batch_lines: int = LOG_STREAM_MAX_BATCH_LINES):
+        """
+        :param flush_interval: Seconds the first pending line waits for more lines
+        :param heartbeat_interval: Seconds of silence after which a heartbeat is sent
+        :param max_batch_lines: Number of pending lines that triggers an immediate flush
+        """
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_batch_lines = max_batch_lines
+        self._pending: List[str] = []
+        self._flush_at = 0.0
+        self._last_sent = time.monotonic()
+
+    def timeout(self) -> float:
+        """
+        :return: Seconds to wait for new lines before add() must be called with an empty batch
+        """
+        deadline = self._flush_at if self._pending else self._last_sent + self.heartbeat_interval
+        return max(0.0, deadline - time.monotonic())
+
+    def add(self, batch: List[str]) -> Optional[str]:
+        """
+        :param batch: Newly received lines, empty if the wait timed out
+        :return: Event or heartbeat to send now, None if nothing is due
+        """
+        if batch:
+            if not self._pending:
+                self._flush_at = time.monotonic() + self.flush_interval
+            self._pending.extend(batch)
+
+        now = time.monotonic()
+        if self._pending and (now >= self._flush_at or len(self._pending) >= self.max_batch_lines):
+            frame = format_sse(self._pending)
+            self._pending = []
+            self._last_sent = now
+            return frame
+        if not self._pending and now - self._last_sent >= self.heartbeat_interval:
+            self._last_sent = now
+            return SSE_HEARTBEAT
+        return None
+
+    def finish(self) -> Optional[str]:
+        """
+        :return: Event with the lines still pending, None if there are none
+        """
+        frame = format_sse(self._pending) if self._pending else None
+        self._pending = []
+        return frame
+
+
+def sse_log_frames(subscription: LogSubscription, flush_interval: float = LOG_STREAM_FLUSH_INTERVAL,
+                   heartbeat_interval: float = LOG_STREAM_HEARTBEAT_INTERVAL,
+                   max_batch_lines: int = LOG_STREAM_MAX_BATCH_LINES) -> Generator[str, None, None]:
+    """
+    Turn a log subscription into batched SSE events, see SSEBatcher.
+
+    :param subscription: Log subscription to read from
+    :param flush_interval: Seconds the first pending line waits for more lines
+    :param heartbeat_interval: Seconds of silence after which a heartbeat is sent
+    :param max_batch_lines: Number of pending lines that triggers an immediate flush
+    :return: Generator of SSE event strings, ends with the subscription
+    """
+    batcher = SSEBatcher(flush_interval, heartbeat_interval, max_batch_lines)
+
+    while True:
+        try:
+            batch = subscription.get(timeout=batcher.timeout())
+        except queue.Empty:
+            batch = []
+
+        if batch is None:
+            frame = batcher.finish()
+            if frame:
+                yield frame
+            return
+
+        frame = batcher.add(batch)
+        if frame:
+            yield frame
@@ -0,0 +1,221 @@
+import os
+import time
+import socket
+import hashlib
+import logging
+import threading
+import paramiko
+
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from typing import Dict, Iterator, List, Optional, Tuple
+
+load_dotenv()
+SSH_IDLE_TIMEOUT = float(os.getenv('SSH_IDLE_TIMEOUT', 300))
+SSH_KEEPALIVE_INTERVAL = int(os.getenv('SSH_KEEPALIVE_INTERVAL', 30))
+SSH_CONNECT_TIMEOUT = float(os.getenv('SSH_CONNECT_TIMEOUT', 15))
+
+# Errors after which the underlying connection can no longer be trusted
+CONNECTION_ERRORS = (paramiko.SSHException, socket.error, EOFError)
+
+logger = logging.getLogger(__name__)
+
+SessionKey = Tuple[str, str, Optional[str], Optional[str]]
+
+
+class _PooledSession:
+    __slots__ = ('key', 'client', 'users', 'last_used', 'stale')
+
+    def __init__(self, key: SessionKey, client: paramiko.SSHClient):
+        self.key = key
+        self.client = client
+        self.users = 0
+        self.last_used = time.monotonic()
+        self.stale = False
+
+    def is_active(self) -> bool:
+        transport = self.client.get_transport()
+        return bool(transport and transport.is_active())
+
+
+class _ConnectLock:
+    __slots__ = ('lock', 'waiters')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = 0
+
+
+class SSHSessionPool:
+    """
+    Keeps authenticated SSH connections open and shares them between callers.
+
+    Connections are keyed by (host, username, credentials). Every caller of session() gets the
+    same connected client and opens its own channels on it, so concurrent commands, SFTP
+    transfers and log streams to one host share a single key exchange. Connections nobody has
+    used for idle_timeout seconds are closed.
+    """
+
+    def __init__(self, idle_timeout: float = SSH_IDLE_TIMEOUT, keepalive_interval: int = SSH_KEEPALIVE_INTERVAL,
+                 connect_timeout: float = SSH_CONNECT_TIMEOUT):
+        """
+        :param idle_timeout: Seconds an unused connection is kept open
+        :param keepalive_interval: Seconds between keepalive packets, 0 to disable them
+        :param connect_timeout: Seconds to wait for the TCP connection and the SSH handshake
+        """
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.connect_timeout = connect_timeout
+        self._sessions: Dict[SessionKey, _PooledSession] = {}
+        # Only kept while callers acquire a session for the key, so hosts no longer used do not pile up
+        self._connect_locks: Dict[SessionKey, _ConnectLock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(host: str, username: str, password: Optional[str], key_filename: Optional[str]) -> SessionKey:
+        # Only a digest of the password is kept in the key
+        secret = hashlib.sha256(password.encode('utf-8')).hexdigest() if password else None
+        return host, username, secret, key_filename
+
+    def _connect(self, host: str, username: str, password: Optional[str],
+                 key_filename: Optional[str]) -> paramiko.SSHClient:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        logger.info(f"Opening SSH connection to {username}@{host}")
+        try:
+            if key_filename:
+                client.connect(hostname=host, username=username, key_filename=key_filename,
+                               timeout=self.connect_timeout, banner_timeout=self.connect_timeout)
+            else:
+                client.connect(hostname=host, username=username, password=password,
+                               timeout=self.connect_timeout, banner_timeout=self.connect_timeout)
+        except Exception:
+            client.close()
+            raise
+
+        transport = client.get_transport()
+        if transport and self.keepalive_interval:
+            transport.set_keepalive(self.keepalive_interval)
+        return client
+
+    def _acquire(self, host: str, username: str, password: Optional[str],
+                 key_filename: Optional[str]) -> _PooledSession:
+        key = self._key(host, username, password, key_filename)
+        self.evict_idle()
+
+        with self._lock:
+            connect_lock = self._connect_locks.setdefault(key, _ConnectLock())
+            connect_lock.waiters += 1
+
+        # Callers for the same host wait for one handshake instead of each starting their own
+        try:
+            with connect_lock.lock:
+                with self._lock:
+                    entry = self._sessions.get(key)
+                    if entry is not None and entry.is_active():
+                        entry.users += 1
+                        return entry
+                    dead = entry is not None and self._retire(entry)
+                if dead:
+                    entry.client.close()
+
+                client = self._connect(host, username, password, key_filename)
+                entry = _PooledSession(key, client)
+                entry.users = 1
+                with self._lock:
+                    self._sessions[key] = entry
+                return entry
+        finally:
+            with self._lock:
+                connect_lock.waiters -= 1
+                if connect_lock.waiters == 0 and self._connect_locks.get(key) is connect_lock:
+                    del self._connect_locks[key]
+
+    def _retire(self, entry: _PooledSession) -> bool:
+        # Called with self._lock held, returns True once the client has no users left and can be closed
+        entry.stale = True
+        if self._sessions.get(entry.key) is entry:
+            del self._sessions[entry.key]
+        return entry.users == 0
+
+    def _release(self, entry: _PooledSession, discard: bool = False) -> None:
+        with self._lock:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+            close = (discard or entry.stale) and self._retire(entry)
+        if close:
+            entry.client.close()
+
+    @contextmanager
+    def session(self, host: str, username: str, password: Optional[str] = None,
+                key_filename: Optional[str] = None) -> Iterator[paramiko.SSHClient]:
+        """
+        Borrow a connected SSH client for host, opening a connection if there is none yet.
+
+        The client is shared: open channels on it (exec_command, open_sftp, invoke_shell) but do
+        not close it. A connection that fails with an SSH or socket error is dropped.
+
+        :param host: Hostname or IP address
+        :param username: Login user
+        :param password: Password, if authenticating with a password
+        :param key_filename: Private key file, if authenticating with a key
+        :return: Connected SSH client
+        :raises paramiko.AuthenticationException: If authentication fails
+        :raises paramiko.SSHException: If the connection cannot be established
+        """
+        entry = self._acquire(host, username, password, key_filename)
+        discard = False
+        try:
+            yield entry.client
+        except CONNECTION_ERRORS:
+            discard = True
+            raise
+        finally:
+            self._release(entry, discard=discard)
+
+    def evict_idle(self) -> int:
+        """
+        Close connections that are unused and idle for longer than idle_timeout or already dead.
+
+        :return: Number of closed connections
+        """
+        now = time.monotonic()
+        evicted: List[_PooledSession] = []
+        with self._lock:
+            for key, entry in list(self._sessions.items()):
+                if entry.users == 0 and (now - entry.last_used > self.idle_timeout or not entry.is_active()):
+                    del self._sessions[key]
+                    evicted.append(entry)
+
+        for entry in evicted:
+            logger.info(f"Closing idle SSH connection to {entry.key[1]}@{entry.key[0]}")
+            entry.client.close()
+        return len(evicted)
+
+    def close_all(self) -> None:
+        """
+        Close every connection, those still in use are closed when they are released.
+        """
+        with self._lock:
+            closable = [entry for entry in list(self._sessions.values()) if self._retire(entry)]
+        for entry in closable:
+            entry.client.close()
+
+
+_pool: Optional[SSHSessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ssh_pool() -> SSHSessionPool:
+    """
+    Return the process-wide SSH session pool, creating it on first use.
+
+    :return: Shared SSHSessionPool instance
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SSHSessionPool()
+    return _pool
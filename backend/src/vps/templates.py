@@ -0,0 +1,176 @@
+import io
+import os
+import re
+import logging
+import threading
+
+from dotenv import load_dotenv
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from src.vps.vps_exceptions import VPSTemplateError
+
+load_dotenv()
+SCRIPT_TEMPLATE_DIR = os.getenv('SCRIPT_TEMPLATE_DIR', 'scripts/templates')
+
+# Keys setup_vps passes to the setup scripts
+SCRIPT_PLACEHOLDERS: FrozenSet[str] = frozenset({'ip', 'name', 'wallet', 'priv_key'})
+
+# {name} placeholders, ${NAME} is shell syntax and left alone
+PLACEHOLDER_PATTERN = re.compile(r'(?<!\$)\{(\w+)}')
+
+logger = logging.getLogger(__name__)
+
+
+class ScriptTemplate:
+    """
+    Setup script split once into literal text and placeholders, so rendering is a single join.
+    """
+
+    def __init__(self, path: str, source: str, mtime: float = 0.0):
+        """
+        :param path: Path the template was loaded from
+        :param source: Template text
+        :param mtime: Modification time of the file when it was read
+        """
+        self.path = path
+        self.mtime = mtime
+        # Even indexes are literal text, odd indexes are placeholder names
+        self._parts: List[str] = PLACEHOLDER_PATTERN.split(source)
+        self.placeholders: FrozenSet[str] = frozenset(self._parts[1::2])
+
+    def validate(self, allowed: FrozenSet[str]) -> None:
+        """
+        :param allowed: Placeholder names the template may use
+        :raises VPSTemplateError: If the template uses any other placeholder
+        """
+        unknown = self.placeholders - allowed
+        if unknown:
+            raise VPSTemplateError(f"Unknown placeholders in {self.path}: {', '.join(sorted(unknown))}")
+
+    def render(self, replacements: Dict[str, Any], strict: bool = True) -> str:
+        """
+        Fill in the placeholders, stripping surrounding quotes from the values.
+
+        :param replacements: Placeholder-value pairs
+        :param strict: Raise if a placeholder has no value instead of leaving it in the output
+        :return: Rendered script
+        :raises VPSTemplateError: If strict and a placeholder has no value
+        """
+        if strict:
+            missing = self.placeholders - replacements.keys()
+            if missing:
+                raise VPSTemplateError(f"Missing values for {self.path}: {', '.join(sorted(missing))}")
+
+        buffer = io.StringIO()
+        for index, part in enumerate(self._parts):
+            if index % 2 == 0:
+                buffer.write(part)
+            elif part in replacements:
+                buffer.write(str(replacements[part]).strip("'\""))
+            else:
+                buffer.write(f"{{{part}}}")
+        return buffer.getvalue()
+
+    def render_bytes(self, replacements: Dict[str, Any]) -> io.BytesIO:
+        """
+        Render into an in-memory file ready for upload, with Unix line endings.
+
+        :param replacements: Placeholder-value pairs
+        :return: Rendered script, positioned at the start
+        :raises VPSTemplateError: If a placeholder has no value
+        """
+        rendered = self.render(replacements).replace('\r\n', '\n')
+        return io.BytesIO(rendered.encode('utf-8'))
+
+
+class TemplateRegistry:
+    """
+    Loads each script template once and keeps it parsed in memory.
+
+    A template is re-read only when its file's modification time changes, so edits on disk are
+    picked up without a restart.
+    """
+
+    def __init__(self, template_dir: str = SCRIPT_TEMPLATE_DIR,
+                 allowed_placeholders: Optional[FrozenSet[str]] = SCRIPT_PLACEHOLDERS):
+        """
+        :param template_dir: Directory searched by load_all
+        :param allowed_placeholders: Placeholder names templates may use, None to allow any
+        """
+        self.template_dir = template_dir
+        self.allowed_placeholders = allowed_placeholders
+        self._templates: Dict[str, ScriptTemplate] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, path: str, mtime: float) -> ScriptTemplate:
+        with open(path, 'r') as f:
+            template = ScriptTemplate(path, f.read(), mtime)
+        if self.allowed_placeholders is not None:
+            template.validate(self.allowed_placeholders)
+        logger.info(f"Loaded script template {path}")
+        return template
+
+    def get(self, path: str) -> ScriptTemplate:
+        """
+        Return the parsed template at path, loading it on first use or after it changed.
+
+        :param path: Path to the template file
+        :return: Parsed template
+        :raises FileNotFoundError: If the template does not exist
+        :raises VPSTemplateError: If the template uses unknown placeholders
+        """
+        mtime = os.stat(path).st_mtime
+        template = self._templates.get(path)
+        if template is not None and template.mtime == mtime:
+            return template
+
+        with self._lock:
+            template = self._templates.get(path)
+            if template is None or template.mtime != mtime:
+                template = self._load(path, mtime)
+                self._templates[path] = template
+            return template
+
+    def load_all(self) -> Tuple[str, ...]:
+        """
+        Load and validate every template in template_dir, so broken templates fail at startup.
+
+        :return: Paths of the loaded templates
+        :raises VPSTemplateError: If a template uses unknown placeholders
+        """
+        paths = tuple(sorted(os.path.join(self.template_dir, name) for name in os.listdir(self.template_dir)
+                             if name.endswith('.sh')))
+        for path in paths:
+            self.get(path)
+        return paths
+
+
+_registry: Optional[TemplateRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry() -> TemplateRegistry:
+    """
+    Return the process-wide template registry, creating it on first use.
+
+    :return: Shared TemplateRegistry instance
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TemplateRegistry()
+    return _registry
+
+
+def render_script(path: str, replacements: Dict[str, Any]) -> io.BytesIO:
+    """
+    Render a setup script template into memory.
+
+    :param path: Path to the template file
+    :param replacements: Placeholder-value pairs
+    :return: Rendered script ready for upload
+    :raises FileNotFoundError: If the template does not exist
+    :raises VPSTemplateError: If the template is invalid or a placeholder has no value
+    """
+    return get_template_registry().get(path).render_bytes(replacements)
@@ -1,110 +1,117 @@
 import logging
-import time
 import os
-from typing import Optional
-from paramiko import SSHClient, Channel
+import uuid
+import shlex
+from dotenv import load_dotenv
+from typing import IO, Optional
+from paramiko import SSHClient
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from src.vps.vps_exceptions import (
-    VPSPrivilegeElevationError,
     VPSFileUploadError,
     VPSFileOperationError
 )
 
+load_dotenv()
+UPLOAD_INSTALL_TIMEOUT = float(os.getenv('UPLOAD_INSTALL_TIMEOUT', 60))
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def elevate_privileges(ssh_client: SSHClient, sudo_password: Optional[str] = None) -> Channel:
+def install_file(ssh_client: SSHClient, source_path: str, target_path: str, mode: str = '0755',
+                 sudo_password: Optional[str] = None, timeout: float = UPLOAD_INSTALL_TIMEOUT) -> None:
     """
-    Elevates privileges to root on the remote server.
+    Installs an uploaded file with root privileges in one command and removes the upload.
 
     :param ssh_client: An active SSH client connected to the remote server
+    :param source_path: Path of the uploaded file on the remote server
+    :param target_path: Destination path on the remote server
+    :param mode: File mode of the installed file
     :param sudo_password: Password for sudo (if required)
-    :return: Shell channel with elevated privileges
-    :raises VPSPrivilegeElevationError: If there's an error elevating privileges
+    :param timeout: Seconds to wait for the command to finish
+    :raises VPSFileOperationError: If the file could not be installed or the command timed out
     """
-    try:
-        print("Step 1")
-        shell = ssh_client.invoke_shell()
-        shell.send("sudo -i\n")
-        print("Step 2")
-
-        time.sleep(1)
-
-        output = shell.recv(1024).decode('utf-8')
-        print("Step 3")
-
-        if "[sudo] password" in output:
-            print("Step 1")
-
-            if sudo_password is None:
-                print("Step 1")
-
-                raise ValueError("Sudo password required but not provided")
-            shell.send(f"{sudo_password}\n")
-            time.sleep(1)
-        print("Step 4")
-
-        output = shell.recv(1024).decode('utf-8')
-        print(output)
-        if "root@" in output:
-            logger.info("Successfully elevated privileges to root")
-            return shell
-        else:
-            raise VPSPrivilegeElevationError("Failed to elevate privileges")
-    except Exception as e:
-        logger.error(f"Error during privilege elevation: {e}")
-        raise VPSPrivilegeElevationError(f"Error during privilege elevation: {str(e)}") from e
+    source, target = shlex.quote(source_path), shlex.quote(target_path)
+    # -S reads the password from stdin, -n fails at once instead of prompting when one would be needed
+    sudo = "sudo -S -p ''" if sudo_password is not None else "sudo -n"
+    command = f"{sudo} install -m {mode} {source} {target}; status=$?; rm -f {source}; exit $status"
+
+    stdin, stdout, stderr = ssh_client.exec_command(command, timeout=timeout)
+    if sudo_password is not None:
+        stdin.write(f"{sudo_password}\n")
+        stdin.flush()
+    # A wrong password makes sudo prompt again, end of input lets it fail instead of waiting
+    stdin.channel.shutdown_write()
+
+    channel = stdout.channel
+    if not channel.status_event.wait(timeout):
+        channel.close()
+        raise VPSFileOperationError(f"Installing {target_path} did not finish within {timeout} seconds")
+    exit_status = channel.recv_exit_status()
+    if exit_status != 0:
+        error_output = stderr.read().decode('utf-8', errors='replace').strip()
+        raise VPSFileOperationError(f"Failed to install {target_path} (exit status {exit_status}): {error_output}")
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def upload_file(ssh_client: SSHClient, local_file_path: str, filename: str, sudo_password: Optional[str] = None) -> None:
+def upload_fileobj(ssh_client: SSHClient, fileobj: IO[bytes], filename: str,
+                   sudo_password: Optional[str] = None) -> None:
     """
-    Uploads a local file to the remote server and moves it to /root/ with elevated privileges.
+    Uploads an in-memory file to the remote server and installs it as an executable in /root/.
 
     :param ssh_client: An active SSH client connected to the remote server
-    :param local_file_path: Path to the local file to upload
+    :param fileobj: File object to upload, read from the start
     :param filename: Destination filename on the remote server
     :param sudo_password: Password for sudo (if required)
     :raises VPSFileUploadError: If there's an error uploading the file
-    :raises VPSFileOperationError: If there's an error moving or changing permissions of the file
+    :raises VPSFileOperationError: If there's an error installing the file
     """
-    temp_path = f"/tmp/{filename}"
+    # Unique upload name so concurrent or retried uploads never pick up each other's file
+    temp_path = f"/tmp/{uuid.uuid4().hex}-{filename}"
     final_path = f"/root/{filename}"
 
     try:
-        shell = elevate_privileges(ssh_client, sudo_password)
-
         sftp = ssh_client.open_sftp()
-        logger.info(f"Attempting to upload {local_file_path} to {temp_path}")
-        sftp.put(local_file_path, temp_path)
-        sftp.close()
+        try:
+            logger.info(f"Attempting to upload {filename} to {temp_path}")
+            fileobj.seek(0)
+            sftp.putfo(fileobj, temp_path)
+        finally:
+            sftp.close()
         logger.info(f"File uploaded successfully to {temp_path}")
 
-        move_str = f"mv {temp_path} {final_path}\n"
-        shell.send(move_str.encode('utf-8'))
-        time.sleep(1)
-        output = shell.recv(1024).decode('utf-8')
-        if "mv: cannot move" in output:
-            raise VPSFileOperationError(f"Failed to move file: {output}")
+        install_file(ssh_client, temp_path, final_path, sudo_password=sudo_password)
+        logger.info(f"File successfully installed to {final_path}")
+    except VPSFileOperationError as e:
+        logger.error(f"Failed to install file. Error: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Failed to upload file. Error: {e}")
+        raise VPSFileUploadError(f"Failed to upload file: {str(e)}") from e
 
-        logger.info(f"File successfully moved to {final_path}")
-        shell.send(f"chmod +x {final_path}\n".encode('utf-8'))
-        time.sleep(1)
-        output = shell.recv(1024).decode('utf-8')
-        logger.info(f"Changed file permissions: {output}")
 
-        os.remove(local_file_path)
-        logger.info(f"Local file {local_file_path} deleted successfully")
+def upload_file(ssh_client: SSHClient, local_file_path: str, filename: str, sudo_password: Optional[str] = None) -> None:
+    """
+    Uploads a local file to the remote server and installs it as an executable in /root/.
+    The local file is deleted afterwards.
 
-    except VPSPrivilegeElevationError as e:
-        logger.error(f"Failed to elevate privileges: {e}")
-        raise
-    except Exception as e:
-        logger.error(f"Failed to upload and move file. Error: {e}")
-        raise VPSFileUploadError(f"Failed to upload and move file: {str(e)}") from e
+    :param ssh_client: An active SSH client connected to the remote server
+    :param local_file_path: Path to the local file to upload
+    :param filename: Destination filename on the remote server
+    :param sudo_password: Password for sudo (if required)
+    :raises VPSFileUploadError: If there's an error uploading the file
+    :raises VPSFileOperationError: If there's an error installing the file
+    """
+    try:
+        with open(local_file_path, 'rb') as f:
+            upload_fileobj(ssh_client, f, filename, sudo_password)
+    except OSError as e:
+        logger.error(f"Failed to read {local_file_path}. Error: {e}")
+        raise VPSFileUploadError(f"Failed to read {local_file_path}: {str(e)}") from e
+
+    os.remove(local_file_path)
+    logger.info(f"Local file {local_file_path} deleted successfully")
 
 
 if __name__ == "__main__":
@@ -119,7 +126,7 @@ if __name__ == "__main__":
 
         upload_file(ssh, '/path/to/local/file.sh', 'remote_file.sh', 'sudo_password')
         logger.info("File upload test completed successfully")
-    except (VPSPrivilegeElevationError, VPSFileUploadError, VPSFileOperationError) as e:
+    except (VPSFileUploadError, VPSFileOperationError) as e:
         logger.error(f"Error during file upload test: {e}")
     except Exception as e:
         logger.error(f"Unexpected error during file upload test: {e}")
@@ -31,3 +31,18 @@ class VPSPrivilegeElevationError(Exception):
 class VPSFileUploadError(Exception):
     """Custom exception for VPS script execution errors"""
     pass
+
+
+class VPSReadinessError(Exception):
+    """Custom exception for VPS hosts that did not become ready in time"""
+    pass
+
+
+class VPSTemplateError(Exception):
+    """Custom exception for invalid setup script templates"""
+    pass
+
+
+class VPSUpdateError(Exception):
+    """Custom exception for failed container updates"""
+    pass
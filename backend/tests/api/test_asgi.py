@@ -0,0 +1,126 @@
+import os
+import queue
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock
+
+os.environ.setdefault('APP_SECRET', 'test_secret')
+
+from asgi import application, AsyncLogReader  # noqa: E402
+from src.vps.log_hub import LogSubscription  # noqa: E402
+from tests.api.test_main import signed_headers  # noqa: E402
+
+
+def http_scope(path: str, query_string: str = '', headers=None) -> dict:
+    return {
+        'type': 'http', 'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '',
+        'query_string': query_string.encode(), 'http_version': '1.1', 'server': ('localhost', 80),
+        'client': ('127.0.0.1', 1234),
+        'headers': [(b'host', b'localhost')] + [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+
+
+async def call(scope: dict, disconnect_after: float = 5) -> list:
+    sent = []
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(disconnect_after)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    return sent
+
+
+def run(coroutine):
+    # Own loop rather than asyncio.run, which unsets the current loop other tests rely on
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def body_of(sent: list) -> str:
+    return ''.join(m.get('body', b'').decode() for m in sent if m['type'] == 'http.response.body')
+
+
+class TestAsgi(unittest.TestCase):
+
+    def test_stream_logs_rejects_unsigned_request(self):
+        sent = run(call(http_scope('/stream_logs', 'ip_address=1.1.1.1')))
+
+        self.assertEqual(sent[0]['status'], 401)
+        self.assertIn('Missing headers', body_of(sent))
+
+    @patch('asgi.subscribe_vps_logs')
+    def test_stream_logs_sends_batched_events(self, mock_subscribe):
+        # Setup
+        subscription = LogSubscription(MagicMock(), MagicMock(), max_batches=10)
+        subscription.close = MagicMock()
+        mock_subscribe.return_value = subscription
+        subscription._deliver(["line 1", "line 2"])
+        subscription._deliver(None)
+        headers = signed_headers('GET', 'http://localhost/stream_logs?ip_address=1.1.1.1')
+
+        # Execute
+        sent = run(call(http_scope('/stream_logs', 'ip_address=1.1.1.1', headers)))
+
+        # Assert
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertEqual(body_of(sent), "data: line 1\ndata: line 2\n\ndata: Stream Ended\n\n")
+        mock_subscribe.assert_called_once_with(instanceIp='1.1.1.1', pem=True)
+        subscription.close.assert_called_once()
+
+    @patch('asgi.subscribe_vps_logs')
+    def test_stream_logs_closes_subscription_on_disconnect(self, mock_subscribe):
+        subscription = LogSubscription(MagicMock(), MagicMock(), max_batches=10)
+        subscription.close = MagicMock()
+        mock_subscribe.return_value = subscription
+        headers = signed_headers('GET', 'http://localhost/stream_logs?ip_address=1.1.1.1')
+
+        sent = run(call(http_scope('/stream_logs', 'ip_address=1.1.1.1', headers), disconnect_after=0.1))
+
+        self.assertEqual(sent[0]['status'], 200)
+        subscription.close.assert_called_once()
+
+    @patch('main.get_job')
+    def test_other_routes_served_by_flask(self, mock_get_job):
+        mock_get_job.return_value = None
+        headers = signed_headers('GET', 'http://localhost/jobs/job-1')
+
+        sent = run(call(http_scope('/jobs/job-1', headers=headers)))
+
+        self.assertEqual(sent[0]['status'], 404)
+
+
+class TestAsyncLogReader(unittest.TestCase):
+
+    def test_wakes_on_delivery_from_other_thread(self):
+        async def scenario():
+            subscription = LogSubscription(MagicMock(), MagicMock(), max_batches=10)
+            reader = AsyncLogReader(subscription, asyncio.get_running_loop())
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, lambda: loop.run_in_executor(None, subscription._deliver, ["line"]))
+            return await reader.get(timeout=5)
+
+        self.assertEqual(run(scenario()), ["line"])
+
+    def test_times_out(self):
+        async def scenario():
+            subscription = LogSubscription(MagicMock(), MagicMock(), max_batches=10)
+            reader = AsyncLogReader(subscription, asyncio.get_running_loop())
+            await reader.get(timeout=0.05)
+
+        with self.assertRaises(queue.Empty):
+            run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import unittest
+from typing import Optional
+from unittest.mock import patch, MagicMock
+
+os.environ.setdefault('APP_SECRET', 'test_secret')
+
+from main import app, APP_SECRET, setup_vps, provision_fleet, rolling_update  # noqa: E402
+from src.crypto.crypto_exceptions import PasswordHasherBusyError  # noqa: E402
+
+
+def signed_headers(method: str, url: str, body: Optional[dict] = None) -> dict:
+    timestamp = str(int(time.time()))
+    signature_data = f"{timestamp}{method}{url}"
+    if body:
+        signature_data += json.dumps(body, sort_keys=True)
+    signature_data = signature_data.replace(" ", "")
+    signature = hmac.new(APP_SECRET.encode('utf-8'), signature_data.encode('utf-8'), hashlib.sha256).hexdigest()
+    return {'X-Timestamp': timestamp, 'X-Signature': signature}
+
+
+JOB_ID = '0b6f2c3e-8a41-4c1e-9d2f-5e7a1b3c4d5e'
+OPERATOR_TOKEN = 'operator_secret'
+OPERATOR_HEADERS = {'Authorization': f'Bearer {OPERATOR_TOKEN}'}
+
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def get_signed(self, path: str, query_string: str):
+        url = f"http://localhost{path}?{query_string}"
+        return self.client.get(f"{path}?{query_string}", headers=signed_headers('GET', url))
+
+    @patch('main.get_instance_statuses')
+    def test_instance_status_maps_missing_to_errors(self, mock_get_statuses):
+        # Setup
+        mock_get_statuses.return_value = {'statuses': {'i-1': 'running'}, 'missing': ['i-2']}
+
+        # Execute
+        response = self.get_signed('/instance_status', 'params=instance_ids%255B%255D=i-1%26instance_ids%255B%255D=i-2')
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        mock_get_statuses.assert_called_once_with(['i-1', 'i-2'])
+        self.assertEqual(response.get_json(), {
+            'statuses': [{'instanceId': 'i-1', 'status': 'running'}],
+            'errors': [{'instanceId': 'i-2', 'error': 'Instance i-2 not found'}]
+        })
+
+    @patch('main.get_instance_statuses')
+    def test_instance_status_exception_reported_per_id(self, mock_get_statuses):
+        # Setup
+        mock_get_statuses.side_effect = Exception("AWS unavailable")
+
+        # Execute
+        response = self.get_signed('/instance_status', 'params=instance_ids%255B%255D=i-1%26instance_ids%255B%255D=i-2')
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {
+            'statuses': [],
+            'errors': [{'instanceId': 'i-1', 'error': 'AWS unavailable'},
+                       {'instanceId': 'i-2', 'error': 'AWS unavailable'}]
+        })
+
+    @patch('main.get_instance_statuses')
+    def test_instance_status_without_ids(self, mock_get_statuses):
+        # Execute
+        response = self.get_signed('/instance_status', 'params=')
+
+        # Assert
+        self.assertEqual(response.status_code, 400)
+        mock_get_statuses.assert_not_called()
+
+
+    @patch('main.get_job')
+    def test_job_status_found(self, mock_get_job):
+        # Setup
+        mock_get_job.return_value = {'id': JOB_ID, 'type': 'vps_setup', 'status': 'running'}
+
+        # Execute
+        response = self.client.get(f'/jobs/{JOB_ID}', headers=signed_headers('GET', f'http://localhost/jobs/{JOB_ID}'))
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'running')
+        mock_get_job.assert_called_once_with(JOB_ID)
+
+    @patch('main.get_job')
+    def test_job_status_not_found(self, mock_get_job):
+        # Setup
+        mock_get_job.return_value = None
+
+        # Execute
+        response = self.client.get(f'/jobs/{JOB_ID}', headers=signed_headers('GET', f'http://localhost/jobs/{JOB_ID}'))
+
+        # Assert
+        self.assertEqual(response.status_code, 404)
+
+    @patch('main.fetch_user_projects_page')
+    @patch('main.fetch_user_projects_version')
+    def test_user_projects_page_sets_etag(self, mock_version, mock_page):
+        # Setup
+        mock_version.return_value = '1-3-2024-01-01T00:00:00-None'
+        mock_page.return_value = ([{'id': 3, 'network': 'mainnet'}], None)
+
+        # Execute
+        response = self.get_signed('/user_projects/page', 'user_id=5&fields=network')
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['data'], [{'id': 3, 'network': 'mainnet'}])
+        self.assertIsNone(response.get_json()['next'])
+        self.assertIsNotNone(response.headers.get('ETag'))
+        mock_page.assert_called_once_with(5, ['network'], 0, 50)
+
+    @patch('main.fetch_user_projects_page')
+    @patch('main.fetch_user_projects_version')
+    def test_user_projects_page_not_modified(self, mock_version, mock_page):
+        # Setup
+        mock_version.return_value = '1-3-2024-01-01T00:00:00-None'
+        mock_page.return_value = ([{'id': 3, 'network': 'mainnet'}], None)
+        etag = self.get_signed('/user_projects/page', 'user_id=5&fields=network').headers['ETag']
+        url = 'http://localhost/user_projects/page?user_id=5&fields=network'
+
+        # Execute
+        response = self.client.get('/user_projects/page?user_id=5&fields=network',
+                                   headers={**signed_headers('GET', url), 'If-None-Match': etag})
+
+        # Assert
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        mock_page.assert_called_once()
+
+    @patch('main.fetch_user_projects_version')
+    def test_user_projects_page_rejects_unknown_field(self, mock_version):
+        response = self.get_signed('/user_projects/page', 'user_id=5&fields=private_key')
+
+        self.assertEqual(response.status_code, 400)
+        mock_version.assert_not_called()
+
+    @patch('main.login_user')
+    def test_login_busy_returns_503(self, mock_login_user):
+        # Setup
+        mock_login_user.side_effect = PasswordHasherBusyError("32 password hashes are already pending")
+        body = {'email': 'test@example.com', 'password': 'password123'}
+
+        # Execute
+        response = self.client.post('/login', json=body, headers=signed_headers('POST', 'http://localhost/login', body))
+
+        # Assert
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+    @patch('main.get_job')
+    def test_job_status_malformed_id_not_found(self, mock_get_job):
+        # Execute
+        response = self.client.get('/jobs/not-a-uuid', headers=signed_headers('GET', 'http://localhost/jobs/not-a-uuid'))
+
+        # Assert
+        self.assertEqual(response.status_code, 404)
+        mock_get_job.assert_not_called()
+
+    @patch('main.get_job_queue')
+    def test_vps_setup_returns_job_id(self, mock_get_job_queue):
+        # Setup
+        mock_get_job_queue.return_value.submit.return_value = 'job-2'
+        body = {'user_project_id': 7}
+        headers = signed_headers('POST', 'http://localhost/vps_setup', body)
+
+        # Execute
+        response = self.client.post('/vps_setup', json=body, headers=headers)
+
+        # Assert
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['job_id'], 'job-2')
+        mock_get_job_queue.return_value.submit.assert_called_once_with('vps_setup', setup_vps, 7)
+
+    @patch('main.OPERATOR_TOKEN', OPERATOR_TOKEN)
+    @patch('main.get_job_queue')
+    def test_fleet_setup_returns_job_id(self, mock_get_job_queue):
+        # Setup
+        mock_get_job_queue.return_value.submit_with_progress.return_value = 'job-3'
+        body = {'user_project_ids': [7, 8], 'fail_fast': True, 'max_workers': 2}
+        headers = {**signed_headers('POST', 'http://localhost/fleet_setup', body), **OPERATOR_HEADERS}
+
+        # Execute
+        response = self.client.post('/fleet_setup', json=body, headers=headers)
+
+        # Assert
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['job_id'], 'job-3')
+        mock_get_job_queue.return_value.submit_with_progress.assert_called_once_with(
+            'fleet_setup', provision_fleet, [7, 8], max_workers=2, fail_fast=True)
+
+    @patch('main.OPERATOR_TOKEN', OPERATOR_TOKEN)
+    @patch('main.get_job_queue')
+    def test_fleet_setup_requires_ids(self, mock_get_job_queue):
+        body = {'user_project_ids': []}
+        headers = {**signed_headers('POST', 'http://localhost/fleet_setup', body), **OPERATOR_HEADERS}
+
+        response = self.client.post('/fleet_setup', json=body, headers=headers)
+
+        self.assertEqual(response.status_code, 400)
+        mock_get_job_queue.return_value.submit_with_progress.assert_not_called()
+
+    @patch('main.OPERATOR_TOKEN', OPERATOR_TOKEN)
+    @patch('main.get_job_queue')
+    def test_rolling_update_returns_job_id(self, mock_get_job_queue):
+        # Setup
+        mock_get_job_queue.return_value.submit_with_progress.return_value = 'job-4'
+        body = {'project_id': 1, 'image': 'elixirprotocol/validator:v4', 'batch_size': 3}
+        headers = {**signed_headers('POST', 'http://localhost/rolling_update', body), **OPERATOR_HEADERS}
+
+        # Execute
+        response = self.client.post('/rolling_update', json=body, headers=headers)
+
+        # Assert
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['job_id'], 'job-4')
+        mock_get_job_queue.return_value.submit_with_progress.assert_called_once_with(
+            'rolling_update', rolling_update, 1, 'elixirprotocol/validator:v4', batch_size=3, max_failures=0)
+
+    @patch('main.OPERATOR_TOKEN', OPERATOR_TOKEN)
+    @patch('main.get_job_queue')
+    def test_rolling_update_rejects_image_outside_allow_list(self, mock_get_job_queue):
+        body = {'project_id': 1, 'image': 'attacker/validator:v4'}
+        headers = {**signed_headers('POST', 'http://localhost/rolling_update', body), **OPERATOR_HEADERS}
+
+        response = self.client.post('/rolling_update', json=body, headers=headers)
+
+        self.assertEqual(response.status_code, 400)
+        mock_get_job_queue.return_value.submit_with_progress.assert_not_called()
+
+    @patch('main.OPERATOR_TOKEN', OPERATOR_TOKEN)
+    @patch('main.get_job_queue')
+    def test_operator_routes_require_operator_token(self, mock_get_job_queue):
+        body = {'project_id': 1, 'image': 'elixirprotocol/validator:v4'}
+        for extra_headers in ({}, {'Authorization': 'Bearer wrong'}, {'Authorization': APP_SECRET}):
+            headers = {**signed_headers('POST', 'http://localhost/rolling_update', body), **extra_headers}
+
+            response = self.client.post('/rolling_update', json=body, headers=headers)
+
+            self.assertEqual(response.status_code, 403)
+        mock_get_job_queue.return_value.submit_with_progress.assert_not_called()
+
+    @patch('main.OPERATOR_TOKEN', None)
+    @patch('main.get_job_queue')
+    def test_operator_routes_disabled_without_operator_token(self, mock_get_job_queue):
+        body = {'user_project_ids': [7]}
+        headers = {**signed_headers('POST', 'http://localhost/fleet_setup', body), **OPERATOR_HEADERS}
+
+        response = self.client.post('/fleet_setup', json=body, headers=headers)
+
+        self.assertEqual(response.status_code, 403)
+        mock_get_job_queue.return_value.submit_with_progress.assert_not_called()
+
+    @patch('main.sse_log_frames')
+    @patch('main.subscribe_vps_logs')
+    def test_stream_logs_sends_batched_events(self, mock_subscribe, mock_frames):
+        # Setup
+        subscription = MagicMock()
+        mock_subscribe.return_value = subscription
+        mock_frames.return_value = iter(["data: a\ndata: b\n\n"])
+
+        # Execute
+        response = self.get_signed('/stream_logs', 'ip_address=1.1.1.1')
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(as_text=True), "data: a\ndata: b\n\ndata: Stream Ended\n\n")
+        mock_subscribe.assert_called_once_with(instanceIp='1.1.1.1', pem=True)
+        subscription.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from src.aws.aws_clients import get_client, clear_clients
+
+
+class TestAWSClients(unittest.TestCase):
+
+    def setUp(self):
+        clear_clients()
+
+    def tearDown(self):
+        clear_clients()
+
+    @patch('src.aws.aws_clients.boto3.session.Session')
+    def test_same_key_returns_same_client(self, mock_session):
+        # Setup
+        mock_session.return_value.client.side_effect = lambda *args, **kwargs: MagicMock()
+
+        # Execute
+        first = get_client('ec2', region_name='eu-central-1', aws_access_key_id='id', aws_secret_access_key='secret')
+        second = get_client('ec2', region_name='eu-central-1', aws_access_key_id='id', aws_secret_access_key='secret')
+
+        # Assert
+        self.assertIs(first, second)
+        mock_session.assert_called_once_with(aws_access_key_id='id', aws_secret_access_key='secret')
+        mock_session.return_value.client.assert_called_once()
+
+    @patch('src.aws.aws_clients.boto3.session.Session')
+    def test_different_keys_return_distinct_clients(self, mock_session):
+        # Setup
+        mock_session.return_value.client.side_effect = lambda *args, **kwargs: MagicMock()
+
+        # Execute
+        base = get_client('ec2', region_name='eu-central-1', aws_access_key_id='id', aws_secret_access_key='secret')
+        other_region = get_client('ec2', region_name='us-east-1', aws_access_key_id='id',
+                                  aws_secret_access_key='secret')
+        other_service = get_client('s3', region_name='eu-central-1', aws_access_key_id='id',
+                                   aws_secret_access_key='secret')
+        other_credentials = get_client('ec2', region_name='eu-central-1', aws_access_key_id='other',
+                                       aws_secret_access_key='secret')
+
+        # Assert
+        clients = [base, other_region, other_service, other_credentials]
+        self.assertEqual(len({id(client) for client in clients}), 4)
+        self.assertEqual(mock_session.call_count, 2)
+
+    @patch('src.aws.aws_clients.boto3.session.Session')
+    def test_clear_clients(self, mock_session):
+        # Setup
+        mock_session.side_effect = lambda *args, **kwargs: MagicMock()
+        first = get_client('ec2', region_name='eu-central-1')
+
+        # Execute
+        clear_clients()
+        second = get_client('ec2', region_name='eu-central-1')
+
+        # Assert
+        self.assertIsNot(first, second)
+        self.assertEqual(mock_session.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
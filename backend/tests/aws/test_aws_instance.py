@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from src.aws.aws_instance import get_instance_statuses, get_public_ip, DESCRIBE_INSTANCES_FILTER_LIMIT
+
+
+def _page(*instances):
+    return {'Reservations': [{'Instances': [{'InstanceId': instance_id, 'State': {'Name': state}}
+                                            for instance_id, state in instances]}]}
+
+
+class TestAWSInstance(unittest.TestCase):
+
+    @patch('src.aws.aws_instance.get_client')
+    def test_get_instance_statuses_success(self, mock_get_client):
+        # Setup
+        paginator = mock_get_client.return_value.get_paginator.return_value
+        paginator.paginate.return_value = [_page(('i-1', 'running')), _page(('i-2', 'stopped'))]
+
+        # Execute
+        result = get_instance_statuses(['i-1', 'i-2'])
+
+        # Assert
+        self.assertEqual(result, {'statuses': {'i-1': 'running', 'i-2': 'stopped'}, 'missing': []})
+        mock_get_client.return_value.get_paginator.assert_called_once_with('describe_instances')
+        paginator.paginate.assert_called_once()
+        filters = paginator.paginate.call_args[1]['Filters']
+        self.assertEqual(filters, [{'Name': 'instance-id', 'Values': ['i-1', 'i-2']}])
+
+    @patch('src.aws.aws_instance.get_client')
+    def test_get_instance_statuses_deduplicates_ids(self, mock_get_client):
+        # Setup
+        paginator = mock_get_client.return_value.get_paginator.return_value
+        paginator.paginate.return_value = [_page(('i-1', 'running'))]
+
+        # Execute
+        result = get_instance_statuses(['i-1', '', 'i-1'])
+
+        # Assert
+        self.assertEqual(result, {'statuses': {'i-1': 'running'}, 'missing': []})
+        self.assertEqual(paginator.paginate.call_args[1]['Filters'][0]['Values'], ['i-1'])
+
+    @patch('src.aws.aws_instance.get_client')
+    def test_get_instance_statuses_reports_missing(self, mock_get_client):
+        # Setup
+        paginator = mock_get_client.return_value.get_paginator.return_value
+        paginator.paginate.return_value = [_page(('i-1', 'running'))]
+
+        # Execute
+        result = get_instance_statuses(['i-1', 'i-unknown'])
+
+        # Assert
+        self.assertEqual(result['statuses'], {'i-1': 'running'})
+        self.assertEqual(result['missing'], ['i-unknown'])
+
+    @patch('src.aws.aws_instance.get_client')
+    def test_get_instance_statuses_chunks_ids(self, mock_get_client):
+        # Setup
+        instance_ids = [f'i-{n}' for n in range(DESCRIBE_INSTANCES_FILTER_LIMIT + 50)]
+        paginator = mock_get_client.return_value.get_paginator.return_value
+        paginator.paginate.side_effect = lambda Filters, **kwargs: [
+            _page(*[(instance_id, 'running') for instance_id in Filters[0]['Values']])]
+
+        # Execute
+        result = get_instance_statuses(instance_ids)
+
+        # Assert
+        self.assertEqual(paginator.paginate.call_count, 2)
+        chunks = [call[1]['Filters'][0]['Values'] for call in paginator.paginate.call_args_list]
+        self.assertEqual(len(chunks[0]), DESCRIBE_INSTANCES_FILTER_LIMIT)
+        self.assertEqual(len(chunks[1]), 50)
+        self.assertEqual(len(result['statuses']), len(instance_ids))
+        self.assertEqual(result['missing'], [])
+        mock_get_client.assert_called_once()
+
+    @patch('src.aws.aws_instance.get_client')
+    def test_get_instance_statuses_empty(self, mock_get_client):
+        # Execute
+        result = get_instance_statuses([])
+
+        # Assert
+        self.assertEqual(result, {'statuses': {}, 'missing': []})
+        mock_get_client.assert_not_called()
+
+    @patch('src.aws.aws_instance.get_client')
+    def test_get_public_ip_uses_shared_client(self, mock_get_client):
+        # Setup
+        mock_get_client.return_value.describe_instances.return_value = {
+            'Reservations': [{'Instances': [{'InstanceId': 'i-1', 'PublicIpAddress': '1.2.3.4'}]}]}
+
+        # Execute
+        result = get_public_ip('i-1')
+
+        # Assert
+        self.assertEqual(result, '1.2.3.4')
+        mock_get_client.return_value.describe_instances.assert_called_once_with(InstanceIds=['i-1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,62 +1,171 @@
 import unittest
-from unittest.mock import patch, MagicMock
-from src.contabo.batch_process import batch_check_instance_status, initialize_scheduler
+import threading
+from unittest.mock import patch, MagicMock, call
+from src.contabo.batch_process import batch_check_instance_status, initialize_scheduler, run_concurrently
 from src.contabo.contabo_exceptions import BatchProcessError
 
 
 class TestBatchProcess(unittest.TestCase):
 
-    @patch('src.contabo.batch_process.fetch_pending_instances')
+    @patch('src.contabo.batch_process.apply_instance_states')
+    @patch('src.contabo.batch_process.record_provisioning_failure')
+    @patch('src.contabo.batch_process.set_provisioning_state')
+    @patch('src.contabo.batch_process.claim_provisioning_work')
     @patch('src.contabo.batch_process.check_instance_status')
     @patch('src.contabo.batch_process.setup_vps')
-    def test_batch_check_instance_status_success(self, mock_setup_vps, mock_check_status, mock_fetch_instances):
+    def test_batch_check_instance_status_success(self, mock_setup_vps, mock_check_status, mock_claim, mock_set_state,
+                                                 mock_record_failure, mock_apply_states):
         # Setup
-        mock_fetch_instances.return_value = [
-            {'instance_id': '1', 'user_project_id': '101'},
-            {'instance_id': '2', 'user_project_id': '102'}
-        ]
-        mock_check_status.side_effect = [
-            {'status': 'running'},
-            {'status': 'pending'}
+        mock_claim.return_value = [
+            {'instance_id': '1', 'user_project_id': 101, 'state': 'pending'},
+            {'instance_id': '2', 'user_project_id': 102, 'state': 'pending'}
         ]
+        statuses = {'1': {'status': 'running', 'ip_address': '1.1.1.1'}, '2': {'status': 'pending', 'ip_address': None}}
+        mock_check_status.side_effect = lambda instance_id, save_ip: statuses[instance_id]
 
         # Execute
         result = batch_check_instance_status()
 
         # Assert
-        self.assertEqual(result, {"checked_instances": 2, "running_instances": 1})
-        mock_fetch_instances.assert_called_once()
+        self.assertEqual(result, {"checked_instances": 2, "running_instances": 1, "failed_status_checks": 0,
+                                  "completed_setups": 1, "failed_setups": 0})
+        mock_claim.assert_called_once()
         self.assertEqual(mock_check_status.call_count, 2)
         mock_setup_vps.assert_called_once_with(101)
-
-    @patch('src.contabo.batch_process.fetch_pending_instances')
+        mock_check_status.assert_any_call('1', save_ip=False)
+        mock_set_state.assert_has_calls([call([102], 'pending'), call([101], 'configured')])
+        self.assertEqual(list(mock_apply_states.call_args[0][0]), [('1', '1.1.1.1', 'running')])
+        mock_record_failure.assert_not_called()
+
+    @patch('src.contabo.batch_process.apply_instance_states')
+    @patch('src.contabo.batch_process.record_provisioning_failure')
+    @patch('src.contabo.batch_process.set_provisioning_state')
+    @patch('src.contabo.batch_process.claim_provisioning_work')
     @patch('src.contabo.batch_process.check_instance_status')
     @patch('src.contabo.batch_process.setup_vps')
-    def test_batch_check_instance_status_with_errors(self, mock_setup_vps, mock_check_status, mock_fetch_instances):
+    def test_batch_check_instance_status_with_errors(self, mock_setup_vps, mock_check_status, mock_claim,
+                                                     mock_set_state, mock_record_failure, mock_apply_states):
         # Setup
-        mock_fetch_instances.return_value = [
-            {'instance_id': '1', 'user_project_id': '101'},
-            {'instance_id': '2', 'user_project_id': '102'}
-        ]
-        mock_check_status.side_effect = [
-            Exception("API Error"),
-            {'status': 'running'}
+        mock_claim.return_value = [
+            {'instance_id': '1', 'user_project_id': 101, 'state': 'pending'},
+            {'instance_id': '2', 'user_project_id': 102, 'state': 'pending'}
         ]
+        statuses = {'1': Exception("API Error"), '2': {'status': 'running', 'ip_address': '2.2.2.2'}}
+
+        def check_status(instance_id, save_ip):
+            if isinstance(statuses[instance_id], Exception):
+                raise statuses[instance_id]
+            return statuses[instance_id]
+
+        mock_check_status.side_effect = check_status
         mock_setup_vps.side_effect = Exception("Setup Error")
 
         # Execute
-        result = batch_check_instance_status()
+        result = batch_check_instance_status(max_setup_attempts=3)
 
         # Assert
-        self.assertEqual(result, {"checked_instances": 2, "running_instances": 1})
-        mock_fetch_instances.assert_called_once()
+        self.assertEqual(result, {"checked_instances": 2, "running_instances": 1, "failed_status_checks": 1,
+                                  "completed_setups": 0, "failed_setups": 1})
         self.assertEqual(mock_check_status.call_count, 2)
         mock_setup_vps.assert_called_once_with(102)
+        mock_set_state.assert_any_call([101], 'pending')
+        mock_record_failure.assert_called_once_with(102, 3, release=True)
+
+    @patch('src.contabo.batch_process.apply_instance_states')
+    @patch('src.contabo.batch_process.record_provisioning_failure')
+    @patch('src.contabo.batch_process.set_provisioning_state')
+    @patch('src.contabo.batch_process.claim_provisioning_work')
+    @patch('src.contabo.batch_process.check_instance_status')
+    @patch('src.contabo.batch_process.setup_vps')
+    def test_batch_check_instance_status_retries_running_setup(self, mock_setup_vps, mock_check_status, mock_claim,
+                                                               mock_set_state, mock_record_failure, mock_apply_states):
+        # Setup, the instance was already reported running but its setup failed in an earlier run
+        mock_claim.return_value = [{'instance_id': '1', 'user_project_id': 101, 'state': 'running'}]
+
+        # Execute
+        result = batch_check_instance_status(claim_size=10, lease_seconds=600)
+
+        # Assert
+        mock_claim.assert_called_once_with(10, 600)
+        mock_check_status.assert_not_called()
+        mock_setup_vps.assert_called_once_with(101)
+        mock_set_state.assert_called_with([101], 'configured')
+        self.assertEqual(result["completed_setups"], 1)
+
+    @patch('src.contabo.batch_process.apply_instance_states')
+    @patch('src.contabo.batch_process.record_provisioning_failure')
+    @patch('src.contabo.batch_process.set_provisioning_state')
+    @patch('src.contabo.batch_process.claim_provisioning_work')
+    @patch('src.contabo.batch_process.check_instance_status')
+    @patch('src.contabo.batch_process.setup_vps')
+    def test_batch_check_instance_status_runs_concurrently(self, mock_setup_vps, mock_check_status, mock_claim,
+                                                          mock_set_state, mock_record_failure, mock_apply_states):
+        # Setup
+        mock_claim.return_value = [{'instance_id': str(n), 'user_project_id': 100 + n, 'state': 'pending'}
+                                   for n in range(4)]
+        barrier = threading.Barrier(4, timeout=5)
+
+        def check_status(instance_id, save_ip):
+            # Only returns once all four checks are in flight at the same time
+            barrier.wait()
+            return {'status': 'running', 'ip_address': f'10.0.0.{instance_id}'}
+
+        mock_check_status.side_effect = check_status
+
+        # Execute
+        result = batch_check_instance_status(status_workers=4, setup_workers=2)
+
+        # Assert
+        self.assertEqual(result["running_instances"], 4)
+        self.assertEqual(result["completed_setups"], 4)
+        self.assertEqual(mock_setup_vps.call_count, 4)
+
+    def test_run_concurrently_times_out_slow_tasks(self):
+        # Setup
+        release = threading.Event()
+
+        def task(item):
+            if item == 'slow':
+                release.wait(5)
+            return item.upper()
+
+        # Execute
+        results, errors, still_running = run_concurrently(task, ['fast', 'slow'], max_workers=2, task_timeout=0.2,
+                                                          name='test')
+        release.set()
+
+        # Assert
+        self.assertEqual(results, {'fast': 'FAST'})
+        self.assertIn('slow', errors)
+        self.assertEqual(still_running, {'slow'})
+
+    @patch('src.contabo.batch_process.apply_instance_states')
+    @patch('src.contabo.batch_process.record_provisioning_failure')
+    @patch('src.contabo.batch_process.set_provisioning_state')
+    @patch('src.contabo.batch_process.claim_provisioning_work')
+    @patch('src.contabo.batch_process.check_instance_status')
+    @patch('src.contabo.batch_process.setup_vps')
+    def test_batch_check_instance_status_keeps_claim_of_timed_out_setup(self, mock_setup_vps, mock_check_status,
+                                                                       mock_claim, mock_set_state, mock_record_failure,
+                                                                       mock_apply_states):
+        # Setup
+        mock_claim.return_value = [{'instance_id': '1', 'user_project_id': 101, 'state': 'running'}]
+        release = threading.Event()
+        mock_setup_vps.side_effect = lambda user_project_id: release.wait(5)
+
+        # Execute
+        result = batch_check_instance_status(setup_timeout=0.2, max_setup_attempts=3)
+        release.set()
+
+        # Assert
+        self.assertEqual(result["failed_setups"], 1)
+        mock_record_failure.assert_called_once_with(101, 3, release=False)
+        mock_set_state.assert_called_with([], 'configured')
 
-    @patch('src.contabo.batch_process.fetch_pending_instances')
-    def test_batch_check_instance_status_fail(self, mock_fetch_instances):
+    @patch('src.contabo.batch_process.claim_provisioning_work')
+    def test_batch_check_instance_status_fail(self, mock_claim):
         # Setup
-        mock_fetch_instances.side_effect = Exception("Database Error")
+        mock_claim.side_effect = Exception("Database Error")
 
         # Execute and Assert
         with self.assertRaises(BatchProcessError):
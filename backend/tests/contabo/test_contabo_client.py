@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import requests
+from src.contabo.contabo_client import ContaboClient, get_contabo_client
+from src.contabo.contabo_exceptions import ContaboAuthError
+
+
+class TestContaboClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = ContaboClient(pool_size=4, connect_timeout=2, read_timeout=10)
+        self.client.session = MagicMock()
+
+    def test_session_uses_connection_pool(self):
+        client = ContaboClient(pool_size=4)
+
+        adapter = client.session.get_adapter('https://api.contabo.com')
+
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter._pool_connections, 4)
+
+    def test_get_access_token_success(self):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {'access_token': 'test_token'}
+        self.client.session.post.return_value = mock_response
+
+        token = self.client.get_access_token()
+
+        self.assertEqual(token, 'test_token')
+        self.client.session.post.assert_called_once()
+        self.assertEqual(self.client.session.post.call_args[1]['timeout'], (2, 10))
+
+    def test_get_access_token_cached(self):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {'access_token': 'test_token', 'expires_in': 300}
+        self.client.session.post.return_value = mock_response
+
+        first = self.client.get_access_token()
+        second = self.client.get_access_token()
+
+        self.assertEqual(first, 'test_token')
+        self.assertEqual(second, 'test_token')
+        self.client.session.post.assert_called_once()
+
+    def test_get_access_token_failure(self):
+        self.client.session.post.side_effect = requests.exceptions.RequestException("API Error")
+
+        with self.assertRaises(ContaboAuthError):
+            self.client.get_access_token()
+
+        self.client.session.post.assert_called_once()
+
+    def test_get_access_token_missing_in_response(self):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {}
+        self.client.session.post.return_value = mock_response
+
+        with self.assertRaises(ContaboAuthError):
+            self.client.get_access_token()
+
+    def test_request_applies_default_timeout(self):
+        self.client.fetch_access_token = MagicMock(return_value={'access_token': 'test_token', 'expires_in': 300})
+        self.client.session.request.return_value = MagicMock(status_code=200)
+
+        self.client.get('https://api.contabo.com/v1/compute/instances/1', headers={'x-request-id': '1'})
+
+        kwargs = self.client.session.request.call_args[1]
+        self.assertEqual(kwargs['timeout'], (2, 10))
+        self.assertEqual(kwargs['headers'], {'x-request-id': '1', 'Authorization': 'Bearer test_token'})
+
+    def test_request_refreshes_token_on_401(self):
+        self.client.fetch_access_token = MagicMock(side_effect=[
+            {'access_token': 'expired_token', 'expires_in': 300},
+            {'access_token': 'fresh_token', 'expires_in': 300}])
+        unauthorized = MagicMock(status_code=401)
+        ok = MagicMock(status_code=200)
+        self.client.session.request.side_effect = [unauthorized, ok]
+
+        response = self.client.get('https://api.contabo.com/v1/compute/instances/1')
+
+        self.assertIs(response, ok)
+        self.assertEqual(self.client.fetch_access_token.call_count, 2)
+        self.assertEqual(self.client.session.request.call_args[1]['headers']['Authorization'], 'Bearer fresh_token')
+
+    def test_request_auth_error_propagates(self):
+        self.client.fetch_access_token = MagicMock(side_effect=ContaboAuthError("Auth down"))
+
+        with self.assertRaises(ContaboAuthError):
+            self.client.post('https://api.contabo.com/v1/compute/instances')
+
+        self.client.session.request.assert_not_called()
+
+    @patch('src.contabo.contabo_client._client', None)
+    def test_get_contabo_client_is_shared(self):
+        self.assertIs(get_contabo_client(), get_contabo_client())
+
+
+if __name__ == '__main__':
+    unittest.main()
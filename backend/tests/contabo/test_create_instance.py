@@ -2,6 +2,7 @@ import unittest
 from unittest.mock import patch, MagicMock
 import requests
 import queue
+from src.contabo.contabo_client import ContaboClient
 from src.contabo.create_instance import (
     get_access_token, create_instance, setup_instance_async, setup_instance,
     check_instance_status, cancel_instance, ContaboAuthError, ContaboInstanceCreationError,
@@ -11,39 +12,39 @@ from src.contabo.create_instance import (
 
 class TestCreateInstance(unittest.TestCase):
 
-    @patch('src.contabo.create_instance.requests.post')
-    def test_get_access_token_success(self, mock_post):
-        mock_response = MagicMock()
-        mock_response.json.return_value = {'access_token': 'test_token'}
-        mock_post.return_value = mock_response
+    def setUp(self):
+        self.client = ContaboClient()
+        self.client.session = MagicMock()
+        self.client.fetch_access_token = MagicMock(return_value={'access_token': 'test_token', 'expires_in': 300})
+        patcher = patch('src.contabo.create_instance.get_contabo_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
+    def test_get_access_token_delegates_to_client(self):
         token = get_access_token()
 
         self.assertEqual(token, 'test_token')
-        mock_post.assert_called_once()
+        self.client.fetch_access_token.assert_called_once()
 
-    @patch('src.contabo.create_instance.requests.post')
-    def test_get_access_token_failure(self, mock_post):
-        mock_post.side_effect = requests.exceptions.RequestException("API Error")
+    def test_check_instance_status_auth_error_not_wrapped(self):
+        self.client.fetch_access_token.side_effect = ContaboAuthError("Auth down")
 
         with self.assertRaises(ContaboAuthError):
-            get_access_token()
+            check_instance_status.__wrapped__(123)
+
+        self.client.session.request.assert_not_called()
 
-    @patch('src.contabo.create_instance.get_access_token')
-    @patch('src.contabo.create_instance.requests.post')
     @patch('src.contabo.create_instance.generate_password_and_key')
     @patch('src.contabo.create_instance.create_user_project')
     @patch('src.contabo.create_instance.save_encrypted_password')
-    def test_create_instance_success(self, mock_save_password, mock_create_project, mock_generate_password, mock_post,
-                                     mock_get_token):
-        mock_get_token.return_value = 'test_token'
+    def test_create_instance_success(self, mock_save_password, mock_create_project, mock_generate_password):
         mock_generate_password.return_value = ('password', 'key')
         mock_create_project.return_value = 'user_project_id'
         mock_save_password.return_value = True
 
-        mock_response = MagicMock()
+        mock_response = MagicMock(status_code=200)
         mock_response.json.return_value = {'data': [{'instanceId': 'test_instance_id'}]}
-        mock_post.return_value = mock_response
+        self.client.session.request.return_value = mock_response
 
         data = {
             'imageId': 'test_image',
@@ -58,15 +59,13 @@ class TestCreateInstance(unittest.TestCase):
         result = create_instance(data)
 
         self.assertEqual(result, {'user_project_id': 'user_project_id', 'instance_id': 'test_instance_id'})
-        mock_post.assert_called_once()
-        mock_create_project.assert_called_once()
+        self.client.session.request.assert_called_once()
+        mock_create_project.assert_called_once_with(user_id='test_user', project_id='test_project',
+                                                    instance_id='test_instance_id', provisioning_state='pending')
         mock_save_password.assert_called_once()
 
-    @patch('src.contabo.create_instance.get_access_token')
-    @patch('src.contabo.create_instance.requests.post')
-    def test_create_instance_failure(self, mock_post, mock_get_token):
-        mock_get_token.return_value = 'test_token'
-        mock_post.side_effect = requests.exceptions.RequestException("API Error")
+    def test_create_instance_failure(self):
+        self.client.session.request.side_effect = requests.exceptions.RequestException("API Error")
 
         data = {
             'imageId': 'test_image',
@@ -93,56 +92,52 @@ class TestCreateInstance(unittest.TestCase):
             mock_create_instance.assert_called_once_with(data)
             mock_queue.put.assert_called_once_with({'instance_id': 'test_id', 'user_project_id': 'test_project_id'})
 
-    @patch('src.contabo.create_instance.threading.Thread')
-    def test_setup_instance_success(self, mock_thread):
-        mock_queue = MagicMock(spec=queue.Queue)
-        mock_queue.get.return_value = {'instance_id': 'test_id', 'user_project_id': 'test_project_id'}
-
-        mock_thread_instance = MagicMock()
-        mock_thread.return_value = mock_thread_instance
+    @patch('src.contabo.create_instance.setup_instance_async')
+    def test_setup_instance_success(self, mock_setup_async):
+        mock_setup_async.side_effect = lambda data, result_queue: result_queue.put(
+            {'instance_id': 'test_id', 'user_project_id': 'test_project_id'})
 
         data = {'test': 'data'}
         result = setup_instance(data)
 
         self.assertEqual(result, {'instance_id': 'test_id', 'user_project_id': 'test_project_id'})
-        mock_thread.assert_called_once()
-        mock_thread_instance.start.assert_called_once()
-        mock_thread_instance.join.assert_called_once()
+        mock_setup_async.assert_called_once()
 
-    @patch('src.contabo.create_instance.get_access_token')
-    @patch('src.contabo.create_instance.requests.get')
     @patch('src.contabo.create_instance.update_instance_ip')
-    def test_check_instance_status_running(self, mock_update_ip, mock_get, mock_get_token):
-        mock_get_token.return_value = 'test_token'
-        mock_response = MagicMock()
+    def test_check_instance_status_running(self, mock_update_ip):
+        mock_response = MagicMock(status_code=200)
         mock_response.json.return_value = {'data': [{'status': 'running', 'ipConfig': {'v4': {'ip': '1.1.1.1'}}}]}
-        mock_get.return_value = mock_response
+        self.client.session.request.return_value = mock_response
         mock_update_ip.return_value = True
 
         result = check_instance_status(123)
 
         self.assertEqual(result, {'status': 'running', 'ip_address': '1.1.1.1'})
-        mock_get.assert_called_once()
+        self.client.session.request.assert_called_once()
         mock_update_ip.assert_called_once_with(instance_id=123, ip_address='1.1.1.1')
 
-    @patch('src.contabo.create_instance.get_access_token')
-    @patch('src.contabo.create_instance.requests.post')
-    def test_cancel_instance_success(self, mock_post, mock_get_token):
-        mock_get_token.return_value = 'test_token'
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_post.return_value = mock_response
+    @patch('src.contabo.create_instance.update_instance_ip')
+    def test_check_instance_status_without_saving_ip(self, mock_update_ip):
+        mock_response = MagicMock(status_code=200)
+        mock_response.json.return_value = {'data': [{'status': 'running', 'ipConfig': {'v4': {'ip': '1.1.1.1'}}}]}
+        self.client.session.request.return_value = mock_response
+
+        result = check_instance_status(123, save_ip=False)
+
+        self.assertEqual(result, {'status': 'running', 'ip_address': '1.1.1.1'})
+        mock_update_ip.assert_not_called()
+
+    def test_cancel_instance_success(self):
+        mock_response = MagicMock(status_code=200)
+        self.client.session.request.return_value = mock_response
 
         result = cancel_instance(123)
 
         self.assertTrue(result)
-        mock_post.assert_called_once()
+        self.client.session.request.assert_called_once()
 
-    @patch('src.contabo.create_instance.get_access_token')
-    @patch('src.contabo.create_instance.requests.post')
-    def test_cancel_instance_failure(self, mock_post, mock_get_token):
-        mock_get_token.return_value = 'test_token'
-        mock_post.side_effect = requests.exceptions.RequestException("API Error")
+    def test_cancel_instance_failure(self):
+        self.client.session.request.side_effect = requests.exceptions.RequestException("API Error")
 
         with self.assertRaises(InstanceCancellationError):
             cancel_instance(123)
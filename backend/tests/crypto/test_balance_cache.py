@@ -0,0 +1,159 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from src.crypto.balance_cache import BalanceCache
+from src.crypto.crypto_exceptions import EthereumBalanceCheckError
+
+
+def run(coroutine):
+    # Own loop rather than asyncio.run, which unsets the current loop other tests rely on
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeProvider:
+    """Balance fetcher recording each request, every balance is the number of requests made so far."""
+
+    def __init__(self, delay=0.0, error=None):
+        self.requests = []
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self, network, addresses):
+        self.requests.append((network, list(addresses)))
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {address: float(len(self.requests)) for address in addresses}
+
+
+class TestBalanceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch('src.crypto.balance_cache.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.provider = FakeProvider()
+        self.cache = BalanceCache(self.provider, ttl=30, max_stale=300)
+
+    def test_fresh_balance_served_from_cache(self):
+        async def scenario():
+            first = await self.cache.get_balances('mainnet', ['0xa', '0xb'])
+            self.clock.now = 29
+            second = await self.cache.get_balances('mainnet', ['0xa', '0xb'])
+            return first, second
+
+        first, second = run(scenario())
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.provider.requests), 1)
+        self.assertEqual(self.cache.stats()['hits'], 2)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_only_missing_addresses_requested(self):
+        async def scenario():
+            await self.cache.get_balances('mainnet', ['0xa'])
+            return await self.cache.get_balances('mainnet', ['0xa', '0xb'])
+
+        balances = run(scenario())
+
+        self.assertEqual(self.provider.requests, [('mainnet', ['0xa']), ('mainnet', ['0xb'])])
+        self.assertEqual(balances, {'0xa': 1.0, '0xb': 2.0})
+
+    def test_networks_cached_separately(self):
+        async def scenario():
+            await self.cache.get_balances('mainnet', ['0xa'])
+            await self.cache.get_balances('arbitrum', ['0xa'])
+
+        run(scenario())
+
+        self.assertEqual(len(self.provider.requests), 2)
+
+    def test_stale_balance_served_while_refreshed(self):
+        async def scenario():
+            await self.cache.get_balances('mainnet', ['0xa'])
+            self.clock.now = 60
+            stale = await self.cache.get_balances('mainnet', ['0xa'])
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            refreshed = await self.cache.get_balances('mainnet', ['0xa'])
+            return stale, refreshed
+
+        stale, refreshed = run(scenario())
+
+        self.assertEqual(stale, {'0xa': 1.0})
+        self.assertEqual(refreshed, {'0xa': 2.0})
+        self.assertEqual(self.cache.stats()['stale_hits'], 1)
+
+    def test_too_stale_balance_fetched_again(self):
+        async def scenario():
+            await self.cache.get_balances('mainnet', ['0xa'])
+            self.clock.now = 331
+            return await self.cache.get_balances('mainnet', ['0xa'])
+
+        self.assertEqual(run(scenario()), {'0xa': 2.0})
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_concurrent_lookups_share_one_request(self):
+        self.provider.delay = 0.01
+
+        async def scenario():
+            return await asyncio.gather(*(self.cache.get_balances('solana', ['key']) for _ in range(10)))
+
+        results = run(scenario())
+
+        self.assertEqual(len(self.provider.requests), 1)
+        self.assertTrue(all(result == {'key': 1.0} for result in results))
+        self.assertEqual(self.cache.stats()['coalesced'], 9)
+
+    def test_failed_request_not_cached(self):
+        self.provider.error = EthereumBalanceCheckError("Rate limited")
+
+        async def scenario():
+            results = await asyncio.gather(*(self.cache.get_balances('mainnet', ['0xa']) for _ in range(3)),
+                                           return_exceptions=True)
+            self.provider.error = None
+            return results, await self.cache.get_balances('mainnet', ['0xa'])
+
+        results, retried = run(scenario())
+
+        self.assertTrue(all(isinstance(result, EthereumBalanceCheckError) for result in results))
+        self.assertEqual(retried, {'0xa': 2.0})
+        self.assertEqual(self.cache.stats()['fetch_errors'], 1)
+
+    def test_least_recently_fetched_evicted(self):
+        cache = BalanceCache(self.provider, max_entries=2)
+
+        async def scenario():
+            await cache.get_balances('mainnet', ['0xa', '0xb'])
+            await cache.get_balances('mainnet', ['0xc'])
+            await cache.get_balances('mainnet', ['0xa'])
+
+        run(scenario())
+
+        self.assertEqual(self.provider.requests[-1], ('mainnet', ['0xa']))
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_invalidate(self):
+        async def scenario():
+            await self.cache.get_balances('mainnet', ['0xa'])
+            self.cache.invalidate('mainnet', '0xa')
+            return await self.cache.get_balances('mainnet', ['0xa'])
+
+        self.assertEqual(run(scenario()), {'0xa': 2.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
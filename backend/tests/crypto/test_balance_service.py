@@ -0,0 +1,178 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from solders.pubkey import Pubkey
+from src.crypto.balance_service import BalanceService, JsonRpcClient, get_balance_service, close_balance_service
+from src.crypto.crypto_exceptions import BalanceRpcError, EthereumBalanceCheckError, SolanaBalanceCheckError
+
+
+def run(coroutine):
+    # Own loop rather than asyncio.run, which unsets the current loop other tests rely on
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self, content_type=None):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    """Stands in for aiohttp.ClientSession, answering every request with handler(payload)."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.closed = False
+
+    def post(self, url, json=None):
+        self.requests.append((url, json))
+        session = self
+
+        class Response(FakeResponse):
+            async def __aenter__(self):
+                session.in_flight += 1
+                session.max_in_flight = max(session.max_in_flight, session.in_flight)
+                await asyncio.sleep(0.01)
+                return self
+
+            async def __aexit__(self, *exc_info):
+                session.in_flight -= 1
+                return False
+
+        return Response(self.handler(json))
+
+    async def close(self):
+        self.closed = True
+
+
+def eth_balances(payload):
+    # Replies in reverse order, matching them up is the client's job
+    return [{'jsonrpc': '2.0', 'id': call['id'], 'result': hex(int(call['params'][0], 16) % 7 * 10 ** 18)}
+            for call in reversed(payload)]
+
+
+def solana_accounts(payload):
+    replies = []
+    for call in payload:
+        keys = call['params'][0]
+        accounts = [{'lamports': 2 * 10 ** 9} if i % 2 == 0 else None for i in range(len(keys))]
+        replies.append({'jsonrpc': '2.0', 'id': call['id'], 'result': {'context': {'slot': 1}, 'value': accounts}})
+    return replies
+
+
+@patch('src.crypto.balance_service.rpc_url', lambda network: f"https://{network}.example")
+class TestBalanceService(unittest.TestCase):
+
+    def test_ethereum_balances_batched(self):
+        # Setup
+        session = FakeSession(eth_balances)
+        service = BalanceService(batch_size=100, session=session)
+        addresses = [f"0x{i:040x}" for i in range(1, 251)]
+
+        # Execute
+        balances = run(service.get_balances('mainnet', addresses))
+
+        # Assert
+        self.assertEqual(len(session.requests), 3)
+        self.assertEqual([len(payload) for url, payload in session.requests], [100, 100, 50])
+        self.assertEqual(session.requests[0][1][0]['method'], 'eth_getBalance')
+        self.assertEqual(balances[addresses[2]], 3.0)
+        self.assertEqual(len(balances), 250)
+
+    def test_batches_requested_concurrently_up_to_limit(self):
+        session = FakeSession(eth_balances)
+        service = BalanceService(batch_size=10, concurrency=3, session=session)
+
+        run(service.get_balances('mainnet', [f"0x{i:040x}" for i in range(1, 101)]))
+
+        self.assertEqual(len(session.requests), 10)
+        self.assertEqual(session.max_in_flight, 3)
+
+    def test_one_client_per_network(self):
+        service = BalanceService(session=FakeSession(eth_balances))
+
+        self.assertIs(service.client('mainnet'), service.client('mainnet'))
+        self.assertIsNot(service.client('mainnet'), service.client('arbitrum'))
+
+    def test_invalid_ethereum_address(self):
+        session = FakeSession(eth_balances)
+        service = BalanceService(session=session)
+
+        with self.assertRaises(ValueError):
+            run(service.get_balances('mainnet', ["invalid_address"]))
+        self.assertEqual(session.requests, [])
+
+    def test_ethereum_rpc_error(self):
+        session = FakeSession(lambda payload: [{'jsonrpc': '2.0', 'id': call['id'], 'error': {'code': -32005}}
+                                               for call in payload])
+        service = BalanceService(session=session)
+
+        with self.assertRaises(EthereumBalanceCheckError):
+            run(service.get_balances('mainnet', [f"0x{1:040x}"]))
+
+    def test_solana_balances_from_multiple_accounts(self):
+        # Setup
+        session = FakeSession(solana_accounts)
+        service = BalanceService(batch_size=500, session=session)
+        addresses = [str(Pubkey.new_unique()) for _ in range(150)]
+
+        # Execute
+        balances = run(service.get_balances('solana', addresses))
+
+        # Assert, at most 100 accounts per call and unfunded accounts count as empty
+        self.assertEqual([len(payload[0]['params'][0]) for url, payload in session.requests], [100, 50])
+        self.assertEqual(session.requests[0][1][0]['method'], 'getMultipleAccounts')
+        self.assertEqual(balances[addresses[0]], 2.0)
+        self.assertEqual(balances[addresses[1]], 0.0)
+
+    def test_solana_batch_rejected(self):
+        service = BalanceService(session=FakeSession(lambda payload: {'error': {'code': -32600}}))
+
+        with self.assertRaises(SolanaBalanceCheckError):
+            run(service.get_balances('solana', [str(Pubkey.new_unique())]))
+
+
+class TestJsonRpcClient(unittest.TestCase):
+
+    def test_missing_reply_is_an_error(self):
+        client = JsonRpcClient("https://rpc.example", FakeSession(lambda payload: []))
+
+        with self.assertRaises(BalanceRpcError):
+            run(client.call('eth_getBalance', ["0x0", 'latest']))
+
+
+class TestGetBalanceService(unittest.TestCase):
+
+    def test_one_service_per_event_loop(self):
+        async def services():
+            first, second = get_balance_service(), get_balance_service()
+            await close_balance_service()
+            return first, second
+
+        first, second = run(services())
+        other, _ = run(services())
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+
+
+if __name__ == '__main__':
+    unittest.main()
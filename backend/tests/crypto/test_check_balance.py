@@ -1,128 +1,113 @@
 import unittest
 from unittest.mock import patch, AsyncMock
 import asyncio
-from web3 import Web3
-from solders.pubkey import Pubkey
 from src.crypto.check_balance import (
+    check_balances,
     check_solana_balance,
     check_ethereum_balance,
     SolanaBalanceCheckError,
     EthereumBalanceCheckError
 )
 
+SOL_ADDRESS = "7xLk17EQQ5KLDLDe44wCmupJKJjTGd8hs3eSVVhCx932"
+ETH_ADDRESS = "0x742d35Cc6634C0532925a3b844Bc454e4438f44e"
 
+
+def run_async_test(test_func):
+    def wrapper(*args, **kwargs):
+        # Own loop rather than asyncio.run, which unsets the current loop other tests rely on
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(test_func(*args, **kwargs))
+        finally:
+            loop.close()
+
+    return wrapper
+
+
+@patch('src.crypto.check_balance.get_balance_cache')
 class TestCheckBalance(unittest.TestCase):
 
-    @patch('src.crypto.check_balance.AsyncClient')
-    async def test_check_solana_balance_success(self, mock_async_client):
-        mock_client = AsyncMock()
-        mock_client.is_connected.return_value = True
-        mock_client.get_balance.return_value.value = 1000000000  # 1 SOL
-        mock_async_client.return_value.__aenter__.return_value = mock_client
+    @run_async_test
+    async def test_check_solana_balance_success(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(return_value={SOL_ADDRESS: 1.0})
 
-        balance = await check_solana_balance("7xLk17EQQ5KLDLDe44wCmupJKJjTGd8hs3eSVVhCx932")
+        balance = await check_solana_balance(SOL_ADDRESS)
 
         self.assertEqual(balance, 1.0)
-        mock_client.get_balance.assert_called_once()
+        mock_get_cache.return_value.get_balances.assert_awaited_once_with('solana', [SOL_ADDRESS])
 
-    @patch('src.crypto.check_balance.AsyncClient')
-    async def test_check_solana_balance_connection_error(self, mock_async_client):
-        mock_client = AsyncMock()
-        mock_client.is_connected.return_value = False
-        mock_async_client.return_value.__aenter__.return_value = mock_client
+    @run_async_test
+    async def test_check_solana_balance_connection_error(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(side_effect=SolanaBalanceCheckError("Request failed"))
 
         with self.assertRaises(SolanaBalanceCheckError):
-            await check_solana_balance("7xLk17EQQ5KLDLDe44wCmupJKJjTGd8hs3eSVVhCx932")
+            await check_solana_balance.__wrapped__(SOL_ADDRESS)
+
+    @run_async_test
+    async def test_check_solana_balance_invalid_key(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(side_effect=ValueError("Invalid public key"))
 
-    @patch('src.crypto.check_balance.AsyncClient')
-    async def test_check_solana_balance_invalid_key(self, mock_async_client):
         with self.assertRaises(ValueError):
-            await check_solana_balance("invalid_key")
+            await check_solana_balance.__wrapped__("invalid_key")
 
-    @patch('src.crypto.check_balance.Web3')
-    def test_check_ethereum_balance_success(self, mock_web3):
-        mock_w3 = mock_web3.return_value
-        mock_w3.is_connected.return_value = True
-        mock_w3.is_address.return_value = True
-        mock_w3.eth.get_balance.return_value = 1000000000000000000  # 1 ETH
-        mock_w3.from_wei.return_value = 1.0
+    @run_async_test
+    async def test_check_ethereum_balance_success(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(return_value={ETH_ADDRESS: 1.0})
 
-        balance = check_ethereum_balance("0x742d35Cc6634C0532925a3b844Bc454e4438f44e")
+        balance = await check_ethereum_balance(ETH_ADDRESS)
 
         self.assertEqual(balance, 1.0)
-        mock_w3.eth.get_balance.assert_called_once()
+        mock_get_cache.return_value.get_balances.assert_awaited_once_with('mainnet', [ETH_ADDRESS])
 
-    @patch('src.crypto.check_balance.Web3')
-    def test_check_ethereum_balance_connection_error(self, mock_web3):
-        mock_w3 = mock_web3.return_value
-        mock_w3.is_connected.return_value = False
+    @run_async_test
+    async def test_check_ethereum_balance_connection_error(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(side_effect=EthereumBalanceCheckError("Request failed"))
 
         with self.assertRaises(EthereumBalanceCheckError):
-            check_ethereum_balance("0x742d35Cc6634C0532925a3b844Bc454e4438f44e")
+            await check_ethereum_balance.__wrapped__(ETH_ADDRESS)
 
-    @patch('src.crypto.check_balance.Web3')
-    def test_check_ethereum_balance_invalid_address(self, mock_web3):
-        mock_w3 = mock_web3.return_value
-        mock_w3.is_connected.return_value = True
-        mock_w3.is_address.return_value = False
+    @run_async_test
+    async def test_check_ethereum_balance_invalid_address(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(side_effect=ValueError("Invalid Ethereum address"))
 
         with self.assertRaises(ValueError):
-            check_ethereum_balance("invalid_address")
+            await check_ethereum_balance.__wrapped__("invalid_address")
 
-    @patch('src.crypto.check_balance.Web3')
-    def test_check_ethereum_balance_arbitrum(self, mock_web3):
-        mock_w3 = mock_web3.return_value
-        mock_w3.is_connected.return_value = True
-        mock_w3.is_address.return_value = True
-        mock_w3.eth.get_balance.return_value = 1000000000000000000  # 1 ETH
-        mock_w3.from_wei.return_value = 1.0
+    @run_async_test
+    async def test_check_ethereum_balance_arbitrum(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(return_value={ETH_ADDRESS: 1.0})
 
-        balance = check_ethereum_balance("0x742d35Cc6634C0532925a3b844Bc454e4438f44e", "arbitrum")
+        balance = await check_ethereum_balance(ETH_ADDRESS, "arbitrum")
 
         self.assertEqual(balance, 1.0)
-        mock_w3.eth.get_balance.assert_called_once()
+        mock_get_cache.return_value.get_balances.assert_awaited_once_with('arbitrum', [ETH_ADDRESS])
 
-    @patch('src.crypto.check_balance.Web3')
-    def test_check_ethereum_balance_optimism(self, mock_web3):
-        mock_w3 = mock_web3.return_value
-        mock_w3.is_connected.return_value = True
-        mock_w3.is_address.return_value = True
-        mock_w3.eth.get_balance.return_value = 1000000000000000000  # 1 ETH
-        mock_w3.from_wei.return_value = 1.0
+    @run_async_test
+    async def test_check_ethereum_balance_optimism(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(return_value={ETH_ADDRESS: 1.0})
 
-        balance = check_ethereum_balance("0x742d35Cc6634C0532925a3b844Bc454e4438f44e", "optimism")
+        balance = await check_ethereum_balance(ETH_ADDRESS, "optimism")
 
         self.assertEqual(balance, 1.0)
-        mock_w3.eth.get_balance.assert_called_once()
-
-    @patch('src.crypto.check_balance.Web3')
-    def test_check_ethereum_balance_unsupported_network(self, mock_web3):
-        with self.assertRaises(EthereumBalanceCheckError):
-            check_ethereum_balance("0x742d35Cc6634C0532925a3b844Bc454e4438f44e", "unsupported_network")
-
-
-def run_async_test(test_func):
-    def wrapper(*args, **kwargs):
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(test_func(*args, **kwargs))
-
-    return wrapper
+        mock_get_cache.return_value.get_balances.assert_awaited_once_with('optimism', [ETH_ADDRESS])
 
+    @run_async_test
+    async def test_check_ethereum_balance_unsupported_network(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(
+            side_effect=EthereumBalanceCheckError("Network is not supported"))
 
-class TestAsyncFunctions(unittest.TestCase):
+        with self.assertRaises(EthereumBalanceCheckError):
+            await check_ethereum_balance.__wrapped__(ETH_ADDRESS, "unsupported_network")
 
     @run_async_test
-    async def test_check_solana_balance(self):
-        with patch('src.crypto.check_balance.AsyncClient') as mock_async_client:
-            mock_client = AsyncMock()
-            mock_client.is_connected.return_value = True
-            mock_client.get_balance.return_value.value = 1000000000  # 1 SOL
-            mock_async_client.return_value.__aenter__.return_value = mock_client
+    async def test_check_balances_returns_every_address(self, mock_get_cache):
+        mock_get_cache.return_value.get_balances = AsyncMock(return_value={ETH_ADDRESS: 1.0, "0x1": 2.0})
 
-            balance = await check_solana_balance("7xLk17EQQ5KLDLDe44wCmupJKJjTGd8hs3eSVVhCx932")
+        balances = await check_balances('mainnet', [ETH_ADDRESS, "0x1"])
 
-            self.assertEqual(balance, 1.0)
-            mock_client.get_balance.assert_called_once()
+        self.assertEqual(balances, {ETH_ADDRESS: 1.0, "0x1": 2.0})
+        mock_get_cache.return_value.get_balances.assert_awaited_once()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,49 @@
+import time
+import threading
+import unittest
+from src.crypto.password_hasher import PasswordHasher
+from src.crypto.crypto_exceptions import PasswordHasherBusyError
+
+
+class TestPasswordHasher(unittest.TestCase):
+
+    def setUp(self):
+        # Lowest bcrypt cost, the tests are about the pool and not the hash
+        self.hasher = PasswordHasher(max_workers=1, rounds=4, max_pending=1)
+        self.addCleanup(self.hasher.shutdown)
+
+    def test_hash_and_check(self):
+        # Execute
+        hashed_password, salt = self.hasher.hash_password('password123')
+
+        # Assert
+        self.assertTrue(hashed_password.startswith(salt))
+        self.assertIn('$04$', salt)
+        self.assertTrue(self.hasher.check_password('password123', hashed_password))
+        self.assertFalse(self.hasher.check_password('wrong', hashed_password))
+        self.assertEqual(self.hasher.metrics()['completed'], 3)
+
+    def test_rejects_when_saturated(self):
+        # Setup, one slow operation fills the only slot
+        slow = threading.Thread(target=self.hasher._run, args=(time.sleep, 0.5))
+        slow.start()
+        self.addCleanup(slow.join)
+        deadline = time.monotonic() + 5
+        while self.hasher.metrics()['pending'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # Execute and Assert
+        with self.assertRaises(PasswordHasherBusyError):
+            self.hasher.hash_password('password123')
+        self.assertEqual(self.hasher.metrics()['rejected'], 1)
+        self.assertEqual(self.hasher.metrics()['pending'], 1)
+
+    def test_slot_freed_after_operation(self):
+        self.hasher.hash_password('password123')
+
+        self.assertEqual(self.hasher.metrics()['pending'], 0)
+        self.hasher.hash_password('password123')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import time
+import unittest
+import threading
+import pyodbc
+from unittest.mock import patch, MagicMock
+from src.database.connection_pool import ConnectionPool
+from src.database.database_exceptions import ConnectionPoolTimeoutError
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    @patch('src.database.connection_pool.pyodbc.connect')
+    def test_connection_is_reused(self, mock_connect):
+        # Setup
+        mock_connect.side_effect = lambda *args, **kwargs: MagicMock()
+        pool = ConnectionPool('conn_str', min_size=0, max_size=2)
+
+        # Execute
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        # Assert
+        self.assertIs(first, second)
+        mock_connect.assert_called_once_with('conn_str')
+        first.commit.assert_called()
+        self.assertEqual(pool.metrics()['checkouts'], 2)
+
+    @patch('src.database.connection_pool.pyodbc.connect')
+    def test_min_size_warms_up_pool(self, mock_connect):
+        # Setup
+        mock_connect.side_effect = lambda *args, **kwargs: MagicMock()
+        pool = ConnectionPool('conn_str', min_size=3, max_size=5)
+
+        # Execute
+        with pool.connection():
+            pass
+
+        # Assert
+        self.assertEqual(mock_connect.call_count, 3)
+        self.assertEqual(pool.metrics()['size'], 3)
+
+    @patch('src.database.connection_pool.pyodbc.connect')
+    def test_rollback_on_exception(self, mock_connect):
+        # Setup
+        mock_conn = MagicMock()
+        mock_connect.return_value = mock_conn
+        pool = ConnectionPool('conn_str', min_size=0, max_size=1)
+
+        # Execute and Assert
+        with self.assertRaises(RuntimeError):
+            with pool.connection():
+                raise RuntimeError("boom")
+
+        mock_conn.rollback.assert_called_once()
+        mock_conn.commit.assert_not_called()
+        self.assertEqual(pool.metrics()['idle'], 1)
+
+    @patch('src.database.connection_pool.pyodbc.connect')
+    def test_expired_connection_is_recycled(self, mock_connect):
+        # Setup
+        mock_connect.side_effect = lambda *args, **kwargs: MagicMock()
+        pool = ConnectionPool('conn_str', min_size=0, max_size=1, max_lifetime=0)
+
+        # Execute
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        # Assert
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+        self.assertEqual(mock_connect.call_count, 2)
+
+    @patch('src.database.connection_pool.pyodbc.connect')
+    def test_unhealthy_connection_is_replaced(self, mock_connect):
+        # Setup
+        broken = MagicMock()
+        broken.cursor.return_value.__enter__.return_value.execute.side_effect = pyodbc.Error("Connection lost")
+        healthy = MagicMock()
+        mock_connect.side_effect = [broken, healthy]
+        pool = ConnectionPool('conn_str', min_size=0, max_size=1, health_check_after=0)
+
+        # Execute
+        with pool.connection():
+            pass
+        with pool.connection() as conn:
+            pass
+
+        # Assert
+        self.assertIs(conn, healthy)
+        self.assertEqual(pool.metrics()['failed_health_checks'], 1)
+
+    @patch('src.database.connection_pool.pyodbc.connect')
+    def test_checkout_timeout_when_exhausted(self, mock_connect):
+        # Setup
+        mock_connect.return_value = MagicMock()
+        pool = ConnectionPool('conn_str', min_size=0, max_size=1, checkout_timeout=0.05)
+        held = pool.acquire()
+
+        # Execute and Assert
+        with self.assertRaises(ConnectionPoolTimeoutError):
+            pool.acquire()
+
+        pool.release(held)
+        self.assertEqual(pool.metrics()['checkout_timeouts'], 1)
+
+    @patch('src.database.connection_pool.pyodbc.connect')
+    def test_waiter_woken_when_connection_discarded(self, mock_connect):
+        # Setup
+        mock_connect.side_effect = lambda *args, **kwargs: MagicMock()
+        pool = ConnectionPool('conn_str', min_size=0, max_size=1, checkout_timeout=2)
+        held = pool.acquire()
+        result = {}
+
+        def waiter():
+            start = time.monotonic()
+            result['connection'] = pool.acquire()
+            result['wait_time'] = time.monotonic() - start
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.1)
+
+        # Execute
+        pool.release(held, discard=True)
+        thread.join(timeout=5)
+
+        # Assert
+        self.assertIn('connection', result)
+        self.assertIsNot(result['connection'], held)
+        self.assertLess(result['wait_time'], 1)
+        self.assertEqual(pool.metrics()['size'], 1)
+        self.assertEqual(pool.metrics()['checkout_timeouts'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
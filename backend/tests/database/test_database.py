@@ -1,12 +1,21 @@
 import unittest
+from datetime import datetime
 from unittest.mock import patch, MagicMock
-from src.database.database import register_user, login_user, fetch_vps_data
+from cryptography.fernet import Fernet
+from src.database.database import (register_user, login_user, fetch_vps_data, save_wallet_keys, _fernet_key_cache,
+                                   create_job, update_job_status, update_job_progress, fetch_job,
+                                   fetch_project_instances, update_instance_ip, fetch_user_projects,
+                                   fetch_user_projects_page, fetch_user_projects_version, claim_provisioning_work,
+                                   set_provisioning_state, record_provisioning_failure, apply_instance_states,
+                                   claim_user_project)
+from src.database.query_cache import QueryCache, LRUCacheBackend
+from src.crypto.crypto_exceptions import PasswordHasherBusyError
 from src.database.database_exceptions import UserRegistrationError, UserLoginError, VPSDataFetchError
 
 
 class TestDatabase(unittest.TestCase):
 
-    @patch('src.database.database.pyodbc.connect')
+    @patch('src.database.database.get_connection')
     def test_register_user_success(self, mock_connect):
         # Setup
         mock_cursor = MagicMock()
@@ -22,7 +31,7 @@ class TestDatabase(unittest.TestCase):
         mock_cursor.execute.assert_called_once()
         mock_cursor.fetchval.assert_called_once()
 
-    @patch('src.database.database.pyodbc.connect')
+    @patch('src.database.database.get_connection')
     def test_register_user_username_exists(self, mock_connect):
         # Setup
         mock_cursor = MagicMock()
@@ -36,7 +45,7 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNone(user_id)
         self.assertEqual(error, "Username already exists")
 
-    @patch('src.database.database.pyodbc.connect')
+    @patch('src.database.database.get_connection')
     @patch('src.database.database.bcrypt.checkpw')
     def test_login_user_success(self, mock_checkpw, mock_connect):
         # Setup
@@ -54,7 +63,7 @@ class TestDatabase(unittest.TestCase):
         mock_cursor.execute.assert_called()
         mock_checkpw.assert_called_once()
 
-    @patch('src.database.database.pyodbc.connect')
+    @patch('src.database.database.get_connection')
     def test_login_user_invalid_credentials(self, mock_connect):
         # Setup
         mock_cursor = MagicMock()
@@ -68,7 +77,7 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNone(user_id)
         self.assertEqual(error, "User not found")
 
-    @patch('src.database.database.pyodbc.connect')
+    @patch('src.database.database.get_connection')
     def test_login_user_database_error(self, mock_connect):
         # Setup
         mock_connect.side_effect = UserLoginError("An error occurred during login")
@@ -79,7 +88,7 @@ class TestDatabase(unittest.TestCase):
 
         self.assertEqual(str(context.exception), "An error occurred during login")
 
-    @patch('src.database.database.pyodbc.connect')
+    @patch('src.database.database.get_connection')
     @patch('src.database.database.decrypt_data')
     def test_fetch_vps_data_success(self, mock_decrypt, mock_connect):
         # Setup
@@ -103,7 +112,7 @@ class TestDatabase(unittest.TestCase):
         mock_cursor.execute.assert_called_once()
         self.assertEqual(mock_decrypt.call_count, 3)
 
-    @patch('src.database.database.pyodbc.connect')
+    @patch('src.database.database.get_connection')
     def test_fetch_vps_data_not_found(self, mock_connect):
         # Setup
         mock_cursor = MagicMock()
@@ -114,6 +123,369 @@ class TestDatabase(unittest.TestCase):
         with self.assertRaises(VPSDataFetchError):
             fetch_vps_data(999)
 
+    @patch('src.database.database.get_connection')
+    def test_save_wallet_keys_single_connection(self, mock_connect):
+        # Setup
+        _fernet_key_cache.clear()
+        fernet_key = Fernet.generate_key().decode()
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = MagicMock(UserKey_IV=fernet_key)
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        with patch('src.database.database.get_user_projects_cache'):
+            result = save_wallet_keys(1, 'pub', 'priv')
+
+        # Assert
+        self.assertTrue(result)
+        mock_connect.assert_called_once()
+        self.assertEqual(mock_cursor.execute.call_count, 2)
+        self.assertEqual(_fernet_key_cache[1], fernet_key)
+
+    @patch('src.database.database.get_connection')
+    def test_save_wallet_keys_cached_key_single_statement(self, mock_connect):
+        # Setup
+        _fernet_key_cache.clear()
+        fernet_key = Fernet.generate_key().decode()
+        _fernet_key_cache[2] = fernet_key
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = (2, 7)
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        with patch('src.database.database.get_user_projects_cache') as mock_cache:
+            result = save_wallet_keys(2, 'pub', 'priv')
+
+        # Assert
+        self.assertTrue(result)
+        mock_cursor.execute.assert_called_once()
+        self.assertIn("OUTPUT INSERTED", mock_cursor.execute.call_args[0][0])
+        mock_cache.return_value.invalidate.assert_called_once_with(7)
+
+    @patch('src.database.database.get_user_projects_cache')
+    @patch('src.database.database.get_connection')
+    def test_update_instance_ip_invalidates_owner(self, mock_connect, mock_cache):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [(7,)]
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        result = update_instance_ip('i-1', '10.0.0.1')
+
+        # Assert
+        self.assertTrue(result)
+        mock_cache.return_value.invalidate.assert_called_once_with(7)
+
+    @patch('src.database.database.get_user_projects_cache')
+    @patch('src.database.database.get_connection')
+    def test_update_instance_ip_no_match(self, mock_connect, mock_cache):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        self.assertFalse(update_instance_ip('i-1', '10.0.0.1'))
+        mock_cache.return_value.invalidate.assert_not_called()
+
+    @patch('src.database.database.get_connection')
+    def test_fetch_user_projects_read_through(self, mock_connect):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [MagicMock(
+            UserProject_IdKey=1, UserProject_ProjectIdKey=2, UserProject_InstanceId='i-1', UserProject_Version='v1',
+            UserProject_Network='mainnet', UserProject_CreationDate=None, UserProject_LastModifiedDate=None,
+            Project_Name='elixir', UserKey_IPAddress='10.0.0.1', UserKey_EncryptedPubKey='pub',
+            UserKey_EncryptedPrivKey='priv')]
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+        cache = QueryCache(LRUCacheBackend(), ttl=60, namespace='user_projects')
+
+        # Execute
+        with patch('src.database.database.get_user_projects_cache', return_value=cache):
+            first = fetch_user_projects(5)
+            second = fetch_user_projects(5)
+            cache.invalidate(5)
+            third = fetch_user_projects(5)
+
+        # Assert
+        self.assertEqual(first[0]['ip_address'], '10.0.0.1')
+        self.assertIs(first, second)
+        self.assertEqual(third, first)
+        self.assertEqual(mock_connect.call_count, 2)
+
+    @patch('src.database.database.get_connection')
+    def test_fetch_user_projects_page_selects_requested_fields(self, mock_connect):
+        # Setup, one row more than the limit means there is a next page
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [(3, 'mainnet'), (4, 'testnet'), (9, 'mainnet')]
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        projects, next_after_id = fetch_user_projects_page(5, ['network'], after_id=2, limit=2)
+
+        # Assert
+        query, params = mock_cursor.execute.call_args[0]
+        self.assertEqual(projects, [{'id': 3, 'network': 'mainnet'}, {'id': 4, 'network': 'testnet'}])
+        self.assertEqual(next_after_id, 4)
+        self.assertEqual(params, (3, 5, 2))
+        self.assertNotIn('JOIN', query)
+        self.assertNotIn('Encrypted', query)
+
+    @patch('src.database.database.get_connection')
+    def test_fetch_user_projects_page_last_page(self, mock_connect):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [(3, '10.0.0.1', datetime(2024, 1, 1))]
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        projects, next_after_id = fetch_user_projects_page(5, ['ip_address', 'creation_date'])
+
+        self.assertEqual(projects, [{'id': 3, 'ip_address': '10.0.0.1', 'creation_date': '2024-01-01T00:00:00'}])
+        self.assertIsNone(next_after_id)
+        self.assertIn('LEFT JOIN UserKeys', mock_cursor.execute.call_args[0][0])
+
+    def test_fetch_user_projects_page_rejects_unknown_field(self):
+        with self.assertRaises(ValueError):
+            fetch_user_projects_page(5, ['private_key'])
+
+    @patch('src.database.database.get_connection')
+    def test_fetch_user_projects_version(self, mock_connect):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = (2, 9, datetime(2024, 1, 1), None)
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        self.assertEqual(fetch_user_projects_version(5), '2-9-2024-01-01T00:00:00-None')
+
+
+    @patch('src.database.database.get_connection')
+    def test_claim_provisioning_work(self, mock_connect):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [(101, 'i-1', 'pending'), (102, 'i-2', 'running')]
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        claimed = claim_provisioning_work(10, 600)
+
+        # Assert
+        query, params = mock_cursor.execute.call_args[0]
+        self.assertEqual(claimed, [{'user_project_id': 101, 'instance_id': 'i-1', 'state': 'pending'},
+                                   {'user_project_id': 102, 'instance_id': 'i-2', 'state': 'running'}])
+        self.assertIn('READPAST', query)
+        self.assertEqual(params, (10, 600, 'pending', 'running'))
+        mock_connect.return_value.__enter__.return_value.commit.assert_called_once()
+
+    @patch('src.database.database.get_connection')
+    def test_set_provisioning_state(self, mock_connect):
+        mock_cursor = MagicMock(rowcount=2)
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        self.assertEqual(set_provisioning_state([101, 102], 'configured'), 2)
+        self.assertEqual(mock_cursor.execute.call_args[0][1], ('configured', 101, 102))
+        self.assertIn('UserProject_LeaseUntil = NULL', mock_cursor.execute.call_args[0][0])
+
+    @patch('src.database.database.get_connection')
+    def test_set_provisioning_state_nothing_to_update(self, mock_connect):
+        self.assertEqual(set_provisioning_state([], 'configured'), 0)
+        mock_connect.assert_not_called()
+        with self.assertRaises(ValueError):
+            set_provisioning_state([101], 'done')
+
+    @patch('src.database.database.get_connection')
+    def test_record_provisioning_failure(self, mock_connect):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = ('failed',)
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        self.assertEqual(record_provisioning_failure(101, 3), 'failed')
+        self.assertEqual(mock_cursor.execute.call_args[0][1], (3, 'failed', 'running', 101))
+        self.assertIn('UserProject_LeaseUntil = NULL', mock_cursor.execute.call_args[0][0])
+
+    @patch('src.database.database.get_connection')
+    def test_record_provisioning_failure_keeps_claim(self, mock_connect):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = ('running',)
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        self.assertEqual(record_provisioning_failure(101, 3, release=False), 'running')
+        self.assertIn('UserProject_LeaseUntil = UserProject_LeaseUntil', mock_cursor.execute.call_args[0][0])
+
+    @patch('src.database.database.get_connection')
+    def test_claim_user_project(self, mock_connect):
+        mock_cursor = MagicMock()
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        mock_cursor.fetchone.return_value = ('running',)
+        self.assertEqual(claim_user_project(101, 600), 'running')
+        self.assertEqual(mock_cursor.execute.call_args[0][1], (600, 101))
+        self.assertIn('READPAST', mock_cursor.execute.call_args[0][0])
+
+        mock_cursor.fetchone.return_value = (None,)
+        self.assertEqual(claim_user_project(101, 600), 'configured')
+
+        # Leased by another worker
+        mock_cursor.fetchone.return_value = None
+        self.assertIsNone(claim_user_project(101, 600))
+
+    @patch('src.database.database.get_user_projects_cache')
+    @patch('src.database.database.get_connection')
+    def test_apply_instance_states_one_call(self, mock_connect, mock_cache):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [('1', 7), ('2', 7), ('3', None)]
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        outcomes = apply_instance_states([(1, '10.0.0.1', 'running'), ('2', None, 'pending'), ('3', '10.0.0.3', None),
+                                          (1, '10.0.0.9', 'running')])
+
+        # Assert
+        query, params = mock_cursor.execute.call_args[0]
+        self.assertEqual(outcomes, {'1': True, '2': True, '3': False})
+        mock_cursor.execute.assert_called_once()
+        self.assertIn('sp_ApplyInstanceStates', query)
+        self.assertEqual(params, ([('1', '10.0.0.9', 'running'), ('2', None, 'pending'), ('3', '10.0.0.3', None)],))
+        mock_cache.return_value.invalidate.assert_called_once_with(7)
+
+    @patch('src.database.database.get_connection')
+    def test_apply_instance_states_nothing_to_update(self, mock_connect):
+        self.assertEqual(apply_instance_states([]), {})
+        mock_connect.assert_not_called()
+        with self.assertRaises(ValueError):
+            apply_instance_states([('1', None, 'booting')])
+
+    @patch('src.database.database.get_password_hasher')
+    @patch('src.database.database.get_connection')
+    def test_login_user_releases_connection_during_check(self, mock_connect, mock_get_hasher):
+        # Setup
+        open_connections = []
+        user = MagicMock(User_IdKey=1, User_PasswordHash='hash', User_Name='test')
+
+        def connection():
+            open_connections.append(1)
+            conn = MagicMock()
+            conn.cursor.return_value.__enter__.return_value.fetchone.return_value = MagicMock(Result=0)
+            conn.cursor.return_value.__enter__.return_value.execute.return_value.fetchone.return_value = user
+            return conn
+
+        def release(*args):
+            open_connections.pop()
+            return False
+
+        mock_connect.return_value.__enter__.side_effect = connection
+        mock_connect.return_value.__exit__.side_effect = release
+
+        def check_password(password, hashed_password):
+            self.assertEqual(open_connections, [])
+            return True
+
+        mock_get_hasher.return_value.check_password.side_effect = check_password
+
+        # Execute
+        result = login_user('test@example.com', 'password123', '127.0.0.1')
+
+        # Assert
+        self.assertEqual(result, (1, 'test', None))
+        mock_get_hasher.return_value.check_password.assert_called_once_with('password123', 'hash')
+        self.assertEqual(mock_connect.call_count, 2)
+
+    @patch('src.database.database.get_password_hasher')
+    @patch('src.database.database.get_connection')
+    def test_login_user_busy_not_wrapped(self, mock_connect, mock_get_hasher):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = MagicMock(Result=0)
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_get_hasher.return_value.check_password.side_effect = PasswordHasherBusyError("Busy")
+
+        with self.assertRaises(PasswordHasherBusyError):
+            login_user('test@example.com', 'password123', '127.0.0.1')
+
+    @patch('src.database.database.get_connection')
+    def test_create_job(self, mock_connect):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        job_id = create_job('vps_setup')
+
+        # Assert
+        self.assertEqual(len(job_id), 36)
+        self.assertEqual(mock_cursor.execute.call_args[0][1], (job_id, 'vps_setup'))
+
+    @patch('src.database.database.get_connection')
+    def test_update_job_status_serialises_result(self, mock_connect):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_cursor.rowcount = 1
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        result = update_job_status('job-id', 'succeeded', result={'instance_id': 'i-1'})
+
+        # Assert
+        self.assertTrue(result)
+        params = mock_cursor.execute.call_args[0][1]
+        self.assertEqual(params[:3], ('succeeded', '{"instance_id": "i-1"}', None))
+        self.assertEqual(params[-1], 'job-id')
+
+    @patch('src.database.database.get_connection')
+    def test_update_job_progress_only_touches_running_job(self, mock_connect):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_cursor.rowcount = 0
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        result = update_job_progress('job-id', {'1': 'running'})
+
+        # Assert
+        self.assertFalse(result)
+        self.assertIn("Job_Status = 'running'", mock_cursor.execute.call_args[0][0])
+        self.assertEqual(mock_cursor.execute.call_args[0][1], ('{"1": "running"}', 'job-id'))
+
+    @patch('src.database.database.get_connection')
+    def test_fetch_project_instances(self, mock_connect):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [MagicMock(UserProject_IdKey=3, UserKey_IPAddress='10.0.0.3')]
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        result = fetch_project_instances(1)
+
+        # Assert
+        self.assertEqual(result, [{'user_project_id': 3, 'ip': '10.0.0.3'}])
+        query, params = mock_cursor.execute.call_args[0]
+        self.assertEqual(params, (1, 'pending', 'running'))
+        self.assertIn('UserProject_LeaseUntil < SYSUTCDATETIME()', query)
+
+    @patch('src.database.database.get_connection')
+    def test_fetch_job_not_found(self, mock_connect):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = None
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute and Assert
+        self.assertIsNone(fetch_job('missing'))
+
+    @patch('src.database.database.get_connection')
+    def test_fetch_job_success(self, mock_connect):
+        # Setup
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = MagicMock(
+            Job_Id='ABC', Job_Type='vps_setup', Job_Status='failed', Job_Result=None, Job_Error='boom',
+            Job_CreationDate=None, Job_StartedDate=None, Job_FinishedDate=None)
+        mock_connect.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        # Execute
+        job = fetch_job('abc')
+
+        # Assert
+        self.assertEqual(job['id'], 'abc')
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], 'boom')
+        self.assertIsNone(job['result'])
+
 
 if __name__ == '__main__':
     unittest.main()
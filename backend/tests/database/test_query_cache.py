@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from src.database.query_cache import LRUCacheBackend, QueryCache, create_backend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class TestLRUCacheBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch('src.database.query_cache.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entry_expires(self):
+        backend = LRUCacheBackend()
+        backend.set('a', [1], ttl=10)
+
+        self.clock.now = 9
+        self.assertEqual(backend.get('a'), [1])
+        self.clock.now = 10
+        self.assertIsNone(backend.get('a'))
+
+    def test_least_recently_used_evicted(self):
+        backend = LRUCacheBackend(max_entries=2)
+        backend.set('a', 1, ttl=10)
+        backend.set('b', 2, ttl=10)
+        backend.get('a')
+
+        backend.set('c', 3, ttl=10)
+
+        self.assertEqual((backend.get('a'), backend.get('b'), backend.get('c')), (1, None, 3))
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = QueryCache(LRUCacheBackend(), ttl=60, namespace='user_projects')
+
+    def test_loads_once(self):
+        load = MagicMock(return_value=[{'id': 1}])
+
+        first = self.cache.get_or_load(5, load)
+        second = self.cache.get_or_load(5, load)
+
+        self.assertIs(first, second)
+        load.assert_called_once()
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'invalidations': 0})
+
+    def test_empty_result_cached(self):
+        load = MagicMock(return_value=[])
+
+        self.cache.get_or_load(5, load)
+        self.cache.get_or_load(5, load)
+
+        load.assert_called_once()
+
+    def test_invalidate_reloads(self):
+        load = MagicMock(side_effect=[['old'], ['new']])
+
+        self.cache.get_or_load(5, load)
+        self.cache.invalidate(5)
+
+        self.assertEqual(self.cache.get_or_load(5, load), ['new'])
+
+    def test_result_loaded_during_invalidation_not_stored(self):
+        # Setup, a write commits and invalidates while the read is still running
+        def slow_read():
+            self.cache.invalidate(5)
+            return ['stale']
+
+        # Execute
+        result = self.cache.get_or_load(5, slow_read)
+
+        # Assert
+        self.assertEqual(result, ['stale'])
+        self.assertEqual(self.cache.get_or_load(5, lambda: ['fresh']), ['fresh'])
+
+    def test_load_error_not_cached(self):
+        with self.assertRaises(RuntimeError):
+            self.cache.get_or_load(5, MagicMock(side_effect=RuntimeError("Database down")))
+
+        self.assertEqual(self.cache.get_or_load(5, lambda: ['ok']), ['ok'])
+
+    def test_in_process_backend_without_url(self):
+        self.assertIsInstance(create_backend(None), LRUCacheBackend)
+
+
+if __name__ == '__main__':
+    unittest.main()
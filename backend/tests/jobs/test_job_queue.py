@@ -0,0 +1,84 @@
+import unittest
+import threading
+from unittest.mock import patch, MagicMock
+from src.jobs.job_queue import JobQueue
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.job_queue = JobQueue(max_workers=2)
+        self.addCleanup(self.job_queue.shutdown)
+
+    @patch('src.jobs.job_queue.update_job_status')
+    @patch('src.jobs.job_queue.create_job')
+    def test_submit_returns_job_id_and_records_result(self, mock_create_job, mock_update_status):
+        # Setup
+        mock_create_job.return_value = 'job-1'
+        task = MagicMock(return_value={'instance_id': 'i-1'})
+
+        # Execute
+        job_id = self.job_queue.submit('instance_setup', task, {'region': 'EU'})
+        self.job_queue.shutdown(wait=True)
+
+        # Assert
+        self.assertEqual(job_id, 'job-1')
+        mock_create_job.assert_called_once_with('instance_setup')
+        task.assert_called_once_with({'region': 'EU'})
+        self.assertEqual([call[0][1] for call in mock_update_status.call_args_list], ['running', 'succeeded'])
+        self.assertEqual(mock_update_status.call_args[1]['result'], {'instance_id': 'i-1'})
+
+    @patch('src.jobs.job_queue.update_job_status')
+    @patch('src.jobs.job_queue.create_job')
+    def test_failed_job_records_error(self, mock_create_job, mock_update_status):
+        # Setup
+        mock_create_job.return_value = 'job-2'
+        task = MagicMock(side_effect=Exception("Setup failed"))
+
+        # Execute
+        self.job_queue.submit('vps_setup', task, 1)
+        self.job_queue.shutdown(wait=True)
+
+        # Assert
+        mock_update_status.assert_called_with('job-2', 'failed', error='Setup failed')
+
+    @patch('src.jobs.job_queue.update_job_status')
+    @patch('src.jobs.job_queue.create_job')
+    def test_submit_does_not_wait_for_job(self, mock_create_job, mock_update_status):
+        # Setup
+        release = threading.Event()
+        mock_create_job.return_value = 'job-3'
+
+        # Execute
+        job_id = self.job_queue.submit('vps_setup', release.wait, 5)
+
+        # Assert
+        self.assertEqual(job_id, 'job-3')
+        self.assertFalse(release.is_set())
+        release.set()
+
+
+    @patch('src.jobs.job_queue.update_job_progress')
+    @patch('src.jobs.job_queue.update_job_status')
+    @patch('src.jobs.job_queue.create_job')
+    def test_submit_with_progress_records_snapshots(self, mock_create_job, mock_update_status, mock_update_progress):
+        # Setup
+        mock_create_job.return_value = 'job-4'
+        mock_update_progress.side_effect = [Exception("Database down"), True]
+
+        def task(count, progress):
+            progress({'done': 0})
+            progress({'done': count})
+            return {'done': count}
+
+        # Execute
+        self.job_queue.submit_with_progress('fleet_setup', task, 2)
+        self.job_queue.shutdown(wait=True)
+
+        # Assert
+        self.assertEqual([call[0] for call in mock_update_progress.call_args_list],
+                         [('job-4', {'done': 0}), ('job-4', {'done': 2})])
+        mock_update_status.assert_called_with('job-4', 'succeeded', result={'done': 2})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch
+from src.vps.channel_reader import LineSplitter, iter_channel_batches, iter_channel_lines, STDOUT, STDERR
+
+
+class FakeChannel:
+    """Channel that hands out pre-recorded chunks and exits once they are consumed."""
+
+    def __init__(self, stdout_chunks=(), stderr_chunks=(), exit_status=0):
+        self.stdout_chunks = list(stdout_chunks)
+        self.stderr_chunks = list(stderr_chunks)
+        self.exit_status = exit_status
+        self.closed = False
+
+    def recv_ready(self):
+        return bool(self.stdout_chunks)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr_chunks)
+
+    def recv(self, size):
+        return self.stdout_chunks.pop(0)
+
+    def recv_stderr(self, size):
+        return self.stderr_chunks.pop(0)
+
+    def exit_status_ready(self):
+        return not self.stdout_chunks and not self.stderr_chunks
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+
+class TestLineSplitter(unittest.TestCase):
+
+    def test_holds_back_partial_line(self):
+        splitter = LineSplitter()
+
+        self.assertEqual(splitter.feed(b"first\nsec"), ["first"])
+        self.assertEqual(splitter.feed(b"ond\r\n"), ["second"])
+        self.assertEqual(splitter.flush(), [])
+
+    def test_multibyte_character_split_across_chunks(self):
+        splitter = LineSplitter()
+        encoded = "café\n".encode('utf-8')
+
+        self.assertEqual(splitter.feed(encoded[:4]), [])
+        self.assertEqual(splitter.feed(encoded[4:]), ["café"])
+
+    def test_flush_returns_unterminated_line(self):
+        splitter = LineSplitter()
+        splitter.feed(b"no newline")
+
+        self.assertEqual(splitter.flush(), ["no newline"])
+
+
+class TestIterChannelLines(unittest.TestCase):
+
+    def test_yields_stdout_and_stderr_lines(self):
+        channel = FakeChannel(stdout_chunks=[b"one\ntw", b"o\nthree"], stderr_chunks=[b"warn\n"])
+
+        lines = list(iter_channel_lines(channel))
+
+        self.assertEqual(lines, [(STDOUT, "one"), (STDOUT, "two"), (STDERR, "warn"), (STDOUT, "three")])
+
+    def test_batches_hold_everything_available(self):
+        channel = FakeChannel(stdout_chunks=[b"one\n", b"two\nthr"], stderr_chunks=[b"warn\n"])
+
+        batches = list(iter_channel_batches(channel))
+
+        self.assertEqual(batches, [[(STDOUT, "one"), (STDOUT, "two"), (STDERR, "warn")], [(STDOUT, "thr")]])
+
+    @patch('src.vps.channel_reader.select.select')
+    def test_blocks_in_select_while_idle(self, mock_select):
+        channel = FakeChannel()
+        channel.exit_status_ready = lambda: mock_select.call_count > 0
+
+        lines = list(iter_channel_lines(channel, poll_interval=0.5))
+
+        self.assertEqual(lines, [])
+        mock_select.assert_called_once_with([channel], [], [], 0.5)
+
+    @patch('src.vps.channel_reader.select.select')
+    def test_stops_when_channel_closed(self, mock_select):
+        channel = FakeChannel(stdout_chunks=[b"partial"])
+        channel.exit_status_ready = lambda: False
+        channel.closed = True
+
+        lines = list(iter_channel_lines(channel))
+
+        self.assertEqual(lines, [(STDOUT, "partial")])
+        mock_select.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
+import io
 import unittest
+from contextlib import contextmanager
 from unittest.mock import patch, MagicMock
-from src.vps.connect_vps import setup_server, setup_vps, setup_vps_async
+from src.vps.connect_vps import setup_server, setup_vps, setup_vps_async, vps_logs_stream
 from src.vps.vps_exceptions import (
     VPSConnectionError, VPSAuthenticationError, VPSFileOperationError,
     VPSSetupError, VPSExecutionError
@@ -9,84 +11,131 @@ import paramiko
 import queue
 
 
+def pool_yielding(ssh_client=None, error=None):
+    """Return a mocked SSH pool whose session() yields ssh_client or raises error."""
+    @contextmanager
+    def session(host, username, password=None, key_filename=None):
+        if error:
+            raise error
+        yield ssh_client
+
+    pool = MagicMock()
+    pool.session.side_effect = session
+    return pool
+
+
 class TestConnectVPS(unittest.TestCase):
 
-    @patch('src.vps.connect_vps.paramiko.SSHClient')
-    @patch('src.vps.connect_vps.replace_placeholders')
-    @patch('src.vps.connect_vps.upload_file')
+    @patch('src.vps.connect_vps.get_ssh_pool')
+    @patch('src.vps.connect_vps.render_script')
+    @patch('src.vps.connect_vps.wait_for_host_ready')
+    @patch('src.vps.connect_vps.upload_fileobj')
     @patch('src.vps.connect_vps.execute_script')
-    def test_setup_server_success(self, mock_execute, mock_upload, mock_replace, mock_ssh):
+    def test_setup_server_success(self, mock_execute, mock_upload, mock_wait_ready, mock_replace, mock_ssh):
         # Setup
         mock_ssh_instance = MagicMock()
-        mock_ssh.return_value = mock_ssh_instance
-        mock_replace.return_value = "mocked_script_content"
+        mock_ssh.return_value = pool_yielding(mock_ssh_instance)
+        mock_replace.return_value = io.BytesIO(b"mocked_script_content")
 
         # Execute
-        setup_server("192.168.1.1", "script_path", {"var": "value"}, "password")
+        setup_server.__wrapped__("192.168.1.1", "script_path", {"var": "value"}, "password")
 
         # Assert
-        mock_ssh_instance.connect.assert_called_once_with(hostname="192.168.1.1", username="root", password="password")
-        mock_replace.assert_called_once_with(script_path="script_path", replacements={"var": "value"})
-        mock_upload.assert_called_once()
+        mock_ssh.return_value.session.assert_called_once_with("192.168.1.1", "root", password="password")
+        mock_replace.assert_called_once_with("script_path", {"var": "value"})
+        mock_wait_ready.assert_called_once_with(mock_ssh_instance, "192.168.1.1")
+        mock_upload.assert_called_once_with(mock_ssh_instance, mock_replace.return_value, filename='elixir.sh')
         mock_execute.assert_called_once_with(mock_ssh_instance, "/root/elixir.sh")
-        mock_ssh_instance.close.assert_called_once()
+        mock_ssh_instance.close.assert_not_called()
+
+    @patch('src.vps.connect_vps.get_ssh_pool')
+    @patch('src.vps.connect_vps.render_script')
+    @patch('src.vps.connect_vps.wait_for_host_ready')
+    @patch('src.vps.connect_vps.upload_fileobj')
+    @patch('src.vps.connect_vps.execute_script')
+    def test_setup_server_reports_phases(self, mock_execute, mock_upload, mock_wait_ready, mock_replace, mock_ssh):
+        # Setup
+        mock_ssh.return_value = pool_yielding(MagicMock())
+        phases = []
 
-    @patch('src.vps.connect_vps.paramiko.SSHClient')
+        # Execute
+        timings = setup_server.__wrapped__("192.168.1.1", "script_path", {"var": "value"}, "password",
+                                           on_phase=phases.append)
+
+        # Assert
+        self.assertEqual(phases, ['connect', 'upload', 'execute'])
+        self.assertEqual(sorted(timings), ['connect', 'execute', 'upload'])
+        self.assertTrue(all(seconds >= 0 for seconds in timings.values()))
+
+    @patch('src.vps.connect_vps.get_ssh_pool')
     def test_setup_server_connection_error(self, mock_ssh):
         # Setup
-        mock_ssh_instance = MagicMock()
-        mock_ssh.return_value = mock_ssh_instance
-        mock_ssh_instance.connect.side_effect = paramiko.SSHException("Connection failed")
+        mock_ssh.return_value = pool_yielding(error=paramiko.SSHException("Connection failed"))
 
         # Execute and Assert
         with self.assertRaises(VPSConnectionError):
-            setup_server("192.168.1.1", "script_path", {"var": "value"}, "password")
+            setup_server.__wrapped__("192.168.1.1", "script_path", {"var": "value"}, "password")
 
-    @patch('src.vps.connect_vps.paramiko.SSHClient')
+    @patch('src.vps.connect_vps.get_ssh_pool')
     def test_setup_server_authentication_error(self, mock_ssh):
         # Setup
-        mock_ssh_instance = MagicMock()
-        mock_ssh.return_value = mock_ssh_instance
-        mock_ssh_instance.connect.side_effect = paramiko.AuthenticationException("Authentication failed")
+        mock_ssh.return_value = pool_yielding(error=paramiko.AuthenticationException("Authentication failed"))
 
         # Execute and Assert
         with self.assertRaises(VPSAuthenticationError):
-            setup_server("192.168.1.1", "script_path", {"var": "value"}, "password")
+            setup_server.__wrapped__("192.168.1.1", "script_path", {"var": "value"}, "password")
 
-    @patch('src.vps.connect_vps.paramiko.SSHClient')
-    @patch('src.vps.connect_vps.replace_placeholders')
+    @patch('src.vps.connect_vps.get_ssh_pool')
+    @patch('src.vps.connect_vps.render_script')
     def test_setup_server_file_operation_error(self, mock_replace, mock_ssh):
         # Setup
         mock_ssh_instance = MagicMock()
-        mock_ssh.return_value = mock_ssh_instance
+        mock_ssh.return_value = pool_yielding(mock_ssh_instance)
         mock_replace.side_effect = FileNotFoundError("Script file not found")
 
         # Execute and Assert
         with self.assertRaises(VPSFileOperationError):
-            setup_server("192.168.1.1", "script_path", {"var": "value"}, "password")
+            setup_server.__wrapped__("192.168.1.1", "script_path", {"var": "value"}, "password")
 
-    @patch('src.vps.connect_vps.paramiko.SSHClient')
-    @patch('src.vps.connect_vps.replace_placeholders')
-    @patch('src.vps.connect_vps.upload_file')
+    @patch('src.vps.connect_vps.get_ssh_pool')
+    @patch('src.vps.connect_vps.render_script')
+    @patch('src.vps.connect_vps.wait_for_host_ready')
+    @patch('src.vps.connect_vps.upload_fileobj')
     @patch('src.vps.connect_vps.execute_script')
-    def test_setup_server_execution_error(self, mock_execute, mock_upload, mock_replace, mock_ssh):
+    def test_setup_server_execution_error(self, mock_execute, mock_upload, mock_wait_ready, mock_replace, mock_ssh):
         # Setup
         mock_ssh_instance = MagicMock()
-        mock_ssh.return_value = mock_ssh_instance
-        mock_replace.return_value = "mocked_script_content"
+        mock_ssh.return_value = pool_yielding(mock_ssh_instance)
+        mock_replace.return_value = io.BytesIO(b"mocked_script_content")
         mock_upload.return_value = None  # Simulate successful upload
         mock_execute.side_effect = Exception("Script execution failed")
 
         # Execute and Assert
         with self.assertRaises(VPSExecutionError):
-            setup_server("192.168.1.1", "script_path", {"var": "value"}, "password")
+            setup_server.__wrapped__("192.168.1.1", "script_path", {"var": "value"}, "password")
 
         # Verify that all steps before execution were called
-        mock_ssh_instance.connect.assert_called_once_with(hostname="192.168.1.1", username="root", password="password")
-        mock_replace.assert_called_once_with(script_path="script_path", replacements={"var": "value"})
+        mock_ssh.return_value.session.assert_called_once_with("192.168.1.1", "root", password="password")
+        mock_replace.assert_called_once_with("script_path", {"var": "value"})
         mock_upload.assert_called_once()
         mock_execute.assert_called_once_with(mock_ssh_instance, "/root/elixir.sh")
 
+    @patch('src.vps.connect_vps.get_log_broadcaster')
+    def test_vps_logs_stream_shares_stream_per_host(self, mock_broadcaster):
+        # Setup
+        subscription = MagicMock()
+        subscription.__iter__.return_value = iter(["line 1", "line 2"])
+        mock_broadcaster.return_value.subscribe.return_value = subscription
+
+        # Execute
+        lines = list(vps_logs_stream("192.168.1.1", pem=True))
+
+        # Assert
+        self.assertEqual(lines, ["line 1", "line 2"])
+        key = mock_broadcaster.return_value.subscribe.call_args[0][0]
+        self.assertEqual(key, ("192.168.1.1", "ubuntu", True))
+        subscription.close.assert_called_once()
+
     @patch('src.vps.connect_vps.fetch_vps_data')
     @patch('src.vps.connect_vps.setup_server')
     def test_setup_vps_success(self, mock_setup_server, mock_fetch_data):
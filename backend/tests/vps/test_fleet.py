@@ -0,0 +1,113 @@
+import threading
+import unittest
+from unittest.mock import patch, call
+from src.vps.fleet import iter_fleet_setup, provision_fleet
+
+
+def fake_provision(failing=(), started=None):
+    """Return a provision_vps replacement that reports every phase and fails for the given IDs."""
+    def provision(user_project_id, on_phase=None):
+        if started is not None:
+            started.append(user_project_id)
+        for phase in ('connect', 'upload', 'execute'):
+            on_phase(phase)
+        if user_project_id in failing:
+            raise Exception(f"Setup of {user_project_id} failed")
+        return {'connect': 0.1, 'upload': 0.2, 'execute': 0.3}
+
+    return provision
+
+
+class TestFleetSetup(unittest.TestCase):
+
+    def setUp(self):
+        claim_patcher = patch('src.vps.fleet.claim_user_project', return_value='running')
+        state_patcher = patch('src.vps.fleet.set_provisioning_state')
+        self.mock_claim = claim_patcher.start()
+        self.mock_set_state = state_patcher.start()
+        self.addCleanup(claim_patcher.stop)
+        self.addCleanup(state_patcher.stop)
+
+    @patch('src.vps.fleet.provision_vps')
+    def test_events_end_with_one_final_state_per_host(self, mock_provision):
+        # Setup
+        mock_provision.side_effect = fake_provision(failing={2})
+
+        # Execute
+        events = list(iter_fleet_setup([1, 2, 3, 1], max_workers=2))
+
+        # Assert
+        finished = {event['user_project_id']: event['status'] for event in events
+                    if event['status'] != 'running'}
+        self.assertEqual(finished, {1: 'succeeded', 2: 'failed', 3: 'succeeded'})
+        phases = [event['phase'] for event in events if event['user_project_id'] == 1 and 'phase' in event]
+        self.assertEqual(phases, ['connect', 'upload', 'execute'])
+        self.assertEqual(mock_provision.call_count, 3)
+
+    @patch('src.vps.fleet.provision_vps')
+    def test_runs_hosts_in_parallel(self, mock_provision):
+        # Setup, every host waits until all of them are running at once
+        barrier = threading.Barrier(3, timeout=5)
+
+        def provision(user_project_id, on_phase=None):
+            barrier.wait()
+            return {}
+
+        mock_provision.side_effect = provision
+
+        # Execute
+        result = provision_fleet([1, 2, 3], max_workers=3)
+
+        # Assert
+        self.assertEqual(result['succeeded'], 3)
+
+    @patch('src.vps.fleet.provision_vps')
+    def test_fail_fast_skips_hosts_not_started(self, mock_provision):
+        # Setup
+        started = []
+        mock_provision.side_effect = fake_provision(failing={1}, started=started)
+
+        # Execute
+        result = provision_fleet([1, 2, 3], max_workers=1, fail_fast=True)
+
+        # Assert
+        self.assertEqual(started, [1])
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(result['skipped'], 2)
+        self.assertEqual(result['hosts'][1]['error'], "Setup of 1 failed")
+        self.assertEqual(result['hosts'][1]['phase'], 'execute')
+
+    @patch('src.vps.fleet.provision_vps')
+    def test_continue_on_error_runs_every_host(self, mock_provision):
+        # Setup
+        mock_provision.side_effect = fake_provision(failing={1})
+        snapshots = []
+
+        # Execute
+        result = provision_fleet([1, 2, 3], max_workers=1, progress=snapshots.append)
+
+        # Assert
+        self.assertEqual((result['succeeded'], result['failed'], result['skipped']), (2, 1, 0))
+        self.assertEqual(result['hosts'][2]['timings'], {'connect': 0.1, 'upload': 0.2, 'execute': 0.3})
+        self.assertEqual(len(snapshots), 12)
+        self.assertEqual(snapshots[-1]['succeeded'], 2)
+
+
+    @patch('src.vps.fleet.provision_vps')
+    def test_hosts_claimed_elsewhere_are_skipped(self, mock_provision):
+        # Setup, host 2 is leased by the batch process
+        mock_provision.side_effect = fake_provision(failing={3})
+        self.mock_claim.side_effect = lambda user_project_id, lease_seconds: None if user_project_id == 2 else 'running'
+
+        # Execute
+        result = provision_fleet([1, 2, 3], max_workers=1)
+
+        # Assert
+        self.assertEqual((result['succeeded'], result['failed'], result['skipped']), (1, 1, 1))
+        self.assertEqual([c.args[0] for c in mock_provision.call_args_list], [1, 3])
+        self.mock_set_state.assert_has_calls([call([1], 'configured'), call([3], 'running')])
+        self.assertEqual(self.mock_set_state.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import queue
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch, MagicMock
+import paramiko
+from src.vps.log_hub import LogBroadcaster, LogSubscription
+
+
+class FakeTail:
+    """Remote log tail whose lines are fed by the test, closing the channel ends it."""
+
+    def __init__(self):
+        self.lines = queue.Queue()
+        self.stdout = MagicMock()
+        self.stdout.channel.close.side_effect = lambda: self.lines.put(None)
+        self.ssh = MagicMock()
+        self.ssh.exec_command.return_value = (None, self.stdout, None)
+
+    @contextmanager
+    def open_session(self):
+        yield self.ssh
+
+    def read(self, channel):
+        while True:
+            line = self.lines.get(timeout=5)
+            if line is None:
+                return
+            yield [line]
+
+
+class TestLogBroadcaster(unittest.TestCase):
+
+    def setUp(self):
+        self.tail = FakeTail()
+        patcher = patch('src.vps.log_hub.read_log_batches', side_effect=self.tail.read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.broadcaster = LogBroadcaster(buffer_lines=2, queue_size=10)
+
+    def test_subscribers_share_one_remote_tail(self):
+        first = self.broadcaster.subscribe('host', self.tail.open_session)
+        second = self.broadcaster.subscribe('host', self.tail.open_session)
+
+        self.tail.lines.put("line 1")
+
+        self.assertEqual(first.get(timeout=5), ["line 1"])
+        self.assertEqual(second.get(timeout=5), ["line 1"])
+        self.assertEqual(self.broadcaster.active_streams(), 1)
+        first.close()
+        second.close()
+        self.tail.ssh.exec_command.assert_called_once_with("sudo docker logs -f elixir --tail 10", get_pty=True)
+
+    def test_late_subscriber_receives_recent_lines(self):
+        first = self.broadcaster.subscribe('host', self.tail.open_session)
+        for line in ("line 1", "line 2", "line 3"):
+            self.tail.lines.put(line)
+        for _ in range(3):
+            first.get(timeout=5)
+
+        late = self.broadcaster.subscribe('host', self.tail.open_session)
+
+        self.assertEqual(late.get(timeout=0), ["line 2", "line 3"])
+        first.close()
+        late.close()
+
+    def test_last_unsubscribe_stops_remote_tail(self):
+        first = self.broadcaster.subscribe('host', self.tail.open_session)
+        second = self.broadcaster.subscribe('host', self.tail.open_session)
+
+        first.close()
+        self.tail.stdout.channel.close.assert_not_called()
+        self.tail.lines.put("still running")
+        self.assertEqual(second.get(timeout=5), ["still running"])
+
+        second.close()
+        self.assertEqual(self.broadcaster.active_streams(), 0)
+        self.tail.stdout.channel.close.assert_called()
+
+    def test_remote_end_finishes_subscriptions(self):
+        subscription = self.broadcaster.subscribe('host', self.tail.open_session)
+        self.tail.lines.put("last line")
+        self.tail.lines.put(None)
+
+        self.assertEqual(list(subscription), ["last line"])
+        subscription.close()
+
+    def test_connection_error_is_reported_to_subscribers(self):
+        @contextmanager
+        def failing_session():
+            raise paramiko.AuthenticationException("bad key")
+            yield
+
+        subscription = self.broadcaster.subscribe('host', failing_session)
+
+        self.assertEqual(list(subscription), ["Error: Authentication failed. bad key"])
+        self.assertEqual(self.broadcaster.active_streams(), 0)
+
+    def test_slow_subscriber_drops_oldest_batches(self):
+        subscription = LogSubscription(self.broadcaster, MagicMock(), max_batches=2)
+
+        for batch in (["line 1", "line 2"], ["line 3"], ["line 4"]):
+            subscription._deliver(batch)
+
+        self.assertEqual(subscription.get(timeout=0), ["line 3"])
+        self.assertEqual(subscription.get(timeout=0), ["line 4"])
+        self.assertEqual(subscription.dropped, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import stat
+import tempfile
+import unittest
+import subprocess
+from unittest.mock import patch, MagicMock
+from src.vps.readiness import READINESS_PROBES, run_probe, first_unready_probe, wait_for_host_ready
+from src.vps.vps_exceptions import VPSReadinessError
+
+
+def exec_result(exit_status, finished=True):
+    stdout = MagicMock()
+    stdout.channel.status_event.wait.return_value = finished
+    stdout.channel.recv_exit_status.return_value = exit_status
+    return MagicMock(), stdout, MagicMock()
+
+
+def run_package_manager_probe(tools: dict) -> int:
+    """Run the package manager probe locally with only the given fake tools on the PATH."""
+    command = dict(READINESS_PROBES)['package manager']
+    with tempfile.TemporaryDirectory() as bin_dir:
+        for name, script in tools.items():
+            path = os.path.join(bin_dir, name)
+            with open(path, 'w') as f:
+                f.write(f"#!/bin/sh\n{script}\n")
+            os.chmod(path, stat.S_IRWXU)
+        return subprocess.run(['/bin/sh', '-c', command], env={'PATH': bin_dir}).returncode
+
+
+class TestReadiness(unittest.TestCase):
+
+    def test_run_probe_returns_exit_status(self):
+        # Setup
+        mock_ssh = MagicMock()
+        mock_ssh.exec_command.return_value = exec_result(1)
+
+        # Execute and Assert
+        self.assertEqual(run_probe(mock_ssh, 'true', timeout=5), 1)
+        mock_ssh.exec_command.assert_called_once_with('true', timeout=5)
+
+    def test_run_probe_timeout(self):
+        # Setup
+        mock_ssh = MagicMock()
+        _, stdout, _ = result = exec_result(0, finished=False)
+        mock_ssh.exec_command.return_value = result
+
+        # Execute and Assert
+        self.assertIsNone(run_probe(mock_ssh, 'true', timeout=5))
+        stdout.channel.close.assert_called_once()
+
+    def test_first_unready_probe_all_ready(self):
+        # Setup
+        mock_ssh = MagicMock()
+        mock_ssh.exec_command.side_effect = lambda *args, **kwargs: exec_result(0)
+
+        # Execute and Assert
+        self.assertIsNone(first_unready_probe(mock_ssh))
+        mock_ssh.open_sftp.return_value.close.assert_called_once()
+
+    def test_first_unready_probe_reports_cloud_init(self):
+        # Setup
+        mock_ssh = MagicMock()
+        mock_ssh.exec_command.side_effect = [exec_result(0), exec_result(1)]
+
+        # Execute and Assert
+        self.assertEqual(first_unready_probe(mock_ssh), 'cloud-init')
+        mock_ssh.open_sftp.assert_not_called()
+
+    def test_first_unready_probe_reports_sftp(self):
+        # Setup
+        mock_ssh = MagicMock()
+        mock_ssh.exec_command.side_effect = lambda *args, **kwargs: exec_result(0)
+        mock_ssh.open_sftp.side_effect = Exception("Subsystem not available")
+
+        # Execute and Assert
+        self.assertEqual(first_unready_probe(mock_ssh), 'sftp')
+
+    @patch('src.vps.readiness.time.sleep')
+    @patch('src.vps.readiness.first_unready_probe')
+    def test_wait_for_host_ready_backs_off_until_ready(self, mock_probe, mock_sleep):
+        # Setup
+        mock_probe.side_effect = ['cloud-init', 'package manager', None]
+
+        # Execute
+        wait_for_host_ready(MagicMock(), '192.168.1.1', timeout=600, initial_delay=2, max_delay=30)
+
+        # Assert
+        self.assertEqual(mock_probe.call_count, 3)
+        self.assertEqual([call[0][0] for call in mock_sleep.call_args_list], [2, 4])
+
+    @patch('src.vps.readiness.time.sleep')
+    @patch('src.vps.readiness.first_unready_probe')
+    def test_wait_for_host_ready_returns_immediately(self, mock_probe, mock_sleep):
+        # Setup
+        mock_probe.return_value = None
+
+        # Execute
+        wait_for_host_ready(MagicMock(), '192.168.1.1')
+
+        # Assert
+        mock_sleep.assert_not_called()
+
+    @patch('src.vps.readiness.first_unready_probe')
+    def test_wait_for_host_ready_deadline(self, mock_probe):
+        # Setup
+        mock_probe.return_value = 'cloud-init'
+
+        # Execute and Assert
+        with self.assertRaises(VPSReadinessError):
+            wait_for_host_ready(MagicMock(), '192.168.1.1', timeout=0.05, initial_delay=0.01)
+
+
+    def test_package_manager_probe_needs_fuser_and_sudo(self):
+        sudo = 'shift; "$@"'
+        self.assertEqual(run_package_manager_probe({'sudo': sudo, 'fuser': 'exit 1'}), 0)
+        self.assertNotEqual(run_package_manager_probe({'sudo': sudo, 'fuser': 'exit 0'}), 0)
+        self.assertNotEqual(run_package_manager_probe({'sudo': sudo}), 0)
+        self.assertNotEqual(run_package_manager_probe({'sudo': 'exit 1', 'fuser': 'exit 1'}), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
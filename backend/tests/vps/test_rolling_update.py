@@ -0,0 +1,191 @@
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from src.vps.rolling_update import redeploy_container, wait_until_healthy, update_host, rolling_update, image_repository
+from src.vps.vps_exceptions import VPSUpdateError
+
+IMAGE = 'elixirprotocol/validator:v4'
+
+
+def ssh_returning(*results):
+    """Return a mocked SSH client whose commands exit with the given (status, stdout, stderr) in turn."""
+    mock_ssh_client = MagicMock()
+
+    def exec_command(command, timeout=None):
+        exit_status, output, error_output = results[min(mock_ssh_client.exec_command.call_count - 1,
+                                                        len(results) - 1)]
+        stdout, stderr = MagicMock(), MagicMock()
+        stdout.read.return_value = output.encode()
+        stdout.channel.recv_exit_status.return_value = exit_status
+        stderr.read.return_value = error_output.encode()
+        return MagicMock(), stdout, stderr
+
+    mock_ssh_client.exec_command.side_effect = exec_command
+    return mock_ssh_client
+
+
+def update_failing(*failing_ips):
+    """Return an update_host replacement that fails for the given IPs."""
+    def update(ip, image, settle_time):
+        if ip in failing_ips:
+            raise VPSUpdateError("Container is not staying up")
+        return {}
+
+    return update
+
+
+def instances(count):
+    return [{'user_project_id': i, 'ip': f'10.0.0.{i}'} for i in range(1, count + 1)]
+
+
+class TestContainerUpdate(unittest.TestCase):
+
+    def test_redeploy_pulls_before_removing_container(self):
+        # Setup
+        mock_ssh_client = ssh_returning((0, 'abc123', ''))
+
+        # Execute
+        redeploy_container(mock_ssh_client, IMAGE)
+
+        # Assert
+        command = mock_ssh_client.exec_command.call_args[0][0]
+        self.assertLess(command.index('docker pull -q elixirprotocol/validator:v4'), command.index('docker rm -f elixir'))
+        self.assertIn('--env-file validator.env --name elixir --restart unless-stopped elixirprotocol/validator:v4',
+                      command)
+
+    def test_redeploy_failure(self):
+        mock_ssh_client = ssh_returning((1, '', 'manifest unknown'))
+
+        with self.assertRaises(VPSUpdateError) as context:
+            redeploy_container(mock_ssh_client, IMAGE)
+
+        self.assertIn('manifest unknown', str(context.exception))
+
+    def test_healthy_container(self):
+        mock_ssh_client = ssh_returning((0, f'true {IMAGE} 0', ''))
+
+        wait_until_healthy(mock_ssh_client, IMAGE, settle_time=0)
+
+        mock_ssh_client.exec_command.assert_called_once()
+
+    @patch('src.vps.rolling_update.time.sleep')
+    def test_restarting_container_is_unhealthy(self, mock_sleep):
+        mock_ssh_client = ssh_returning((0, f'true {IMAGE} 0', ''), (0, f'true {IMAGE} 2', ''))
+
+        with self.assertRaises(VPSUpdateError):
+            wait_until_healthy(mock_ssh_client, IMAGE, settle_time=60, poll_interval=1)
+
+        mock_sleep.assert_called_once_with(1)
+
+    def test_container_on_old_image_is_unhealthy(self):
+        mock_ssh_client = ssh_returning((0, 'true elixirprotocol/validator:v3 0', ''))
+
+        with self.assertRaises(VPSUpdateError):
+            wait_until_healthy(mock_ssh_client, IMAGE, settle_time=0)
+
+    @patch('src.vps.rolling_update.wait_until_healthy')
+    @patch('src.vps.rolling_update.redeploy_container')
+    @patch('src.vps.rolling_update.vps_session')
+    def test_update_host_uses_one_pooled_session(self, mock_session, mock_redeploy, mock_wait):
+        # Setup
+        mock_ssh_client = MagicMock()
+        mock_session.return_value.__enter__.return_value = mock_ssh_client
+
+        # Execute
+        timings = update_host('10.0.0.1', IMAGE, settle_time=0)
+
+        # Assert
+        mock_session.assert_called_once_with('10.0.0.1', pem=True)
+        mock_redeploy.assert_called_once_with(mock_ssh_client, IMAGE)
+        mock_wait.assert_called_once_with(mock_ssh_client, IMAGE, 0)
+        self.assertEqual(sorted(timings), ['health', 'redeploy'])
+
+
+class TestRollingUpdate(unittest.TestCase):
+
+    @patch('src.vps.rolling_update.update_host')
+    @patch('src.vps.rolling_update.fetch_project_instances')
+    def test_updates_in_waves(self, mock_fetch, mock_update_host):
+        # Setup
+        mock_fetch.return_value = instances(5)
+        mock_update_host.return_value = {'redeploy': 1.0, 'health': 0.0}
+        snapshots = []
+
+        # Execute
+        result = rolling_update(1, IMAGE, batch_size=2, settle_time=0,
+                                progress=lambda summary: snapshots.append(
+                                    {pid: host['status'] for pid, host in summary['hosts'].items()}))
+
+        # Assert
+        self.assertEqual((result['waves'], result['succeeded'], result['failed']), (3, 5, 0))
+        self.assertEqual([host['wave'] for host in result['hosts'].values()], [1, 1, 2, 2, 3])
+        # Second wave only starts once the first one is done
+        self.assertEqual(snapshots[2], {1: 'succeeded', 2: 'succeeded', 3: 'updating', 4: 'updating', 5: 'queued'})
+
+    @patch('src.vps.rolling_update.update_host')
+    @patch('src.vps.rolling_update.fetch_project_instances')
+    def test_hosts_in_a_wave_run_concurrently(self, mock_fetch, mock_update_host):
+        # Setup, every host of the wave waits until all of them are updating at once
+        mock_fetch.return_value = instances(3)
+        barrier = threading.Barrier(3, timeout=5)
+
+        def update(ip, image, settle_time):
+            barrier.wait()
+            return {}
+
+        mock_update_host.side_effect = update
+
+        # Execute
+        result = rolling_update(1, IMAGE, batch_size=3, settle_time=0)
+
+        # Assert
+        self.assertEqual(result['succeeded'], 3)
+
+    @patch('src.vps.rolling_update.update_host')
+    @patch('src.vps.rolling_update.fetch_project_instances')
+    def test_failed_wave_stops_update(self, mock_fetch, mock_update_host):
+        # Setup
+        mock_fetch.return_value = instances(5)
+        mock_update_host.side_effect = update_failing('10.0.0.2')
+
+        # Execute
+        result = rolling_update(1, IMAGE, batch_size=2, settle_time=0)
+
+        # Assert
+        self.assertEqual((result['succeeded'], result['failed'], result['skipped']), (1, 1, 3))
+        self.assertEqual(result['hosts'][2]['error'], "Container is not staying up")
+        self.assertEqual(mock_update_host.call_count, 2)
+
+    @patch('src.vps.rolling_update.update_host')
+    @patch('src.vps.rolling_update.fetch_project_instances')
+    def test_tolerated_failures_continue(self, mock_fetch, mock_update_host):
+        mock_fetch.return_value = instances(4)
+        mock_update_host.side_effect = update_failing('10.0.0.1')
+
+        result = rolling_update(1, IMAGE, batch_size=2, max_failures=1, settle_time=0)
+
+        self.assertEqual((result['succeeded'], result['failed'], result['skipped']), (3, 1, 0))
+
+    @patch('src.vps.rolling_update.fetch_project_instances')
+    def test_invalid_image_rejected(self, mock_fetch):
+        with self.assertRaises(VPSUpdateError):
+            rolling_update(1, 'validator:v4; rm -rf /')
+
+        mock_fetch.assert_not_called()
+
+    @patch('src.vps.rolling_update.fetch_project_instances')
+    def test_image_outside_allowed_repositories_rejected(self, mock_fetch):
+        for image in ('attacker/validator:v4', 'elixirprotocol/validator-evil:v4',
+                      'registry.example.com/elixirprotocol/validator:v4'):
+            with self.assertRaises(VPSUpdateError):
+                rolling_update(1, image)
+
+        mock_fetch.assert_not_called()
+
+    def test_image_repository_without_tag_or_digest(self):
+        self.assertEqual(image_repository('elixirprotocol/validator:v4'), 'elixirprotocol/validator')
+        self.assertEqual(image_repository('localhost:5000/validator@sha256:abc'), 'localhost:5000/validator')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,10 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
-from src.vps.run_scripts import execute_script, replace_placeholders
+from src.vps.run_scripts import execute_script, replace_placeholders, read_log_batches
 from src.vps.vps_exceptions import VPSExecutionError, VPSFileOperationError
+from tests.vps.test_channel_reader import FakeChannel
 
 
 class TestRunScripts(unittest.TestCase):
@@ -10,32 +13,32 @@ class TestRunScripts(unittest.TestCase):
     def test_execute_script_success(self, mock_logger):
         # Setup
         mock_ssh_client = MagicMock()
-        mock_channel = MagicMock()
-        mock_channel.recv_exit_status.return_value = 0
-        mock_ssh_client.exec_command.return_value = (None, mock_channel, None)
+        mock_stdout = MagicMock()
+        mock_stdout.channel = FakeChannel(stdout_chunks=[b"Installing\n", b"Done\n"], exit_status=0)
+        mock_ssh_client.exec_command.return_value = (None, mock_stdout, None)
 
         # Execute
-        execute_script(mock_ssh_client, "/path/to/script.sh")
+        execute_script.__wrapped__(mock_ssh_client, "/path/to/script.sh")
 
         # Assert
         mock_ssh_client.exec_command.assert_called_once_with("sudo bash /path/to/script.sh")
+        mock_logger.info.assert_any_call("Installing")
+        mock_logger.info.assert_any_call("Done")
         mock_logger.info.assert_called_with("Script executed successfully")
 
     @patch('src.vps.run_scripts.logger')
     def test_execute_script_failure(self, mock_logger):
         # Setup
         mock_ssh_client = MagicMock()
-        mock_channel = MagicMock()
-        mock_channel.recv_exit_status.return_value = 1
-        mock_stderr = MagicMock()
-        mock_stderr.read.return_value = b"Error executing script"
-        mock_ssh_client.exec_command.return_value = (None, mock_channel, mock_stderr)
+        mock_stdout = MagicMock()
+        mock_stdout.channel = FakeChannel(stderr_chunks=[b"Error executing script\n"], exit_status=1)
+        mock_ssh_client.exec_command.return_value = (None, mock_stdout, None)
 
         # Execute and Assert
         with self.assertRaises(VPSExecutionError):
-            execute_script(mock_ssh_client, "/path/to/script.sh")
+            execute_script.__wrapped__(mock_ssh_client, "/path/to/script.sh")
 
-        mock_logger.error.assert_called_with("Script execution failed with exit status 1. Error: Error executing script")
+        mock_logger.error.assert_any_call("Script execution failed with exit status 1. Error: Error executing script")
 
     @patch('src.vps.run_scripts.logger')
     def test_execute_script_exception(self, mock_logger):
@@ -45,28 +48,42 @@ class TestRunScripts(unittest.TestCase):
 
         # Execute and Assert
         with self.assertRaises(VPSExecutionError):
-            execute_script(mock_ssh_client, "/path/to/script.sh")
+            execute_script.__wrapped__(mock_ssh_client, "/path/to/script.sh")
 
         mock_logger.error.assert_called_with("Failed to execute script. Error: SSH error")
 
+    def test_read_log_batches_drops_blank_lines(self):
+        channel = FakeChannel(stdout_chunks=[b"first\r\n\r\n  second  \n"])
+
+        batches = list(read_log_batches(channel))
+
+        self.assertEqual(batches, [["first", "second"]])
+
+    def write_script(self, content: str) -> str:
+        script_file = tempfile.NamedTemporaryFile('w', suffix='.sh', delete=False)
+        script_file.write(content)
+        script_file.close()
+        self.addCleanup(os.remove, script_file.name)
+        return script_file.name
+
     def test_replace_placeholders_success(self):
         # Setup
-        script_content = "Hello {name}, your balance is {balance}"
+        script_path = self.write_script("Hello {name}, your balance is {balance}")
         replacements = {"name": "Alice", "balance": "100 ETH"}
 
         # Execute
-        result = replace_placeholders(script_content, replacements)
+        result = replace_placeholders(script_path, replacements)
 
         # Assert
         self.assertEqual(result, "Hello Alice, your balance is 100 ETH")
 
     def test_replace_placeholders_missing_placeholder(self):
         # Setup
-        script_content = "Hello {name}, your balance is {balance}"
+        script_path = self.write_script("Hello {name}, your balance is {balance}")
         replacements = {"name": "Alice"}
 
         # Execute
-        result = replace_placeholders(script_content, replacements)
+        result = replace_placeholders(script_path, replacements)
 
         # Assert
         self.assertEqual(result, "Hello Alice, your balance is {balance}")
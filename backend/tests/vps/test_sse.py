@@ -0,0 +1,68 @@
+import queue
+import unittest
+from unittest.mock import patch, MagicMock
+from src.vps.sse import format_sse, sse_log_frames, SSE_HEARTBEAT
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+def subscription_with(events, clock):
+    """Subscription replaying (delay, batch) events, raising queue.Empty when the delay exceeds the timeout."""
+    events = list(events)
+
+    def get(timeout=None):
+        delay, batch = events[0]
+        if timeout is not None and delay > timeout:
+            clock.now += timeout
+            events[0] = (delay - timeout, batch)
+            raise queue.Empty
+        clock.now += delay
+        events.pop(0)
+        return batch
+
+    subscription = MagicMock()
+    subscription.get.side_effect = get
+    return subscription
+
+
+class TestSSE(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch('src.vps.sse.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_format_sse_one_data_field_per_line(self):
+        self.assertEqual(format_sse(["a", "b"]), "data: a\ndata: b\n\n")
+
+    def test_lines_within_flush_interval_share_one_event(self):
+        subscription = subscription_with([(0, ["a"]), (0.1, ["b"]), (5, None)], self.clock)
+
+        frames = list(sse_log_frames(subscription, flush_interval=0.5, heartbeat_interval=60))
+
+        self.assertEqual(frames, ["data: a\ndata: b\n\n"])
+
+    def test_max_batch_lines_flushes_immediately(self):
+        subscription = subscription_with([(0, ["a", "b"]), (0, ["c"]), (0, None)], self.clock)
+
+        frames = list(sse_log_frames(subscription, flush_interval=10, heartbeat_interval=60, max_batch_lines=2))
+
+        self.assertEqual(frames, ["data: a\ndata: b\n\n", "data: c\n\n"])
+
+    def test_heartbeat_when_idle(self):
+        subscription = subscription_with([(25, ["a"]), (0, None)], self.clock)
+
+        frames = list(sse_log_frames(subscription, flush_interval=0, heartbeat_interval=10))
+
+        self.assertEqual(frames, [SSE_HEARTBEAT, SSE_HEARTBEAT, "data: a\n\n"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+import threading
+from unittest.mock import patch, MagicMock
+import paramiko
+from src.vps.ssh_pool import SSHSessionPool
+
+
+class TestSSHSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('src.vps.ssh_pool.paramiko.SSHClient', side_effect=lambda: MagicMock())
+        self.mock_ssh = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = SSHSessionPool(idle_timeout=60, keepalive_interval=30, connect_timeout=5)
+
+    def test_reuses_connection_for_same_host(self):
+        with self.pool.session("1.1.1.1", "root", password="secret") as first:
+            with self.pool.session("1.1.1.1", "root", password="secret") as second:
+                self.assertIs(first, second)
+
+        self.assertEqual(self.mock_ssh.call_count, 1)
+        first.connect.assert_called_once_with(hostname="1.1.1.1", username="root", password="secret",
+                                              timeout=5, banner_timeout=5)
+        first.get_transport.return_value.set_keepalive.assert_called_once_with(30)
+        first.close.assert_not_called()
+
+    def test_separate_connections_per_credentials(self):
+        with self.pool.session("1.1.1.1", "root", password="secret") as by_password:
+            pass
+        with self.pool.session("1.1.1.1", "ubuntu", key_filename="key.pem") as by_key:
+            pass
+
+        self.assertIsNot(by_password, by_key)
+        by_key.connect.assert_called_once_with(hostname="1.1.1.1", username="ubuntu", key_filename="key.pem",
+                                               timeout=5, banner_timeout=5)
+
+    def test_reconnects_when_transport_is_dead(self):
+        with self.pool.session("1.1.1.1", "root", password="secret") as first:
+            pass
+        first.get_transport.return_value.is_active.return_value = False
+
+        with self.pool.session("1.1.1.1", "root", password="secret") as second:
+            pass
+
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+
+    def test_connection_error_discards_session(self):
+        with self.assertRaises(paramiko.SSHException):
+            with self.pool.session("1.1.1.1", "root", password="secret") as first:
+                raise paramiko.SSHException("Channel closed")
+
+        first.close.assert_called_once()
+        with self.pool.session("1.1.1.1", "root", password="secret") as second:
+            self.assertIsNot(first, second)
+
+    def test_other_errors_keep_session(self):
+        with self.assertRaises(ValueError):
+            with self.pool.session("1.1.1.1", "root", password="secret") as first:
+                raise ValueError("Bad script")
+
+        with self.pool.session("1.1.1.1", "root", password="secret") as second:
+            self.assertIs(first, second)
+
+    def test_failed_connect_closes_client(self):
+        client = MagicMock()
+        client.connect.side_effect = paramiko.AuthenticationException("Authentication failed")
+        self.mock_ssh.side_effect = lambda: client
+
+        with self.assertRaises(paramiko.AuthenticationException):
+            with self.pool.session("1.1.1.1", "root", password="wrong"):
+                pass
+
+        client.close.assert_called_once()
+
+    @patch('src.vps.ssh_pool.time.monotonic')
+    def test_evict_idle_closes_only_unused_sessions(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        with self.pool.session("1.1.1.1", "root", password="secret") as idle:
+            pass
+
+        with self.pool.session("2.2.2.2", "root", password="secret") as busy:
+            mock_monotonic.return_value = 120
+            self.assertEqual(self.pool.evict_idle(), 1)
+
+        idle.close.assert_called_once()
+        busy.close.assert_not_called()
+
+    def test_close_all_waits_for_sessions_in_use(self):
+        with self.pool.session("1.1.1.1", "root", password="secret") as client:
+            self.pool.close_all()
+            client.close.assert_not_called()
+
+        client.close.assert_called_once()
+
+
+    def test_connect_locks_do_not_outlive_acquires(self):
+        for host in ("1.1.1.1", "2.2.2.2"):
+            with self.pool.session(host, "root", password="secret"):
+                pass
+        client = MagicMock()
+        client.connect.side_effect = paramiko.AuthenticationException("Authentication failed")
+        self.mock_ssh.side_effect = lambda: client
+        with self.assertRaises(paramiko.AuthenticationException):
+            with self.pool.session("3.3.3.3", "root", password="wrong"):
+                pass
+
+        self.assertEqual(self.pool._connect_locks, {})
+
+    def test_concurrent_callers_share_one_handshake(self):
+        connecting = threading.Event()
+        proceed = threading.Event()
+
+        def connect(**kwargs):
+            connecting.set()
+            proceed.wait(5)
+
+        client = MagicMock()
+        client.connect.side_effect = connect
+        self.mock_ssh.side_effect = lambda: client
+        clients = []
+
+        def borrow():
+            with self.pool.session("1.1.1.1", "root", password="secret") as borrowed:
+                clients.append(borrowed)
+
+        threads = [threading.Thread(target=borrow) for _ in range(3)]
+        threads[0].start()
+        connecting.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        proceed.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.mock_ssh.call_count, 1)
+        self.assertEqual(clients, [client] * 3)
+        self.assertEqual(self.pool._connect_locks, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
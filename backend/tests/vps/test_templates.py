@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.vps.templates import ScriptTemplate, TemplateRegistry
+from src.vps.vps_exceptions import VPSTemplateError
+
+
+class TestScriptTemplate(unittest.TestCase):
+
+    def test_render_replaces_placeholders_and_strips_quotes(self):
+        template = ScriptTemplate("t.sh", "IP={ip}\nKEY={priv_key}\n")
+
+        result = template.render({"ip": "1.1.1.1", "priv_key": "'0xabc'"})
+
+        self.assertEqual(result, "IP=1.1.1.1\nKEY=0xabc\n")
+
+    def test_shell_expansions_are_not_placeholders(self):
+        template = ScriptTemplate("t.sh", 'echo ${HOME} {name}')
+
+        self.assertEqual(template.placeholders, frozenset({"name"}))
+        self.assertEqual(template.render({"name": "node"}), 'echo ${HOME} node')
+
+    def test_strict_render_rejects_missing_values(self):
+        template = ScriptTemplate("t.sh", "{ip} {wallet}")
+
+        with self.assertRaises(VPSTemplateError):
+            template.render({"ip": "1.1.1.1"})
+
+    def test_lenient_render_keeps_missing_placeholders(self):
+        template = ScriptTemplate("t.sh", "{ip} {wallet}")
+
+        self.assertEqual(template.render({"ip": "1.1.1.1"}, strict=False), "1.1.1.1 {wallet}")
+
+    def test_render_bytes_uses_unix_line_endings(self):
+        template = ScriptTemplate("t.sh", "IP={ip}\r\n")
+
+        self.assertEqual(template.render_bytes({"ip": "1.1.1.1"}).read(), b"IP=1.1.1.1\n")
+
+
+class TestTemplateRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.template_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.template_dir)
+        self.registry = TemplateRegistry(self.template_dir, allowed_placeholders=frozenset({"ip", "name"}))
+
+    def write(self, name: str, content: str, mtime: float) -> str:
+        path = os.path.join(self.template_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_template_parsed_once(self):
+        path = self.write("node.sh", "IP={ip}", mtime=1000)
+
+        with patch('src.vps.templates.ScriptTemplate', wraps=ScriptTemplate) as mock_template:
+            first = self.registry.get(path)
+            second = self.registry.get(path)
+
+        self.assertIs(first, second)
+        mock_template.assert_called_once()
+
+    def test_template_reloaded_when_modified(self):
+        path = self.write("node.sh", "IP={ip}", mtime=1000)
+        first = self.registry.get(path)
+
+        self.write("node.sh", "NAME={name}", mtime=2000)
+        second = self.registry.get(path)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.render({"name": "node"}), "NAME=node")
+
+    def test_unknown_placeholder_rejected_at_load(self):
+        path = self.write("node.sh", "KEY={secret}", mtime=1000)
+
+        with self.assertRaises(VPSTemplateError):
+            self.registry.get(path)
+
+    def test_load_all_loads_every_script(self):
+        self.write("a.sh", "{ip}", mtime=1000)
+        self.write("b.sh", "{name}", mtime=1000)
+        self.write("notes.txt", "{anything}", mtime=1000)
+
+        paths = self.registry.load_all()
+
+        self.assertEqual([os.path.basename(path) for path in paths], ["a.sh", "b.sh"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,138 +1,124 @@
+import io
 import unittest
 from unittest.mock import patch, MagicMock, mock_open
 from paramiko import SSHException
-from src.vps.upload_script import elevate_privileges, upload_file
-from src.vps.vps_exceptions import VPSPrivilegeElevationError, VPSFileUploadError, VPSFileOperationError
+from src.vps.upload_script import install_file, upload_fileobj, upload_file
+from src.vps.vps_exceptions import VPSFileUploadError, VPSFileOperationError
+
+
+def ssh_with_exit_status(exit_status, error_output=b""):
+    mock_ssh_client = MagicMock()
+    mock_stdin, mock_stdout, mock_stderr = MagicMock(), MagicMock(), MagicMock()
+    mock_stdout.channel.recv_exit_status.return_value = exit_status
+    mock_stderr.read.return_value = error_output
+    mock_ssh_client.exec_command.return_value = (mock_stdin, mock_stdout, mock_stderr)
+    return mock_ssh_client
 
 
 class TestUploadScript(unittest.TestCase):
 
-    @patch('src.vps.upload_script.time.sleep')
-    def test_elevate_privileges_success(self, mock_sleep):
+    def test_install_file_single_command(self):
         # Setup
-        mock_ssh_client = MagicMock()
-        mock_shell = MagicMock()
-        mock_ssh_client.invoke_shell.return_value = mock_shell
-        mock_shell.recv.side_effect = [
-            b'[sudo] password for user: ',
-            b'root@hostname:~# '
-        ]
+        mock_ssh_client = ssh_with_exit_status(0)
 
         # Execute
-        result = elevate_privileges(mock_ssh_client, sudo_password="password123")
+        install_file(mock_ssh_client, "/tmp/abc-script.sh", "/root/script.sh", timeout=30)
 
         # Assert
-        self.assertEqual(result, mock_shell)
-        mock_shell.send.assert_any_call("sudo -i\n")
-        mock_shell.send.assert_any_call("password123\n")
-        mock_sleep.assert_called_with(1)
+        mock_ssh_client.exec_command.assert_called_once_with(
+            "sudo -n install -m 0755 /tmp/abc-script.sh /root/script.sh; status=$?; rm -f /tmp/abc-script.sh; "
+            "exit $status", timeout=30)
+        mock_ssh_client.invoke_shell.assert_not_called()
 
-    @patch('src.vps.upload_script.time.sleep')
-    def test_elevate_privileges_no_password_required(self, mock_sleep):
+    def test_install_file_with_sudo_password(self):
         # Setup
-        mock_ssh_client = MagicMock()
-        mock_shell = MagicMock()
-        mock_ssh_client.invoke_shell.return_value = mock_shell
-        mock_shell.recv.side_effect = [
-            b'root@hostname:~# '
-        ]
+        mock_ssh_client = ssh_with_exit_status(0)
 
         # Execute
-        result = elevate_privileges(mock_ssh_client)
+        install_file(mock_ssh_client, "/tmp/abc-script.sh", "/root/script.sh", sudo_password="secret")
 
         # Assert
-        self.assertEqual(result, mock_shell)
-        mock_shell.send.assert_called_once_with("sudo -i\n")
-        mock_sleep.assert_called_with(1)
+        command = mock_ssh_client.exec_command.call_args[0][0]
+        self.assertTrue(command.startswith("sudo -S -p '' install"))
+        stdin = mock_ssh_client.exec_command.return_value[0]
+        stdin.write.assert_called_once_with("secret\n")
+        stdin.channel.shutdown_write.assert_called_once()
 
-    @patch('src.vps.upload_script.time.sleep')
-    def test_elevate_privileges_failure(self, mock_sleep):
+    def test_install_file_timeout(self):
         # Setup
-        mock_ssh_client = MagicMock()
-        mock_shell = MagicMock()
-        mock_ssh_client.invoke_shell.return_value = mock_shell
-        mock_shell.recv.side_effect = [
-            b'[sudo] password for user: ',
-            b'Sorry, try again.'
-        ]
+        mock_ssh_client = ssh_with_exit_status(0)
+        channel = mock_ssh_client.exec_command.return_value[1].channel
+        channel.status_event.wait.return_value = False
 
         # Execute and Assert
-        with self.assertRaises(VPSPrivilegeElevationError):
-            elevate_privileges(mock_ssh_client, sudo_password="wrong_password")
-        mock_sleep.assert_called_with(1)
-
-    @patch('src.vps.upload_script.elevate_privileges')
-    @patch('src.vps.upload_script.time.sleep')
-    @patch('builtins.open', new_callable=mock_open, read_data="script content")
-    def test_upload_file_success(self, mock_file, mock_sleep, mock_elevate):
+        with self.assertRaises(VPSFileOperationError):
+            install_file(mock_ssh_client, "/tmp/abc-script.sh", "/root/script.sh", timeout=5)
+
+        channel.status_event.wait.assert_called_once_with(5)
+        channel.close.assert_called_once()
+        channel.recv_exit_status.assert_not_called()
+
+    def test_install_file_failure(self):
         # Setup
-        mock_ssh_client = MagicMock()
+        mock_ssh_client = ssh_with_exit_status(1, b"sudo: a password is required\n")
+
+        # Execute and Assert
+        with self.assertRaises(VPSFileOperationError) as context:
+            install_file(mock_ssh_client, "/tmp/abc-script.sh", "/root/script.sh")
+
+        self.assertIn("sudo: a password is required", str(context.exception))
+
+    def test_upload_fileobj_success(self):
+        # Setup
+        mock_ssh_client = ssh_with_exit_status(0)
         mock_sftp = MagicMock()
         mock_ssh_client.open_sftp.return_value = mock_sftp
-        mock_shell = MagicMock()
-        mock_elevate.return_value = mock_shell
-        mock_shell.recv.return_value = b'File moved successfully'
+        script = io.BytesIO(b"script content")
+        script.read()
 
         # Execute
-        upload_file(mock_ssh_client, "/local/path/script.sh", "script.sh", "sudo_password")
+        upload_fileobj.__wrapped__(mock_ssh_client, script, "script.sh")
 
         # Assert
-        mock_sftp.put.assert_called_once_with("/local/path/script.sh", "/tmp/script.sh")
-        mock_shell.send.assert_any_call("mv /tmp/script.sh /root/script.sh\n")
-        mock_shell.send.assert_any_call("chmod +x /root/script.sh\n")
-        mock_sleep.assert_called_with(1)
-        mock_file.assert_called_once_with("/local/path/script.sh", "r")
-
-    @patch('src.vps.upload_script.elevate_privileges')
-    @patch('src.vps.upload_script.time.sleep')
-    def test_upload_file_sftp_error(self, mock_sleep, mock_elevate):
+        uploaded, temp_path = mock_sftp.putfo.call_args[0]
+        self.assertIs(uploaded, script)
+        self.assertEqual(script.tell(), 0)
+        self.assertTrue(temp_path.startswith("/tmp/") and temp_path.endswith("-script.sh"))
+        mock_sftp.close.assert_called_once()
+        self.assertIn(f"install -m 0755 {temp_path} /root/script.sh", mock_ssh_client.exec_command.call_args[0][0])
+
+    def test_upload_fileobj_sftp_error(self):
         # Setup
         mock_ssh_client = MagicMock()
         mock_ssh_client.open_sftp.side_effect = SSHException("SFTP error")
 
         # Execute and Assert
         with self.assertRaises(VPSFileUploadError):
-            upload_file(mock_ssh_client, "/local/path/script.sh", "script.sh", "sudo_password")
-        mock_sleep.assert_not_called()
+            upload_fileobj.__wrapped__(mock_ssh_client, io.BytesIO(b"script content"), "script.sh")
+        mock_ssh_client.exec_command.assert_not_called()
 
-    @patch('src.vps.upload_script.elevate_privileges')
-    @patch('src.vps.upload_script.time.sleep')
-    @patch('builtins.open', new_callable=mock_open, read_data="script content")
-    def test_upload_file_move_error(self, mock_file, mock_sleep, mock_elevate):
+    def test_upload_fileobj_install_error(self):
         # Setup
-        mock_ssh_client = MagicMock()
-        mock_sftp = MagicMock()
-        mock_ssh_client.open_sftp.return_value = mock_sftp
-        mock_shell = MagicMock()
-        mock_elevate.return_value = mock_shell
-        mock_shell.recv.return_value = b'mv: cannot move'
+        mock_ssh_client = ssh_with_exit_status(1, b"install: cannot create regular file")
 
         # Execute and Assert
         with self.assertRaises(VPSFileOperationError):
-            upload_file(mock_ssh_client, "/local/path/script.sh", "script.sh", "sudo_password")
-        mock_sleep.assert_called_with(1)
-        mock_file.assert_called_once_with("/local/path/script.sh", "r")
+            upload_fileobj.__wrapped__(mock_ssh_client, io.BytesIO(b"script content"), "script.sh")
 
-    @patch('src.vps.upload_script.elevate_privileges')
-    @patch('src.vps.upload_script.time.sleep')
-    @patch('builtins.open', new_callable=mock_open, read_data="script content")
+    @patch('src.vps.upload_script.upload_fileobj')
+    @patch('builtins.open', new_callable=mock_open, read_data=b"script content")
     @patch('os.remove')
-    def test_upload_file_local_delete(self, mock_remove, mock_file, mock_sleep, mock_elevate):
+    def test_upload_file_local_delete(self, mock_remove, mock_file, mock_upload):
         # Setup
         mock_ssh_client = MagicMock()
-        mock_sftp = MagicMock()
-        mock_ssh_client.open_sftp.return_value = mock_sftp
-        mock_shell = MagicMock()
-        mock_elevate.return_value = mock_shell
-        mock_shell.recv.return_value = b'File moved successfully'
 
         # Execute
         upload_file(mock_ssh_client, "/local/path/script.sh", "script.sh", "sudo_password")
 
         # Assert
+        mock_file.assert_called_once_with("/local/path/script.sh", "rb")
+        mock_upload.assert_called_once_with(mock_ssh_client, mock_file.return_value, "script.sh", "sudo_password")
         mock_remove.assert_called_once_with("/local/path/script.sh")
-        mock_sleep.assert_called_with(1)
-        mock_file.assert_called_once_with("/local/path/script.sh", "r")
 
 
 if __name__ == '__main__':
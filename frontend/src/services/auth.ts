@@ -12,11 +12,31 @@ export const register = async (username: string, email: string, password: string
   return response.data;
 };
 
+const JOB_POLL_INTERVAL_MS = 3000;
+const JOB_TIMEOUT_MS = 30 * 60 * 1000;
+
+// Background jobs move from 'queued' to 'running' to 'succeeded' or 'failed'
+export const waitForJob = async (jobId: string) => {
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const response = await api.get(`/jobs/${jobId}`);
+    const job = response.data;
+    if (job.status === 'succeeded') {
+      return job.result;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || `Job ${jobId} failed`);
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+  throw new Error(`Job ${jobId} did not finish in time`);
+};
+
 export const instanceSetup = async (userId: number,projectId: number) => {
   const data = {"user_id": userId, "project_id": projectId}
   const response = await api.post('/instance_setup', data);
-  console.log(response.data, response.data.user_project_id);
-  return response.data.user_project_id;
+  const result = await waitForJob(response.data.job_id);
+  return result.user_project_id;
 };
 
 export const createWallet = async (network: string, userproductId: number) => {
@@ -28,7 +48,7 @@ export const createWallet = async (network: string, userproductId: number) => {
 export const setupProject = async (userProductId: number) => {
   const data = {"user_project_id": userProductId}
   const response = await api.post('/vps_setup', data);
-  return response.data;
+  return waitForJob(response.data.job_id);
 };
 
 export const verifyEmail = async (token: string, email: string) => {
@@ -61,7 +81,7 @@ export const streamLogsDocker = async (
           
           const lines = newContent.split('\n');
           lines.forEach((line: string) => {
-            if (line.trim()) {
+            if (line.trim() && !line.startsWith(':')) { // ':' lines are keep-alive comments
               if (line.startsWith('data: ')) {
                 const logContent = line.slice(6); // Removes 'data: ' prefix
                 onLogReceived(logContent);